@@ -4,12 +4,10 @@ Admin authentication and data import system
 Provides secure admin login and data management
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-import csv
-import io
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -58,50 +56,35 @@ def admin_logout():
 @admin_required
 def admin_dashboard():
     """Protected admin dashboard"""
-    from app import DailyVote, Student, BusStop, EmergencyRequest, Bus
+    from app import admin_dashboard_context
     
-    today = datetime.now().date()
-    
-    # Get today's votes
-    votes = current_app.db.session.query(DailyVote, Student, BusStop).join(
-        Student, DailyVote.student_id == Student.id
-    ).join(
-        BusStop, Student.stop_id == BusStop.id
-    ).filter(DailyVote.vote_date == today).all()
-    
-    # Get emergency requests
-    emergency_requests = current_app.db.session.query(EmergencyRequest, Student, BusStop).join(
-        Student, EmergencyRequest.student_id == Student.id
-    ).join(
-        BusStop, EmergencyRequest.stop_id == BusStop.id
-    ).filter(
-        EmergencyRequest.request_time >= datetime.now() - timedelta(hours=1)
-    ).all()
-    
-    # Calculate bus requirements by stop
-    stop_demands = {}
-    for vote, student, stop in votes:
-        if vote.needs_bus:
-            if stop.id not in stop_demands:
-                stop_demands[stop.id] = {
-                    'stop': stop,
-                    'count': 0,
-                    'students': []
-                }
-            stop_demands[stop.id]['count'] += 1
-            stop_demands[stop.id]['students'].append(student)
+    return render_template('admin_dashboard_secure.html', **admin_dashboard_context(request.args.get('before')))
+
+@admin_bp.route('/stops/<int:stop_id>/students')
+@admin_required
+def stop_students(stop_id):
+    """Page of the students riding from a stop today, ADMIN_PAGE_SIZE at a time (?after=<cursor>)"""
+    from app import ADMIN_PAGE_SIZE, stop_students_page
     
-    return render_template('admin_dashboard_secure.html',
-                         votes=votes,
-                         emergency_requests=emergency_requests,
-                         stop_demands=stop_demands)
+    students, cursor = stop_students_page(stop_id, datetime.now().date(), request.args.get('after', type=int),
+                                          ADMIN_PAGE_SIZE)
+    return jsonify({
+        'students': [{
+            'id': student.id,
+            'student_id': student.student_id,
+            'name': student.name,
+            'voted_at': student.voted_at.isoformat() if student.voted_at else None
+        } for student in students],
+        'next_after': cursor
+    })
 
 @admin_bp.route('/import/students', methods=['GET', 'POST'])
 @admin_required
 def import_students():
     """Import students from CSV"""
-    from app import Student, BusStop
+    from app import import_students_csv
     
+    report = None
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected')
@@ -114,52 +97,22 @@ def import_students():
         
         if file and file.filename.endswith('.csv'):
             try:
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_reader = csv.DictReader(stream)
-                
-                imported_count = 0
-                for row in csv_reader:
-                    try:
-                        # Check if student already exists
-                        existing = current_app.db.session.query(Student).filter_by(student_id=row['student_id']).first()
-                        if existing:
-                            continue
-                        
-                        # Get bus stop ID
-                        stop = current_app.db.session.query(BusStop).filter_by(name=row['stop_name']).first()
-                        if not stop:
-                            flash(f"Bus stop '{row['stop_name']}' not found")
-                            continue
-                        
-                        # Create student
-                        student = Student(
-                            student_id=row['student_id'],
-                            name=row['name'],
-                            password_hash=generate_password_hash(row['password']),
-                            stop_id=stop.id
-                        )
-                        current_app.db.session.add(student)
-                        imported_count += 1
-                    
-                    except Exception as e:
-                        flash(f'Error importing row: {str(e)}')
-                
-                current_app.db.session.commit()
-                flash(f'Successfully imported {imported_count} students!')
-                
-            except Exception as e:
+                report = import_students_csv(file.stream)
+                flash(report.summary('students'))
+            except ValueError as e:
                 flash(f'Error importing file: {str(e)}')
         else:
             flash('Please upload a CSV file')
     
-    return render_template('import_students.html')
+    return render_template('import_students.html', report=report.as_dict() if report else None)
 
 @admin_bp.route('/import/stops', methods=['GET', 'POST'])
 @admin_required
 def import_stops():
     """Import bus stops from CSV"""
-    from app import BusStop
+    from app import import_stops_csv
     
+    report = None
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected')
@@ -172,35 +125,11 @@ def import_stops():
         
         if file and file.filename.endswith('.csv'):
             try:
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_reader = csv.DictReader(stream)
-                
-                imported_count = 0
-                for row in csv_reader:
-                    try:
-                        # Check if stop already exists
-                        existing = current_app.db.session.query(BusStop).filter_by(name=row['name']).first()
-                        if existing:
-                            continue
-                        
-                        stop = BusStop(
-                            name=row['name'],
-                            latitude=float(row['latitude']),
-                            longitude=float(row['longitude']),
-                            address=row.get('address', '')
-                        )
-                        current_app.db.session.add(stop)
-                        imported_count += 1
-                    
-                    except Exception as e:
-                        flash(f'Error importing row: {str(e)}')
-                
-                current_app.db.session.commit()
-                flash(f'Successfully imported {imported_count} bus stops!')
-                
-            except Exception as e:
+                report = import_stops_csv(file.stream)
+                flash(report.summary('bus stops'))
+            except ValueError as e:
                 flash(f'Error importing file: {str(e)}')
         else:
             flash('Please upload a CSV file')
     
-    return render_template('import_stops.html')
+    return render_template('import_stops.html', report=report.as_dict() if report else None)
@@ -1,20 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, OperationalError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import atexit
 import os
-from geopy.distance import geodesic
+import queue
+import threading
+import time
 import heapq
 import math
 import csv
-import io
+import hashlib
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import numpy as np
+
+from distance_matrix import DistanceCache, DistanceMatrix, HAVERSINE
+from route_solvers import DEFAULT_TIME_LIMIT, ROUTING_ENGINES, RoutingProblem, get_routing_engine
+from spatial_index import SpatialGrid
+from route_ordering import GREEDY, ORDERING_MODES, order_many
+from incremental_routing import RoutePlan, repair_plan
+from road_network import ROAD, RoadGraph
+from eta import EtaEngine, SpeedProfile, pickup_times
+from live_positions import PositionBroadcaster, PositionStore
+from write_behind import WriteBehindBuffer
+from geofence import ARRIVAL, GeofenceEngine
+from track_codec import decode_track, encode_track, split_trips
+from location_rollups import ROLLUP_FIELDS, merge_rollups, minute_of, rollup_points
+from bulk_import import ImportReport, csv_chunks
 
 # Import admin blueprint
 from admin_auth import admin_bp
 
 
 
+def is_enabled(value):
+    """Read an on/off setting from the environment or a request; JSON booleans pass through"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'smart-transport-hackfinity-2024')
 
@@ -23,6 +53,59 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(basedir, "instance/smart_transport.db")}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Distance mode for route optimization: 'haversine' (fast), 'vincenty' (accurate) or
+# 'road' (travel minutes over the local road graph below)
+app.config['DISTANCE_MODE'] = os.environ.get('DISTANCE_MODE', HAVERSINE)
+# OSM-derived road edge list CSV, only read in 'road' mode
+app.config['ROAD_GRAPH_PATH'] = os.environ.get('ROAD_GRAPH_PATH', os.path.join(basedir, 'instance', 'road_graph.csv'))
+# Persistent stop distance matrix, kept next to the database
+app.config['DISTANCE_CACHE_PATH'] = os.environ.get('DISTANCE_CACHE_PATH', os.path.join(basedir, 'instance', 'distance_cache.npz'))
+
+# Routing engine for /api/optimize-routes: 'farthest_first' or one of route_solvers.ROUTING_ENGINES
+app.config['ROUTING_ENGINE'] = os.environ.get('ROUTING_ENGINE', 'farthest_first')
+app.config['ROUTING_TIME_LIMIT'] = float(os.environ.get('ROUTING_TIME_LIMIT', DEFAULT_TIME_LIMIT))
+# Stop ordering within each route: 'greedy', 'heuristic' (bounded 2-opt) or 'exact' (Held-Karp up to 15 stops)
+app.config['ROUTE_ORDERING'] = os.environ.get('ROUTE_ORDERING', GREEDY)
+# Worker processes per server process for ordering large fleets' routes. Every server worker gets its
+# own pool, so keep ROUTING_WORKERS x WEB_CONCURRENCY within the CPU count; 1 orders in-process
+app.config['ROUTING_WORKERS'] = int(os.environ.get('ROUTING_WORKERS', 1))
+# Repair the last plan when only some stops' demand changed instead of re-optimizing everything
+app.config['INCREMENTAL_ROUTING'] = is_enabled(os.environ.get('INCREMENTAL_ROUTING', '1'))
+# Buses reach college at this time (HH:MM); published plans schedule their pickups back from it
+app.config['COLLEGE_ARRIVAL_TIME'] = os.environ.get('COLLEGE_ARRIVAL_TIME', '08:15')
+
+# Where /api/bus-locations reads latest positions: 'memory' (per process, no SQL) or 'database'
+# (the shared BusPosition table, so every gunicorn worker gives the same answer)
+app.config['LIVE_POSITION_STORE'] = os.environ.get(
+    'LIVE_POSITION_STORE', 'memory' if int(os.environ.get('WEB_CONCURRENCY', 1)) <= 1 else 'database')
+
+# BusLocation retention: raw points for this many hours, then per-minute rollups for this many days
+app.config['LOCATION_RAW_RETENTION_HOURS'] = float(os.environ.get('LOCATION_RAW_RETENTION_HOURS', 24))
+app.config['LOCATION_ROLLUP_RETENTION_DAYS'] = float(os.environ.get('LOCATION_ROLLUP_RETENTION_DAYS', 90))
+# CSV that expired rollups are appended to; empty drops them
+app.config['LOCATION_ARCHIVE_PATH'] = os.environ.get('LOCATION_ARCHIVE_PATH', '')
+# Write-behind ingestion: GPS points are queued in memory and committed in batches by a background thread
+app.config['LOCATION_WRITE_BEHIND'] = is_enabled(os.environ.get('LOCATION_WRITE_BEHIND', '0'))
+app.config['LOCATION_FLUSH_INTERVAL_MS'] = float(os.environ.get('LOCATION_FLUSH_INTERVAL_MS', 500))
+app.config['LOCATION_FLUSH_BATCH_SIZE'] = int(os.environ.get('LOCATION_FLUSH_BATCH_SIZE', 1000))
+app.config['LOCATION_QUEUE_CAPACITY'] = int(os.environ.get('LOCATION_QUEUE_CAPACITY', 50000))
+# How long a request waits for room in a full queue before it is refused with 503
+app.config['LOCATION_QUEUE_TIMEOUT_SECONDS'] = float(os.environ.get('LOCATION_QUEUE_TIMEOUT_SECONDS', 2))
+# Open /api/stream/bus-locations connections per process. Each one holds a worker thread, so
+# this stays well below gunicorn's --threads; clients over the limit get 503 and poll instead
+app.config['SSE_MAX_STREAMS'] = int(os.environ.get('SSE_MAX_STREAMS', 8))
+# In-process compaction interval; 0 disables it (run `flask compact-locations` from cron instead)
+app.config['LOCATION_COMPACTION_INTERVAL_MINUTES'] = float(os.environ.get(
+    'LOCATION_COMPACTION_INTERVAL_MINUTES', 15 if int(os.environ.get('WEB_CONCURRENCY', 1)) <= 1 else 0))
+
+# How often StopDemand is rebuilt from DailyVote to repair any drift; 0 disables it
+# (run `flask reconcile-stop-demand` from cron instead)
+app.config['STOP_DEMAND_RECONCILE_INTERVAL_MINUTES'] = float(os.environ.get(
+    'STOP_DEMAND_RECONCILE_INTERVAL_MINUTES', 60 if int(os.environ.get('WEB_CONCURRENCY', 1)) <= 1 else 0))
+
+# Vignan Institute of Technology, Deshmuki, Hyderabad coordinates
+COLLEGE_LOCATION = {'latitude': 17.4065, 'longitude': 78.4772}
+
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -43,13 +126,28 @@ app.register_blueprint(admin_bp)
 # Call the function to create tables when the application starts
 create_tables()
 
+# Road graph for 'road' mode; without a usable graph file routing falls back to geodesic distances
+road_graph = None
+if app.config['DISTANCE_MODE'] == ROAD:
+    try:
+        road_graph = RoadGraph.load(app.config['ROAD_GRAPH_PATH'])
+        print(f"Loaded road graph with {len(road_graph)} nodes")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Road graph unavailable ({e}), using haversine distances")
+        app.config['DISTANCE_MODE'] = HAVERSINE
+
+# Load the stop distance cache so route optimization skips the O(n^2) distance work
+distance_cache = DistanceCache(app.config['DISTANCE_CACHE_PATH'], COLLEGE_LOCATION, app.config['DISTANCE_MODE'],
+                               road_graph)
+distance_cache.load()
+
 # Database Models
 class Student(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(20), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
     password_hash = db.Column(db.String(120), nullable=False)
-    stop_id = db.Column(db.Integer, db.ForeignKey('bus_stop.id'), nullable=False)
+    stop_id = db.Column(db.Integer, db.ForeignKey('bus_stop.id'), nullable=False, index=True)  # Per-stop student counts
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -59,7 +157,7 @@ class Student(UserMixin, db.Model):
 
 class BusStop(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)  # Stop importers look stops up by name
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     address = db.Column(db.String(200))
@@ -82,19 +180,48 @@ class DailyVote(db.Model):
     needs_bus = db.Column(db.Boolean, nullable=False)
     voted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'vote_date', name='unique_daily_vote'),)
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'vote_date', name='unique_daily_vote'),
+        # Today's yes-votes, joined to students for per-stop demand
+        db.Index('ix_daily_vote_date_needs_bus_student', 'vote_date', 'needs_bus', 'student_id'),
+        # Newest vote of a day, which tells whether cached route views are stale
+        db.Index('ix_daily_vote_date_voted_at', 'vote_date', 'voted_at'),
+    )
+
+class StopDemand(db.Model):
+    """Yes-votes per stop and day, kept in step with DailyVote so demand reads are key lookups"""
+    demand_date = db.Column(db.Date, primary_key=True)
+    stop_id = db.Column(db.Integer, db.ForeignKey('bus_stop.id'), primary_key=True)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+
+class ChangeCounter(db.Model):
+    """Version of a group of tables, bumped in the same transaction as every change to them"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
 
 class EmergencyRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     stop_id = db.Column(db.Integer, db.ForeignKey('bus_stop.id'), nullable=False)
-    request_time = db.Column(db.DateTime, default=datetime.utcnow)
+    request_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_resolved = db.Column(db.Boolean, default=False)
     assigned_bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'))
     
     stop = db.relationship('BusStop')
     assigned_bus = db.relationship('Bus')
 
+class RoutePlanVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    route_date = db.Column(db.Date, nullable=False, index=True)
+    fingerprint = db.Column(db.String(40), nullable=False)  # ETag of the plan in /api/optimize-routes
+    engine = db.Column(db.String(50))
+    ordering = db.Column(db.String(20))
+    total_cost = db.Column(db.Float, default=0.0)
+    total_students = db.Column(db.Integer, default=0)
+    total_buses = db.Column(db.Integer, default=0)
+    is_current = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class RouteAssignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), nullable=False)
@@ -102,9 +229,13 @@ class RouteAssignment(db.Model):
     route_date = db.Column(db.Date, nullable=False)
     stop_order = db.Column(db.Integer, nullable=False)
     estimated_time = db.Column(db.Time)
+    plan_version_id = db.Column(db.Integer, db.ForeignKey('route_plan_version.id'), index=True)
     
     bus = db.relationship('Bus')
     stop = db.relationship('BusStop')
+    plan_version = db.relationship('RoutePlanVersion')
+    
+    __table_args__ = (db.Index('ix_route_assignment_date_bus_order', 'route_date', 'bus_id', 'stop_order'),)
 
 class BusSchedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -126,81 +257,265 @@ class BusLocation(db.Model):
     status = db.Column(db.String(20), default='moving')
     
     bus = db.relationship('Bus')
+    
+    __table_args__ = (
+        # Latest point per bus, and compaction's range scan on age
+        db.Index('ix_bus_location_bus_timestamp', 'bus_id', 'timestamp'),
+        db.Index('ix_bus_location_timestamp', 'timestamp'),
+    )
+
+# One summary per bus per minute for BusLocation points past the raw retention window
+class BusLocationRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), nullable=False)
+    minute = db.Column(db.DateTime, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    avg_speed = db.Column(db.Float, default=0.0)
+    max_speed = db.Column(db.Float, default=0.0)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20))
+    
+    __table_args__ = (db.UniqueConstraint('bus_id', 'minute', name='unique_bus_minute'),)
+
+# One finished trip of a bus as a compressed, delta-encoded track (see track_codec)
+class BusTrack(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime, nullable=False)
+    point_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    
+    __table_args__ = (
+        # Trips by day, and where each bus's last closed trip ended
+        db.Index('ix_bus_track_started', 'started_at'),
+        db.Index('ix_bus_track_bus_ended', 'bus_id', 'ended_at'),
+    )
+
+# A bus arriving at or departing from a stop on its route, detected from its GPS points
+class StopEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), nullable=False)
+    stop_id = db.Column(db.Integer, db.ForeignKey('bus_stop.id'), nullable=False)
+    route_date = db.Column(db.Date, nullable=False)
+    event = db.Column(db.String(10), nullable=False)  # 'arrival' or 'departure'
+    timestamp = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (db.Index('ix_stop_event_date_bus', 'route_date', 'bus_id'),)
+
+# Latest reported position per bus, so live tracking never scans the BusLocation history
+class BusPosition(db.Model):
+    bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    speed = db.Column(db.Float, default=0.0)
+    status = db.Column(db.String(20), default='moving')
+    
+    bus = db.relationship('Bus')
+
+def upgrade_schema():
+    """Create missing tables, then add columns and indexes introduced after a database was first created"""
+    db.create_all()
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('route_assignment')}
+    if 'plan_version_id' not in columns:
+        db.session.execute(db.text('ALTER TABLE route_assignment ADD COLUMN plan_version_id INTEGER '
+                                   'REFERENCES route_plan_version (id)'))
+        db.session.commit()
+    
+    # create_all() skips tables that already exist, so their newer indexes are created here
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    if db.session.get(ChangeCounter, ROSTER) is None:
+        try:
+            db.session.add(ChangeCounter(name=ROSTER, version=0))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.session.rollback()
+
+# Change counter of the students, stops and buses that schedules are built from
+ROSTER = 'roster'
+ROSTER_MODELS = (Student, BusStop, Bus)
+
+def count_roster_change(session):
+    """Bump the roster version in session's transaction"""
+    counters = ChangeCounter.__table__
+    bumped = session.execute(counters.update().where(counters.c.name == ROSTER).values(
+        version=counters.c.version + 1))
+    if not bumped.rowcount:
+        session.add(ChangeCounter(name=ROSTER, version=1))
+
+@event.listens_for(db.session, 'before_flush')
+def count_roster_flush(session, flush_context, instances):
+    """Every ORM insert, update or delete of a roster row bumps the version; bulk inserts call count_roster_change"""
+    changed = list(session.new) + list(session.deleted) + [obj for obj in session.dirty if session.is_modified(obj)]
+    if any(isinstance(obj, ROSTER_MODELS) for obj in changed):
+        count_roster_change(session)
+
+def roster_version():
+    return db.session.query(ChangeCounter.version).filter_by(name=ROSTER).scalar()
+
+def adjust_stop_demand(day, stop_id, delta):
+    """Add delta to a stop's demand in the current transaction, creating its row if needed"""
+    def increment():
+        return StopDemand.query.filter_by(demand_date=day, stop_id=stop_id).update(
+            {StopDemand.student_count: StopDemand.student_count + delta}, synchronize_session=False)
+    
+    if increment():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(StopDemand(demand_date=day, stop_id=stop_id, student_count=delta))
+    except IntegrityError:
+        # Another request created the row first
+        increment()
+
+def reconcile_stop_demand(day):
+    """Rebuild a day's StopDemand rows from DailyVote in the current transaction.
+    
+    Returns the number of stops whose count was wrong.
+    """
+    actual = dict(db.session.query(Student.stop_id, db.func.count(DailyVote.id)).join(
+        DailyVote, DailyVote.student_id == Student.id
+    ).filter(DailyVote.vote_date == day, DailyVote.needs_bus == True).group_by(Student.stop_id).all())
+    stored = dict(db.session.query(StopDemand.stop_id, StopDemand.student_count).filter(
+        StopDemand.demand_date == day).all())
+    
+    corrected = 0
+    for stop_id in stored.keys() | actual.keys():
+        if stored.get(stop_id, 0) != actual.get(stop_id, 0):
+            corrected += 1
+        if stop_id not in actual:
+            StopDemand.query.filter_by(demand_date=day, stop_id=stop_id).delete()
+        elif stop_id not in stored:
+            db.session.add(StopDemand(demand_date=day, stop_id=stop_id, student_count=actual[stop_id]))
+        elif stored[stop_id] != actual[stop_id]:
+            StopDemand.query.filter_by(demand_date=day, stop_id=stop_id).update(
+                {StopDemand.student_count: actual[stop_id]})
+    return corrected
+
+def stop_demand_query(day):
+    """(stop id, yes-votes) of every stop with demand on a day, read from StopDemand"""
+    return db.session.query(StopDemand.stop_id, StopDemand.student_count).filter(
+        StopDemand.demand_date == day, StopDemand.student_count > 0)
+
+def reconcile_today_stop_demand():
+    today = datetime.now().date()
+    corrected = reconcile_stop_demand(today)
+    db.session.commit()
+    return {'date': today.isoformat(), 'stops_corrected': corrected}
+
+# Latest position of every bus in this process, kept current by /api/update-location
+position_store = PositionStore()
+
+def position_entry(position, bus_number):
+    return {
+        'bus_id': position.bus_id,
+        'bus_number': bus_number or 'Unknown',
+        'latitude': position.latitude,
+        'longitude': position.longitude,
+        'status': position.status,
+        'speed': position.speed,
+        'timestamp': position.timestamp
+    }
+
+def latest_positions_from_db():
+    """Latest position of every bus from the BusPosition table, ordered by bus id"""
+    rows = db.session.query(BusPosition, Bus.bus_number).outerjoin(
+        Bus, BusPosition.bus_id == Bus.id
+    ).order_by(BusPosition.bus_id).all()
+    return [position_entry(position, bus_number) for position, bus_number in rows]
+
+def load_position_store():
+    """Rebuild the in-memory store on startup, first backfilling BusPosition from history if it is empty"""
+    if BusPosition.query.first() is None:
+        subquery = db.session.query(
+            BusLocation.bus_id,
+            db.func.max(BusLocation.timestamp).label('max_timestamp')
+        ).group_by(BusLocation.bus_id).subquery()
+        latest = db.session.query(BusLocation).join(
+            subquery,
+            db.and_(
+                BusLocation.bus_id == subquery.c.bus_id,
+                BusLocation.timestamp == subquery.c.max_timestamp
+            )
+        ).all()
+        for location in latest:
+            db.session.merge(BusPosition(bus_id=location.bus_id, latitude=location.latitude,
+                                         longitude=location.longitude, timestamp=location.timestamp,
+                                         speed=location.speed, status=location.status))
+        db.session.commit()
+    position_store.replace(latest_positions_from_db())
+
+with app.app_context():
+    upgrade_schema()
+    load_position_store()
+    # Databases from before StopDemand existed start with today's counts
+    if StopDemand.query.first() is None:
+        reconcile_today_stop_demand()
+
+def format_position(position):
+    """JSON form of a stored position for the live tracking endpoints"""
+    return dict(position,
+                timestamp=position['timestamp'].strftime('%I:%M %p'),
+                updated_at=position['timestamp'].isoformat())
+
+def encode_position_event(positions):
+    return f"event: positions\ndata: {json.dumps([format_position(position) for position in positions])}\n\n"
+
+def sync_position_store():
+    """Pull the shared BusPosition table into this worker's store, for multi-worker deployments"""
+    try:
+        with app.app_context():
+            for position in latest_positions_from_db():
+                position_store.update(position)
+    except Exception as e:
+        print(f"Live position sync failed: {e}")
+
+def sync_live_state():
+    """Pull positions and stop events recorded by other workers, for multi-worker deployments"""
+    sync_position_store()
+    sync_stop_events()
+
+# One producer per process pushes position changes to every /api/stream/bus-locations client
+position_broadcaster = PositionBroadcaster(
+    position_store, encode_position_event,
+    refresh=sync_live_state if app.config['LIVE_POSITION_STORE'] == 'database' else None)
 
 @login_manager.user_loader
 def load_user(user_id):
     return Student.query.get(int(user_id))
 
-# Route optimization using Dijkstra's algorithm
-class RouteOptimizer:
-    def __init__(self, stops, school_location):
-        self.stops = stops
-        self.school_location = school_location
-        
-    def calculate_distance(self, point1, point2):
-        """Calculate distance between two GPS coordinates"""
-        return geodesic(point1, point2).kilometers
-    
-    def dijkstra_shortest_path(self, start_stop, target_stops):
-        """Find shortest path visiting all target stops"""
-        # Create distance matrix
-        all_points = [start_stop] + target_stops + [self.school_location]
-        n = len(all_points)
-        distances = {}
-        
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    point1 = (all_points[i]['latitude'], all_points[i]['longitude'])
-                    point2 = (all_points[j]['latitude'], all_points[j]['longitude'])
-                    distances[(i, j)] = self.calculate_distance(point1, point2)
-        
-        # Simple greedy approach for TSP (can be improved with dynamic programming)
-        visited = [0]  # Start from first stop
-        current = 0
-        total_distance = 0
-        
-        while len(visited) < n - 1:  # Exclude school from intermediate visits
-            min_dist = float('inf')
-            next_stop = -1
-            
-            for i in range(1, n - 1):  # Exclude start and school
-                if i not in visited:
-                    if distances.get((current, i), float('inf')) < min_dist:
-                        min_dist = distances[(current, i)]
-                        next_stop = i
-            
-            if next_stop != -1:
-                visited.append(next_stop)
-                total_distance += min_dist
-                current = next_stop
-        
-        # Add distance to school
-        total_distance += distances.get((current, n - 1), 0)
-        visited.append(n - 1)
-        
-        return visited, total_distance
-
 # Dynamic Routing Algorithm with College as Center Point
 class DynamicRouter:
-    def __init__(self, college_location, demanding_stops, available_buses):
+    FARTHEST_FIRST = 'farthest_first'
+    FARTHEST_FIRST_DESCRIPTION = 'Dynamic Farthest-First Clustering with Nearest Neighbor Optimization'
+    MAX_STOPS_PER_BUS = 3  # Farthest-first never gives a bus more stops than this
+
+    def __init__(self, college_location, demanding_stops, available_buses, distance_mode=HAVERSINE,
+                 distance_matrix=None, ordering=GREEDY, workers=1):
         self.college_location = college_location
+        self.ordering = ordering
+        self.workers = workers
         self.demanding_stops = demanding_stops  # List of (stop, student_count) tuples
         self.available_buses = available_buses
+        # All stop-to-stop and stop-to-college distances, computed once up front unless cached
+        if distance_matrix is None:
+            distance_matrix = DistanceMatrix([stop for stop, _ in demanding_stops], college_location, distance_mode)
+        self.distances = distance_matrix
         self.bus_colors = [
             '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7',
             '#DDA0DD', '#98D8C8', '#F7DC6F', '#BB8FCE', '#85C1E9'
         ]
         
-    def calculate_distance(self, point1, point2):
-        """Calculate distance between two GPS coordinates"""
-        return geodesic(point1, point2).kilometers
-    
     def get_distance_from_college(self, stop):
         """Calculate distance from college to a stop"""
-        stop_location = (stop.latitude, stop.longitude)
-        college_point = (self.college_location['latitude'], self.college_location['longitude'])
-        return self.calculate_distance(stop_location, college_point)
+        return self.distances.to_college(stop.id)
     
     def farthest_first_clustering(self):
         """Implement farthest-first clustering algorithm"""
@@ -213,49 +528,50 @@ class DynamicRouter:
                             reverse=True)
         
         clusters = []
-        remaining_stops = sorted_stops.copy()
+        # Spatial index over stops not yet on a bus, keyed by their farthest-first rank
+        remaining_stops = SpatialGrid((rank, stop.latitude, stop.longitude)
+                                      for rank, (stop, _) in enumerate(sorted_stops))
+        next_farthest = 0
         
         for bus in self.available_buses:
+            while next_farthest < len(sorted_stops) and next_farthest not in remaining_stops:
+                next_farthest += 1
             if not remaining_stops:
                 break
                 
             # Start with the farthest remaining stop
-            cluster_stops = [remaining_stops[0]]
-            remaining_stops.pop(0)
+            cluster_stops = [sorted_stops[next_farthest]]
+            remaining_stops.remove(next_farthest)
             current_capacity = cluster_stops[0][1]  # student count of first stop
             
             # Find nearest stops that fit within capacity
             # Use a better strategy: find nearest to college first, then nearest neighbors
-            max_stops_per_bus = 3
             stops_added = 1
             
-            while remaining_stops and stops_added < max_stops_per_bus and current_capacity < bus.capacity:
-                # For the first additional stop, find nearest to college
-                # For subsequent stops, find nearest to any stop in the cluster
-                nearest_stop_idx = -1
-                min_distance = float('inf')
+            while remaining_stops and stops_added < self.MAX_STOPS_PER_BUS and current_capacity < bus.capacity:
+                # Find the remaining stop nearest to any stop in the cluster that still fits on this bus;
+                # ties go to the lowest rank, i.e. the stop farthest from college
+                def fits(rank):
+                    return current_capacity + sorted_stops[rank][1] <= bus.capacity
                 
-                for i, (stop, student_count) in enumerate(remaining_stops):
-                    # Check if adding this stop would exceed capacity
-                    if current_capacity + student_count <= bus.capacity:
-                        stop_location = (stop.latitude, stop.longitude)
-                        
-                        # Calculate distance to all stops in cluster and find minimum
-                        min_cluster_distance = float('inf')
-                        for cluster_stop, _ in cluster_stops:
-                            cluster_location = (cluster_stop.latitude, cluster_stop.longitude)
-                            distance = self.calculate_distance(stop_location, cluster_location)
-                            min_cluster_distance = min(min_cluster_distance, distance)
-                        
-                        if min_cluster_distance < min_distance:
-                            min_distance = min_cluster_distance
-                            nearest_stop_idx = i
+                nearest = None
+                for cluster_stop, _ in cluster_stops:
+                    candidate = remaining_stops.nearest(
+                        cluster_stop.latitude, cluster_stop.longitude,
+                        distance=lambda rank: self.distances.between(cluster_stop.id, sorted_stops[rank][0].id),
+                        accept=fits,
+                        # Road mode measures minutes, so ring pruning needs its km bound converted
+                        units_per_km=self.distances.units_per_km
+                    )
+                    if candidate is not None and (nearest is None or candidate < nearest):
+                        nearest = candidate
                 
-                if nearest_stop_idx != -1:
+                if nearest is not None:
                     # Add the nearest stop to cluster
-                    cluster_stops.append(remaining_stops[nearest_stop_idx])
-                    current_capacity += remaining_stops[nearest_stop_idx][1]
-                    remaining_stops.pop(nearest_stop_idx)
+                    _, rank = nearest
+                    cluster_stops.append(sorted_stops[rank])
+                    current_capacity += sorted_stops[rank][1]
+                    remaining_stops.remove(rank)
                     stops_added += 1
                 else:
                     # No more stops fit in this bus
@@ -272,79 +588,167 @@ class DynamicRouter:
         
         return clusters
     
-    def optimize_route_within_cluster(self, cluster):
-        """Optimize route order within a cluster using nearest neighbor"""
-        stops = cluster['stops']
-        if len(stops) <= 1:
-            return stops, 0
+    def cluster_distance_matrix(self, stops):
+        """Compact round-trip matrix for a cluster: index 0 and the last index are both the college"""
+        positions = [self.distances.index[stop.id] for stop, _ in stops]
+        college_distances = self.distances.college_distances[positions]
+        distances = np.zeros((len(stops) + 2, len(stops) + 2))
+        distances[1:-1, 1:-1] = self.distances.stop_distances[np.ix_(positions, positions)]
+        distances[0, 1:-1] = distances[-1, 1:-1] = college_distances
+        distances[1:-1, 0] = distances[1:-1, -1] = college_distances
+        return distances
+    
+    def optimize_routes_within_clusters(self, clusters):
+        """Order every cluster's stops, in worker processes for large fleets.
+        
+        Workers only receive each cluster's small distance matrix, and results keep cluster order.
+        """
+        results = [(cluster['stops'], 0) for cluster in clusters]
+        # Single-stop clusters keep a zero route distance
+        pending = [i for i, cluster in enumerate(clusters) if len(cluster['stops']) > 1]
+        orders = order_many([self.cluster_distance_matrix(clusters[i]['stops']) for i in pending],
+                            self.ordering, self.workers)
         
-        # Start from college
-        current_location = (self.college_location['latitude'], self.college_location['longitude'])
-        unvisited_stops = stops.copy()
-        optimized_route = []
-        total_distance = 0
+        for i, (order, total_distance) in zip(pending, orders):
+            stops = clusters[i]['stops']
+            results[i] = ([stops[j - 1] for j in order[1:-1]], total_distance)
+        
+        return results
+    
+    def build_routing_problem(self):
+        """Compact index-based view of the demanding stops and buses for the routing engines"""
+        positions = [self.distances.index[stop.id] for stop, _ in self.demanding_stops]
+        return RoutingProblem(
+            self.distances.stop_distances[np.ix_(positions, positions)],
+            self.distances.college_distances[positions],
+            [student_count for _, student_count in self.demanding_stops],
+            [bus.capacity for bus in self.available_buses]
+        )
+    
+    def generate_optimal_routes(self, engine=FARTHEST_FIRST, time_limit=DEFAULT_TIME_LIMIT):
+        """Generate optimal routes with minimal total cost using the selected routing engine"""
+        started = time.monotonic()
+        optimized_routes = []
+        total_cost = 0
         
-        while unvisited_stops:
-            # Find nearest unvisited stop
-            nearest_stop_idx = -1
-            min_distance = float('inf')
+        if engine == self.FARTHEST_FIRST:
+            # Step 1: Farthest-first clustering
+            clusters = self.farthest_first_clustering()
             
-            for i, (stop, student_count) in enumerate(unvisited_stops):
-                stop_location = (stop.latitude, stop.longitude)
-                distance = self.calculate_distance(current_location, stop_location)
+            # Step 2: Optimize route within each cluster
+            cluster_routes = self.optimize_routes_within_clusters(clusters)
+            for cluster, (optimized_route, route_distance) in zip(clusters, cluster_routes):
                 
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_stop_idx = i
+                optimized_routes.append({
+                    'bus': cluster['bus'],
+                    'stops': optimized_route,
+                    'total_students': cluster['total_students'],
+                    'route_distance': route_distance,
+                    'color': cluster['color'],
+                    'capacity_utilization': (cluster['total_students'] / cluster['bus'].capacity) * 100
+                })
+                
+                total_cost += route_distance
+            
+            engine_stats = {
+                'engine': self.FARTHEST_FIRST,
+                'iterations': len(clusters),
+                'baseline_cost': round(total_cost, 2),
+                'cost': round(total_cost, 2),
+                'improvement': 0.0,
+                'improvement_percent': 0.0,
+                'elapsed_seconds': round(time.monotonic() - started, 3)
+            }
+        else:
+            problem = self.build_routing_problem()
+            solution = get_routing_engine(engine).solve(problem, time_limit)
             
-            if nearest_stop_idx != -1:
-                # Add to route
-                optimized_route.append(unvisited_stops[nearest_stop_idx])
-                total_distance += min_distance
+            for bus_index, route in solution.routes:
+                bus = self.available_buses[bus_index]
+                stops = [self.demanding_stops[i] for i in route]
+                total_students = sum(student_count for _, student_count in stops)
+                route_distance = problem.route_cost(route)
                 
-                # Update current location
-                stop = unvisited_stops[nearest_stop_idx][0]
-                current_location = (stop.latitude, stop.longitude)
-                unvisited_stops.pop(nearest_stop_idx)
+                optimized_routes.append({
+                    'bus': bus,
+                    'stops': stops,
+                    'total_students': total_students,
+                    'route_distance': route_distance,
+                    'color': self.bus_colors[len(optimized_routes) % len(self.bus_colors)],
+                    'capacity_utilization': (total_students / bus.capacity) * 100
+                })
+                
+                total_cost += route_distance
+            
+            engine_stats = solution.stats()
         
-        # Add distance from last stop back to college
-        last_stop = optimized_route[-1][0]
-        last_location = (last_stop.latitude, last_stop.longitude)
-        college_point = (self.college_location['latitude'], self.college_location['longitude'])
-        total_distance += self.calculate_distance(last_location, college_point)
+        engine_stats['mode'] = 'full'
+        return {
+            'routes': optimized_routes,
+            'total_cost': total_cost,
+            'total_students_served': sum(route['total_students'] for route in optimized_routes),
+            'total_buses_used': len(optimized_routes),
+            'engine': engine_stats
+        }
+
+    def repair_routes(self, plan, max_stops=None):
+        """Repair a previous plan for the current demand, touching only routes whose stops changed.
         
-        return optimized_route, total_distance
-    
-    def generate_optimal_routes(self):
-        """Generate optimal routes with minimal total cost"""
-        # Step 1: Farthest-first clustering
-        clusters = self.farthest_first_clustering()
+        max_stops caps stops per bus as the engine that built the plan did.
+        Returns None when the repaired plan has drifted too far and a full rebuild is needed.
+        """
+        started = time.monotonic()
+        cost_before = plan.total_cost()
+        demands = {stop.id: student_count for stop, student_count in self.demanding_stops}
+        capacities = {bus.id: bus.capacity for bus in self.available_buses}
+        changed = repair_plan(plan, demands, capacities, self.distances, max_stops)
+        if plan.has_drifted():
+            return None
         
-        # Step 2: Optimize route within each cluster
+        stop_rows = {stop.id: (stop, student_count) for stop, student_count in self.demanding_stops}
+        buses = {bus.id: bus for bus in self.available_buses}
         optimized_routes = []
-        total_cost = 0
-        
-        for cluster in clusters:
-            optimized_route, route_distance = self.optimize_route_within_cluster(cluster)
-            
+        for (bus_id, stop_ids), route_distance in zip(plan.routes, plan.route_distances):
+            if not stop_ids:
+                continue
+            bus = buses[bus_id]
+            total_students = plan.route_load(stop_ids)
             optimized_routes.append({
-                'bus': cluster['bus'],
-                'stops': optimized_route,
-                'total_students': cluster['total_students'],
+                'bus': bus,
+                'stops': [stop_rows[stop_id] for stop_id in stop_ids],
+                'total_students': total_students,
                 'route_distance': route_distance,
-                'color': cluster['color'],
-                'capacity_utilization': (cluster['total_students'] / cluster['bus'].capacity) * 100
+                'color': self.bus_colors[len(optimized_routes) % len(self.bus_colors)],
+                'capacity_utilization': (total_students / bus.capacity) * 100
             })
-            
-            total_cost += route_distance
         
+        total_cost = plan.total_cost()
         return {
             'routes': optimized_routes,
             'total_cost': total_cost,
-            'total_students_served': sum(route['total_students'] for route in optimized_routes),
-            'total_buses_used': len(optimized_routes)
+            'total_students_served': plan.students_served(),
+            'total_buses_used': len(optimized_routes),
+            'engine': {
+                'engine': plan.settings[1],
+                'mode': 'incremental',
+                'iterations': len(changed),
+                'baseline_cost': round(cost_before, 2),
+                'cost': round(total_cost, 2),
+                'improvement': round(cost_before - total_cost, 2),
+                'improvement_percent': round((cost_before - total_cost) / cost_before * 100, 1) if cost_before else 0.0,
+                'elapsed_seconds': round(time.monotonic() - started, 3)
+            }
         }
 
+# Last plan from /api/optimize-routes, repaired in place while only a few votes change
+last_route_plan = None
+route_plan_lock = threading.Lock()
+
+# Formatted plans keyed by their demand/fleet/settings fingerprint, most recently used last
+ROUTE_PLAN_CACHE_SIZE = 32
+route_plan_cache = OrderedDict()
+route_plan_cache_lock = threading.Lock()
+
 # Utility functions
 def is_emergency_window_active():
     """Check if emergency button is active (7:00-7:30 AM)"""
@@ -353,23 +757,62 @@ def is_emergency_window_active():
     end_time = now.replace(hour=7, minute=30, second=0, microsecond=0)
     return start_time <= now <= end_time
 
-def find_nearby_buses(stop_location, max_distance_km=5):
-    """Find buses within specified distance of a stop"""
-    nearby_buses = []
-    buses = Bus.query.filter_by(is_active=True).all()
-    
-    for bus in buses:
-        if bus.current_latitude and bus.current_longitude:
-            bus_location = (bus.current_latitude, bus.current_longitude)
-            distance = geodesic(stop_location, bus_location).kilometers
-            
-            if distance <= max_distance_km:
-                nearby_buses.append({
-                    'bus': bus,
-                    'distance': distance
-                })
-    
-    return sorted(nearby_buses, key=lambda x: x['distance'])
+# Most buses offered for one emergency, and how old a bus's last GPS fix may be for it to count as nearby
+NEARBY_BUS_LIMIT = 5
+NEARBY_BUS_MAX_AGE = timedelta(minutes=30)
+
+def remaining_seats(today):
+    """Seats left on each active bus: capacity minus today's planned riders and open emergency pickups"""
+    seats = dict(db.session.query(Bus.id, Bus.capacity).filter(Bus.is_active == True).all())
+    planned = current_route_assignments(today).with_entities(
+        RouteAssignment.bus_id, db.func.sum(StopDemand.student_count)
+    ).join(
+        StopDemand, db.and_(StopDemand.demand_date == today, StopDemand.stop_id == RouteAssignment.stop_id)
+    ).group_by(RouteAssignment.bus_id).all()
+    emergencies = db.session.query(
+        EmergencyRequest.assigned_bus_id, db.func.count(EmergencyRequest.id)
+    ).filter(
+        EmergencyRequest.request_time >= datetime.combine(today, datetime.min.time()),
+        EmergencyRequest.assigned_bus_id.isnot(None),
+        EmergencyRequest.is_resolved == False
+    ).group_by(EmergencyRequest.assigned_bus_id).all()
+    
+    for bus_id, riders in planned + emergencies:
+        if bus_id in seats:
+            seats[bus_id] -= riders
+    return seats
+
+def find_nearby_buses(stop_location, max_distance_km=5, limit=NEARBY_BUS_LIMIT, min_seats=1):
+    """Closest buses to a stop by their live position, keeping only those with min_seats seats left"""
+    if app.config['LIVE_POSITION_STORE'] == 'database':
+        # Other workers record positions only in BusPosition
+        sync_position_store()
+    seats = remaining_seats(datetime.now().date())
+    fresh_after = datetime.utcnow() - NEARBY_BUS_MAX_AGE
+    
+    matches = position_store.nearest(
+        stop_location[0], stop_location[1], limit, max_km=max_distance_km,
+        accept=lambda position: (seats.get(position['bus_id'], 0) >= min_seats
+                                 and position['timestamp'] >= fresh_after))
+    if not matches:
+        return []
+    
+    buses = {bus.id: bus for bus in Bus.query.filter(Bus.id.in_([position['bus_id'] for _, position in matches]))}
+    return [{
+        'bus': buses[position['bus_id']],
+        'distance': distance,
+        'seats_left': seats[position['bus_id']],
+        'position': position
+    } for distance, position in matches if position['bus_id'] in buses]
+
+def refresh_distance_cache():
+    """Update the stop distance cache after stops change, computing only new or moved stops"""
+    # Cached plans embed stop names and coordinates
+    with route_plan_cache_lock:
+        route_plan_cache.clear()
+    with day_views_lock:
+        day_views.clear()
+    return distance_cache.refresh(BusStop.query.all())
 
 # Routes
 @app.route('/')
@@ -435,43 +878,66 @@ def logout():
     logout_user()
     return redirect(url_for('index'))
 
+# Per-day page data shared across requests: view name -> (date, stamp, data). A view is rebuilt
+# when the stamp its page computes (plan version, newest vote, ...) no longer matches
+day_views = {}
+day_views_lock = threading.Lock()
+
+def cached_day_view(name, day, stamp, build):
+    """The named view of a day, calling build() only if the cached one has a different stamp"""
+    with day_views_lock:
+        cached = day_views.get(name)
+    if cached is not None and cached[:2] == (day, stamp):
+        return cached[2]
+    data = build()
+    with day_views_lock:
+        day_views[name] = (day, stamp, data)
+    return data
+
+def build_bus_schedule(plan_key):
+    """Route of every bus in a plan, with the students registered at each stop, from one grouped query"""
+    rows = db.session.query(
+        RouteAssignment.bus_id, Bus.bus_number, Bus.driver_name, RouteAssignment.stop_order,
+        RouteAssignment.estimated_time, BusStop.id, BusStop.name, BusStop.address, db.func.count(Student.id)
+    ).join(Bus, RouteAssignment.bus_id == Bus.id).join(
+        BusStop, RouteAssignment.stop_id == BusStop.id
+    ).outerjoin(Student, Student.stop_id == BusStop.id).filter(
+        *plan_assignment_filter(plan_key)
+    ).group_by(
+        RouteAssignment.id, RouteAssignment.bus_id, Bus.bus_number, Bus.driver_name, RouteAssignment.stop_order,
+        RouteAssignment.estimated_time, BusStop.id, BusStop.name, BusStop.address
+    ).order_by(RouteAssignment.bus_id, RouteAssignment.stop_order).all()
+    
+    routes = {}
+    for bus_id, bus_number, driver_name, _, arrival_time, stop_id, stop_name, stop_address, student_count in rows:
+        route = routes.get(bus_id)
+        if route is None:
+            route = routes[bus_id] = {
+                'route_id': f'route_{bus_id}',
+                'route_name': f'Bus {bus_number} - {stop_name}',
+                'bus_id': bus_id,
+                'bus_number': bus_number,
+                'driver_name': driver_name,
+                'stops': [],
+                'total_students': 0
+            }
+        route['stops'].append({
+            'stop_id': stop_id,
+            'stop_name': stop_name,
+            'stop_address': stop_address,
+            'arrival_time': arrival_time,
+            'student_count': student_count
+        })
+        route['total_students'] += student_count
+    return list(routes.values())
+
 def get_bus_schedule_data():
-    """Get bus schedule data for today"""
+    """Get bus schedule data for today, one entry per bus with its stops in visiting order"""
     today = datetime.now().date()
-    
-    # Get all route assignments for today
-    route_assignments = RouteAssignment.query.filter_by(
-        route_date=today
-    ).all()
-    
-    schedule_data = []
-    for assignment in route_assignments:
-        # Get bus details
-        bus = Bus.query.get(assignment.bus_id)
-        if bus:
-            # Get stop details
-            stop = BusStop.query.get(assignment.stop_id)
-            if stop:
-                # Get students at this stop
-                students_at_stop = Student.query.filter_by(stop_id=stop.id, is_active=True).all()
-                
-                schedule_data.append({
-                    'route_id': f'route_{bus.id}_{stop.id}',
-                    'route_name': f'Bus {bus.bus_number} - {stop.name}',
-                    'bus_id': bus.id,
-                    'bus_number': bus.bus_number,
-                    'driver_name': bus.driver_name,
-                    'stops': [{
-                        'stop_id': stop.id,
-                        'stop_name': stop.name,
-                        'stop_address': stop.address,
-                        'arrival_time': assignment.estimated_time,
-                        'student_count': len(students_at_stop)
-                    }],
-                    'total_students': len(students_at_stop)
-                })
-    
-    return schedule_data
+    # Rebuilt when the plan or any student, stop or bus changes
+    plan_key = plan_key_for(today)
+    stamp = (plan_key, roster_version())
+    return cached_day_view('bus_schedule', today, stamp, lambda: build_bus_schedule(plan_key))
 
 def is_emergency_window_active():
     """Check if emergency window is currently active"""
@@ -507,8 +973,14 @@ def dashboard():
     # Check if emergency window is active
     emergency_active = is_emergency_window_active()
     
-    # Get bus schedule for today
-    bus_schedule = get_bus_schedule_data()
+    # The route of the bus calling at the user's stop today
+    bus_schedule = None
+    for route in get_bus_schedule_data():
+        pickup = next((stop for stop in route['stops'] if stop['stop_id'] == current_user.stop_id), None)
+        if pickup is not None:
+            bus_schedule = dict(route, departure_time=pickup['arrival_time'],
+                                arrival_time=route['stops'][-1]['arrival_time'])
+            break
     
     # Get recent emergency requests for current user
     recent_emergencies = EmergencyRequest.query.filter_by(
@@ -531,51 +1003,62 @@ def bus_routes():
     """Display all bus routes for students"""
     today = datetime.now().date()
     
-    # Get all route assignments for today
-    route_assignments = db.session.query(RouteAssignment).filter(
-        RouteAssignment.route_date == today
-    ).order_by(RouteAssignment.bus_id, RouteAssignment.stop_order).all()
-    
-    # Group by bus and create route structure
-    routes = {}
-    for assignment in route_assignments:
-        bus_id = assignment.bus_id
-        if bus_id not in routes:
-            bus = assignment.bus
-            routes[bus_id] = {
-                'bus_number': bus.bus_number,
-                'driver_name': bus.driver_name or 'TBD',
-                'capacity': bus.capacity,
-                'is_active': bus.is_active,
-                'stop_assignments': [],
-                'assigned_students': []
-            }
-        
-        routes[bus_id]['stop_assignments'].append(assignment)
-    
-    # Get students for each route
-    total_students = 0
-    for bus_id, route in routes.items():
-        # Get students who voted YES and are assigned to stops on this route
-        stop_ids = [sa.stop_id for sa in route['stop_assignments']]
-        
-        students_on_route = db.session.query(Student).join(DailyVote).filter(
-            Student.stop_id.in_(stop_ids),
-            DailyVote.vote_date == today,
-            DailyVote.needs_bus == True
-        ).all()
-        
-        route['assigned_students'] = students_on_route
-        total_students += len(students_on_route)
-    
-    # Convert to list for template
-    routes_list = list(routes.values())
+    # Any new or changed vote moves the newest voted_at of the day
+    plan_key = plan_key_for(today)
+    stamp = (plan_key, db.session.query(db.func.max(DailyVote.voted_at)).filter(DailyVote.vote_date == today).scalar())
+    routes_list, total_students = cached_day_view('bus_routes', today, stamp,
+                                                  lambda: build_route_view(plan_key, today))
     
     return render_template('bus_routes.html',
                          routes=routes_list,
                          total_students=total_students,
                          last_updated=datetime.now())
 
+def build_route_view(plan_key, today):
+    """Routes of a plan with their stops and the students riding from each, from one query.
+    
+    Returns (routes, total students) as plain data, so the template triggers no lazy loads.
+    """
+    riders = db.session.query(Student.stop_id, Student.name).join(
+        DailyVote, DailyVote.student_id == Student.id
+    ).filter(DailyVote.vote_date == today, DailyVote.needs_bus == True).subquery()
+    rows = db.session.query(
+        RouteAssignment.bus_id, RouteAssignment.estimated_time, Bus.bus_number, Bus.driver_name, Bus.capacity,
+        Bus.is_active, BusStop.id, BusStop.name, BusStop.address, riders.c.name
+    ).join(Bus, RouteAssignment.bus_id == Bus.id).join(
+        BusStop, RouteAssignment.stop_id == BusStop.id
+    ).outerjoin(riders, riders.c.stop_id == BusStop.id).filter(
+        *plan_assignment_filter(plan_key)
+    ).order_by(RouteAssignment.bus_id, RouteAssignment.stop_order, riders.c.name).all()
+    
+    # Group by bus and create route structure
+    routes = {}
+    total_students = 0
+    for bus_id, estimated_time, bus_number, driver_name, capacity, is_active, stop_id, stop_name, address, student in rows:
+        route = routes.get(bus_id)
+        if route is None:
+            route = routes[bus_id] = {
+                'bus_number': bus_number,
+                'driver_name': driver_name or 'TBD',
+                'capacity': capacity,
+                'is_active': is_active,
+                'stops': [],
+                'assigned_students': []
+            }
+        stops = route['stops']
+        if not stops or stops[-1]['stop_id'] != stop_id:
+            stops.append({'stop_id': stop_id, 'name': stop_name, 'address': address,
+                          'estimated_time': estimated_time, 'student_count': 0})
+        if student is not None:
+            stops[-1]['student_count'] += 1
+            route['assigned_students'].append(student)
+            total_students += 1
+    
+    for route in routes.values():
+        route['departure_time'] = route['stops'][0]['estimated_time']
+        route['arrival_time'] = route['stops'][-1]['estimated_time']
+    return list(routes.values()), total_students
+
 @app.route('/route-map')
 @login_required
 def route_map():
@@ -595,9 +1078,12 @@ def vote():
     ).first()
     
     if existing_vote:
+        # Only a flip changes the stop's demand
+        delta = int(needs_bus) - int(existing_vote.needs_bus)
         existing_vote.needs_bus = needs_bus
         existing_vote.voted_at = datetime.utcnow()
     else:
+        delta = int(needs_bus)
         vote = DailyVote(
             student_id=current_user.id,
             vote_date=today,
@@ -605,6 +1091,8 @@ def vote():
         )
         db.session.add(vote)
     
+    if delta:
+        adjust_stop_demand(today, current_user.stop_id, delta)
     db.session.commit()
     flash('Vote recorded successfully!')
     return redirect(url_for('dashboard'))
@@ -615,22 +1103,26 @@ def emergency_request():
     if not is_emergency_window_active():
         return jsonify({'error': 'Emergency window is not active'}), 400
     
+    # Find nearby buses with a free seat; the closest one picks the student up
+    stop_location = (current_user.stop.latitude, current_user.stop.longitude)
+    nearby_buses = find_nearby_buses(stop_location)
+    assigned = nearby_buses[0] if nearby_buses else None
+    
     # Create emergency request
     emergency = EmergencyRequest(
         student_id=current_user.id,
-        stop_id=current_user.stop_id
+        stop_id=current_user.stop_id,
+        assigned_bus_id=assigned['bus'].id if assigned else None
     )
     
     db.session.add(emergency)
     db.session.commit()
     
-    # Find nearby buses
-    stop_location = (current_user.stop.latitude, current_user.stop.longitude)
-    nearby_buses = find_nearby_buses(stop_location)
-    
     response_data = {
         'message': 'Emergency request submitted successfully!',
         'nearby_buses': len(nearby_buses),
+        'assigned_bus': assigned['bus'].bus_number if assigned else None,
+        'distance_km': round(assigned['distance'], 2) if assigned else None,
         'estimated_wait': '5-15 minutes' if nearby_buses else '15-30 minutes'
     }
     
@@ -663,44 +1155,180 @@ def admin_logout():
     flash('Admin logged out successfully!')
     return redirect(url_for('admin_login'))
 
-@app.route('/admin/dashboard')
-def admin_dashboard_secure():
-    """Public admin dashboard - no login required"""
-    today = datetime.now().date()
-    
-    # Get today's votes
-    votes = db.session.query(DailyVote, Student, BusStop).join(
-        Student, DailyVote.student_id == Student.id
-    ).join(
-        BusStop, Student.stop_id == BusStop.id
-    ).filter(DailyVote.vote_date == today).all()
+# Rows per page of the admin emergency list and of a stop's student list
+ADMIN_PAGE_SIZE = 50
+# How far back the admin dashboard lists emergency requests
+ADMIN_EMERGENCY_WINDOW = timedelta(hours=1)
+
+def stop_demand_counts(day):
+    """Yes-votes of a day per stop from StopDemand: {stop id: {'stop', 'count'}} by stop name"""
+    rows = db.session.query(BusStop, StopDemand.student_count).join(
+        StopDemand, StopDemand.stop_id == BusStop.id
+    ).filter(
+        StopDemand.demand_date == day, StopDemand.student_count > 0
+    ).order_by(BusStop.name).all()
+    return {stop.id: {'stop': stop, 'count': count} for stop, count in rows}
+
+def stop_students_page(stop_id, day, after_id=None, limit=ADMIN_PAGE_SIZE):
+    """Students at a stop who voted yes on a day, in id order after after_id.
+    
+    Returns (students, cursor); cursor is the after_id of the next page, or None on the last one.
+    """
+    query = db.session.query(Student.id, Student.student_id, Student.name, DailyVote.voted_at).join(
+        DailyVote, DailyVote.student_id == Student.id
+    ).filter(Student.stop_id == stop_id, DailyVote.vote_date == day, DailyVote.needs_bus == True)
+    if after_id is not None:
+        query = query.filter(Student.id > after_id)
+    rows = query.order_by(Student.id).limit(limit + 1).all()
+    return rows[:limit], (rows[limit - 1].id if len(rows) > limit else None)
+
+def emergency_cursor(emergency):
+    return f"{emergency.request_time.isoformat()}_{emergency.id}"
+
+def emergency_page(since, before=None, limit=ADMIN_PAGE_SIZE):
+    """Emergency requests made since a time as (request, student, stop), newest first.
     
-    # Get emergency requests
-    emergency_requests = db.session.query(EmergencyRequest, Student, BusStop).join(
+    before is the cursor returned with the previous page; returns (rows, cursor of the next page or None).
+    A malformed cursor raises ValueError.
+    """
+    query = db.session.query(EmergencyRequest, Student, BusStop).join(
         Student, EmergencyRequest.student_id == Student.id
     ).join(
         BusStop, EmergencyRequest.stop_id == BusStop.id
-    ).filter(
-        EmergencyRequest.request_time >= datetime.now() - timedelta(hours=1)
-    ).all()
-    
-    # Calculate bus requirements by stop
-    stop_demands = {}
-    for vote, student, stop in votes:
-        if vote.needs_bus:
-            if stop.id not in stop_demands:
-                stop_demands[stop.id] = {
-                    'stop': stop,
-                    'count': 0,
-                    'students': []
-                }
-            stop_demands[stop.id]['count'] += 1
-            stop_demands[stop.id]['students'].append(student)
-    
-    return render_template('admin_dashboard_secure.html',
-                         votes=votes,
-                         emergency_requests=emergency_requests,
-                         stop_demands=stop_demands)
+    ).filter(EmergencyRequest.request_time >= since)
+    if before:
+        request_time, request_id = before.rsplit('_', 1)
+        query = query.filter(db.tuple_(EmergencyRequest.request_time, EmergencyRequest.id)
+                             < (datetime.fromisoformat(request_time), int(request_id)))
+    rows = query.order_by(EmergencyRequest.request_time.desc(), EmergencyRequest.id.desc()).limit(limit + 1).all()
+    return rows[:limit], (emergency_cursor(rows[limit - 1][0]) if len(rows) > limit else None)
+
+def admin_dashboard_context(before=None):
+    """Template data for the admin dashboard: counts from the database and one page of emergencies"""
+    today = datetime.now().date()
+    # Request times are stored in UTC
+    since = datetime.utcnow() - ADMIN_EMERGENCY_WINDOW
+    
+    vote_counts = dict(db.session.query(DailyVote.needs_bus, db.func.count(DailyVote.id)).filter(
+        DailyVote.vote_date == today).group_by(DailyVote.needs_bus).all())
+    try:
+        emergency_requests, next_emergencies = emergency_page(since, before)
+    except ValueError:
+        emergency_requests, next_emergencies = emergency_page(since)
+    emergency_count = db.session.query(db.func.count(EmergencyRequest.id)).filter(
+        EmergencyRequest.request_time >= since).scalar()
+    
+    return {
+        'yes_votes': vote_counts.get(True, 0),
+        'no_votes': vote_counts.get(False, 0),
+        'stop_demands': stop_demand_counts(today),
+        'emergency_requests': emergency_requests,
+        'emergency_count': emergency_count,
+        'next_emergencies': next_emergencies
+    }
+
+@app.route('/admin/dashboard')
+def admin_dashboard_secure():
+    """Public admin dashboard - no login required"""
+    return render_template('admin_dashboard_secure.html', **admin_dashboard_context(request.args.get('before')))
+
+STUDENT_IMPORT_COLUMNS = ('student_id', 'name', 'password', 'stop_name')
+
+def import_students_csv(stream):
+    """Add the students of a CSV upload, a chunk at a time; returns an ImportReport.
+    
+    Existing student ids and stop names are loaded once up front, so rows need no lookups,
+    and each chunk is inserted with one bulk statement in its own transaction. Password
+    hashing at werkzeug's default strength, the bulk of the work, runs on every core
+    (its key derivation releases the GIL).
+    """
+    report = ImportReport()
+    known_ids = {student_id for student_id, in db.session.query(Student.student_id)}
+    stop_ids = dict(db.session.query(BusStop.name, BusStop.id).all())
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as hashers:
+        for chunk in csv_chunks(stream, STUDENT_IMPORT_COLUMNS):
+            import_student_chunk(chunk, report, known_ids, stop_ids, hashers)
+    return report
+
+def import_student_chunk(chunk, report, known_ids, stop_ids, hashers):
+    """Validate one chunk of (line, row) pairs and insert its new students in one transaction"""
+    mappings = []
+    passwords = []
+    for line, row in chunk:
+        student_id, name, password, stop_name = ((row[column] or '').strip() for column in STUDENT_IMPORT_COLUMNS)
+        if not (student_id and name and password and stop_name):
+            report.error(line, 'student_id, name, password and stop_name are all required')
+            continue
+        if student_id in known_ids:
+            report.skipped += 1
+            continue
+        stop_id = stop_ids.get(stop_name)
+        if stop_id is None:
+            report.error(line, f"Bus stop '{stop_name}' not found")
+            continue
+        known_ids.add(student_id)
+        mappings.append({'student_id': student_id, 'name': name, 'stop_id': stop_id})
+        passwords.append(password)
+    if not mappings:
+        return
+    
+    for mapping, password_hash in zip(mappings, hashers.map(generate_password_hash, passwords)):
+        mapping['password_hash'] = password_hash
+    try:
+        db.session.bulk_insert_mappings(Student, mappings)
+        count_roster_change(db.session)
+        db.session.commit()
+        report.imported += len(mappings)
+    except IntegrityError as e:
+        # Most likely a concurrent import of the same students; earlier chunks stay imported
+        db.session.rollback()
+        report.error(chunk[0][0], f'Lines {chunk[0][0]}-{chunk[-1][0]} not imported: {e.orig}')
+
+STOP_IMPORT_COLUMNS = ('name', 'latitude', 'longitude')
+
+def import_stops_csv(stream):
+    """Add the bus stops of a CSV upload, a chunk at a time; returns an ImportReport.
+    
+    Stops already present (by name) are skipped. The distance cache is refreshed once at
+    the end rather than per chunk, since each refresh measures the new stops against all.
+    """
+    report = ImportReport()
+    known_names = {name for name, in db.session.query(BusStop.name)}
+    for chunk in csv_chunks(stream, STOP_IMPORT_COLUMNS):
+        import_stop_chunk(chunk, report, known_names)
+    if report.imported:
+        refresh_distance_cache()
+    return report
+
+def import_stop_chunk(chunk, report, known_names):
+    """Validate one chunk of (line, row) pairs and insert its new stops in one transaction"""
+    mappings = []
+    for line, row in chunk:
+        name = (row['name'] or '').strip()
+        if not name:
+            report.error(line, 'name is required')
+            continue
+        if name in known_names:
+            report.skipped += 1
+            continue
+        try:
+            latitude, longitude = float(row['latitude']), float(row['longitude'])
+        except (TypeError, ValueError):
+            report.error(line, 'latitude and longitude must be numbers')
+            continue
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            report.error(line, 'coordinates out of range')
+            continue
+        known_names.add(name)
+        mappings.append({'name': name, 'latitude': latitude, 'longitude': longitude,
+                         'address': (row.get('address') or '').strip()})
+    if not mappings:
+        return
+    
+    db.session.bulk_insert_mappings(BusStop, mappings)
+    count_roster_change(db.session)
+    db.session.commit()
+    report.imported += len(mappings)
 
 @app.route('/admin/import/students', methods=['GET', 'POST'])
 def import_students():
@@ -709,6 +1337,7 @@ def import_students():
         flash('Please login as admin to access this page.')
         return redirect(url_for('admin_login'))
     
+    report = None
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected')
@@ -721,49 +1350,19 @@ def import_students():
         
         if file and file.filename.endswith('.csv'):
             try:
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_reader = csv.DictReader(stream)
-                
-                imported_count = 0
-                for row in csv_reader:
-                    try:
-                        # Check if student already exists
-                        existing = Student.query.filter_by(student_id=row['student_id']).first()
-                        if existing:
-                            continue
-                        
-                        # Get bus stop ID
-                        stop = BusStop.query.filter_by(name=row['stop_name']).first()
-                        if not stop:
-                            flash(f"Bus stop '{row['stop_name']}' not found")
-                            continue
-                        
-                        # Create student
-                        student = Student(
-                            student_id=row['student_id'],
-                            name=row['name'],
-                            password_hash=generate_password_hash(row['password']),
-                            stop_id=stop.id
-                        )
-                        db.session.add(student)
-                        imported_count += 1
-                    
-                    except Exception as e:
-                        flash(f'Error importing row: {str(e)}')
-                
-                db.session.commit()
-                flash(f'Successfully imported {imported_count} students!')
-                
-            except Exception as e:
+                report = import_students_csv(file.stream)
+                flash(report.summary('students'))
+            except ValueError as e:
                 flash(f'Error importing file: {str(e)}')
         else:
             flash('Please upload a CSV file')
     
-    return render_template('import_students.html')
+    return render_template('import_students.html', report=report.as_dict() if report else None)
 
 @app.route('/admin/import/stops', methods=['GET', 'POST'])
 def import_stops():
     """Import bus stops from CSV - public access"""
+    report = None
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected')
@@ -776,43 +1375,39 @@ def import_stops():
         
         if file and file.filename.endswith('.csv'):
             try:
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_reader = csv.DictReader(stream)
-                
-                imported_count = 0
-                for row in csv_reader:
-                    try:
-                        existing = BusStop.query.filter_by(name=row['name']).first()
-                        if existing:
-                            continue
-                        
-                        stop = BusStop(
-                            name=row['name'],
-                            latitude=float(row['latitude']),
-                            longitude=float(row['longitude']),
-                            address=row.get('address', '')
-                        )
-                        db.session.add(stop)
-                        imported_count += 1
-                    
-                    except Exception as e:
-                        flash(f'Error importing row: {str(e)}')
-                
-                db.session.commit()
-                flash(f'Successfully imported {imported_count} bus stops!')
-                
-            except Exception as e:
+                report = import_stops_csv(file.stream)
+                flash(report.summary('bus stops'))
+            except ValueError as e:
                 flash(f'Error importing file: {str(e)}')
         else:
             flash('Please upload a CSV file')
     
-    return render_template('import_stops.html')
+    return render_template('import_stops.html', report=report.as_dict() if report else None)
 
 @app.route('/api/bus-schedule')
 def get_bus_schedule():
     """Get today's bus schedule"""
     today = datetime.now().date()
     
+    # For a signed-in student, the predicted pickup of the next bus calling at their stop
+    if current_user.is_authenticated:
+        refresh_etas(today)
+        pickup = eta_engine.next_arrival(current_user.stop_id)
+        if pickup is not None:
+            bus_id, pickup_time = pickup
+            bus = Bus.query.get(bus_id)
+            _, arrivals = eta_engine.arrivals(bus_id)
+            return jsonify({
+                'route_name': f'Bus {bus.bus_number} - {current_user.stop.name}',
+                # Estimates are in UTC like the GPS points; the timetable fields are local time
+                'departure_time': pickup_time.replace(tzinfo=timezone.utc).astimezone().strftime('%I:%M %p'),
+                'arrival_time': arrivals[-1][2].replace(tzinfo=timezone.utc).astimezone().strftime('%I:%M %p'),
+                'bus_number': bus.bus_number,
+                'driver_name': bus.driver_name,
+                'countdown_minutes': minutes_until(pickup_time, datetime.utcnow()),
+                'estimated': True
+            })
+    
     # Create sample schedule if none exists
     schedule = BusSchedule.query.filter_by(is_active=True).first()
     if not schedule:
@@ -833,13 +1428,20 @@ def get_bus_schedule():
         'arrival_time': schedule.arrival_time.strftime('%I:%M %p'),      # 12-hour format
         'bus_number': schedule.bus_number,
         'driver_name': schedule.driver_name,
-        'countdown_minutes': 0
+        'countdown_minutes': 0,
+        'estimated': False
     })
 
 @app.route('/api/live-location')
 def get_live_location():
     """Get live bus location"""
-    location = BusLocation.query.order_by(BusLocation.timestamp.desc()).first()
+    # Most recently reported bus, from the latest-position store rather than the history table
+    if app.config['LIVE_POSITION_STORE'] == 'database':
+        location = BusPosition.query.order_by(BusPosition.timestamp.desc()).first()
+    else:
+        _, positions = position_store.snapshot()
+        latest = max(positions, key=lambda position: position['timestamp'], default=None)
+        location = SimpleNamespace(**latest) if latest else None
     
     if location:
         return jsonify({
@@ -859,41 +1461,223 @@ def get_live_location():
             'timestamp': datetime.now().strftime('%I:%M %p')
         })
 
+# Largest number of points accepted in one /api/update-locations request
+MAX_LOCATION_BATCH = 10000
+# Statuses a tracker may report; anything else is rejected before it reaches a page
+LOCATION_STATUSES = ('moving', 'stopped', 'delayed')
+
+def newest_per_bus(rows):
+    newest = {}
+    for row in rows:
+        if row['bus_id'] not in newest or newest[row['bus_id']]['timestamp'] <= row['timestamp']:
+            newest[row['bus_id']] = row
+    return newest
+
+def record_latest_positions(rows):
+    """Move BusPosition forward to the newest of the given location rows; the caller commits.
+    
+    Returns the newest row per bus id.
+    """
+    newest = newest_per_bus(rows)
+    existing = {position.bus_id: position
+                for position in BusPosition.query.filter(BusPosition.bus_id.in_(list(newest))).all()}
+    for bus_id, row in newest.items():
+        position = existing.get(bus_id)
+        if position is None:
+            position = BusPosition(bus_id=bus_id)
+            db.session.add(position)
+        elif position.timestamp > row['timestamp']:
+            continue
+        position.latitude = row['latitude']
+        position.longitude = row['longitude']
+        position.timestamp = row['timestamp']
+        position.speed = row['speed']
+        position.status = row['status']
+    return newest
+
+def publish_positions(newest, bus_numbers):
+    """Hand accepted positions to this process's live position store"""
+    for bus_id, row in newest.items():
+        position_store.update(dict(row, bus_number=bus_numbers.get(bus_id) or 'Unknown'))
+
+def write_location_rows(rows, stop_events=()):
+    """Insert location rows (and the stop events they caused) and move BusPosition forward in one transaction"""
+    db.session.execute(BusLocation.__table__.insert(), rows)
+    newest = record_latest_positions(rows)
+    if stop_events:
+        db.session.execute(StopEvent.__table__.insert(), stop_events)
+    db.session.commit()
+    return newest
+
+def flush_location_batch(rows):
+    with app.app_context():
+        try:
+            write_location_rows(rows)
+        except Exception:
+            db.session.rollback()
+            raise
+
+# Queue behind /api/update-location(s) in write-behind mode; drained on shutdown so no point is lost
+location_buffer = None
+if app.config['LOCATION_WRITE_BEHIND']:
+    location_buffer = WriteBehindBuffer(flush_location_batch,
+                                        batch_size=app.config['LOCATION_FLUSH_BATCH_SIZE'],
+                                        flush_interval=app.config['LOCATION_FLUSH_INTERVAL_MS'] / 1000,
+                                        capacity=app.config['LOCATION_QUEUE_CAPACITY'],
+                                        name='location-writer',
+                                        # A locked or unreachable database; anything else is a bad point
+                                        retry_on=(OperationalError,))
+    atexit.register(location_buffer.close)
+
+def store_locations(rows, bus_numbers):
+    """Persist validated location rows (now, or queued in write-behind mode), record the stop
+    arrivals and departures they cause, and publish both live.
+    
+    Returns False if the write-behind queue stayed full; nothing is stored then.
+    """
+    if location_buffer is not None and not location_buffer.put_many(rows, app.config['LOCATION_QUEUE_TIMEOUT_SECONDS']):
+        return False
+    stop_events = detect_stop_events(rows)
+    if location_buffer is None:
+        newest = write_location_rows(rows, stop_events)
+    else:
+        newest = newest_per_bus(rows)
+        if stop_events:
+            # Stop events are rare and go straight in
+            db.session.execute(StopEvent.__table__.insert(), stop_events)
+            db.session.commit()
+    publish_positions(newest, bus_numbers)
+    publish_stop_events(stop_events)
+    return True
+
+def queue_full_response():
+    return jsonify({'error': 'Location queue is full, retry shortly'}), 503, {'Retry-After': '1'}
+
+def parse_location_point(point, bus_numbers, received_at):
+    """Validate one tracker point; returns (BusLocation row, None) or (None, error message)"""
+    if not isinstance(point, dict):
+        return None, 'point must be a JSON object'
+    try:
+        bus_id = int(point['bus_id'])
+        latitude = float(point['latitude'])
+        longitude = float(point['longitude'])
+        speed = float(point.get('speed') or 0.0)
+    except KeyError as e:
+        return None, f'missing {e.args[0]}'
+    except (TypeError, ValueError):
+        return None, 'bus_id, latitude, longitude and speed must be numbers'
+    if bus_id not in bus_numbers:
+        return None, f'unknown bus {bus_id}'
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, 'coordinates out of range'
+    if not 0 <= speed < 500:
+        return None, 'speed out of range'
+    status = point.get('status') or 'moving'
+    if status not in LOCATION_STATUSES:
+        return None, f"status must be one of {', '.join(LOCATION_STATUSES)}"
+    
+    timestamp = received_at
+    if point.get('timestamp'):
+        try:
+            timestamp = datetime.fromisoformat(str(point['timestamp']))
+        except ValueError:
+            return None, 'timestamp must be ISO 8601'
+        # Stored timestamps are naive UTC, like datetime.utcnow()
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    return {
+        'bus_id': bus_id,
+        'latitude': latitude,
+        'longitude': longitude,
+        'speed': speed,
+        'status': status,
+        'timestamp': timestamp
+    }, None
+
 @app.route('/api/update-location', methods=['POST'])
 def update_location():
     """Update bus location (for demo purposes)"""
-    data = request.json
-    
-    # Create or update bus location
-    bus_id = data.get('bus_id', 1)
-    location = BusLocation(
-        bus_id=bus_id,
-        latitude=data.get('latitude', 17.4065),
-        longitude=data.get('longitude', 78.4772),
-        speed=data.get('speed', 0.0),
-        status=data.get('status', 'moving')
-    )
-    db.session.add(location)
-    db.session.commit()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    # Demo trackers may leave out everything but the bus; the point is then the college
+    point = dict({'bus_id': 1, 'latitude': COLLEGE_LOCATION['latitude'],
+                  'longitude': COLLEGE_LOCATION['longitude']}, **data)
+    bus_numbers = dict(db.session.query(Bus.id, Bus.bus_number).all())
+    row, error = parse_location_point(point, bus_numbers, datetime.utcnow())
+    if error:
+        return jsonify({'error': error}), 400
+    # Keeps the one-row-per-bus latest position in step with the history
+    if not store_locations([row], bus_numbers):
+        return queue_full_response()
     
     return jsonify({'message': 'Location updated successfully'})
 
+@app.route('/api/update-locations', methods=['POST'])
+def update_locations():
+    """Batch GPS ingestion: a JSON array (or {"points": [...]}) or NDJSON of points from many buses.
+    
+    Each point needs bus_id, latitude and longitude; speed, status and an ISO 8601 timestamp are
+    optional. Valid points are written with one bulk insert and one commit per request, or
+    queued for the background writer in write-behind mode; the response reports acceptance
+    per point, in request order.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        points = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                points.append(json.loads(line))
+            except ValueError:
+                points.append(None)  # Rejected below like any other malformed point
+    else:
+        points = request.get_json(silent=True)
+        if isinstance(points, dict):
+            points = points.get('points')
+        if not isinstance(points, list):
+            return jsonify({'error': 'Expected a JSON array of points or NDJSON'}), 400
+    if len(points) > MAX_LOCATION_BATCH:
+        return jsonify({'error': f'At most {MAX_LOCATION_BATCH} points per request'}), 400
+    
+    bus_numbers = dict(db.session.query(Bus.id, Bus.bus_number).all())
+    received_at = datetime.utcnow()
+    rows = []
+    results = []
+    for index, point in enumerate(points):
+        row, error = parse_location_point(point, bus_numbers, received_at)
+        if error:
+            results.append({'index': index, 'accepted': False, 'error': error})
+        else:
+            rows.append(row)
+            results.append({'index': index, 'accepted': True})
+    
+    if rows and not store_locations(rows, bus_numbers):
+        return queue_full_response()
+    
+    return jsonify({
+        'accepted': len(rows),
+        'rejected': len(points) - len(rows),
+        'results': results
+    })
+
+@app.route('/api/ingest-metrics')
+def ingest_metrics():
+    """Write-behind queue depth and flush latency"""
+    if location_buffer is None:
+        return jsonify({'write_behind': False})
+    return jsonify(dict(location_buffer.metrics(), write_behind=True))
+
 @app.route('/api/bus-locations')
 def get_bus_locations():
     """Get current bus locations for real-time tracking"""
-    # Get the most recent location for each bus
-    subquery = db.session.query(
-        BusLocation.bus_id,
-        db.func.max(BusLocation.timestamp).label('max_timestamp')
-    ).group_by(BusLocation.bus_id).subquery()
-    
-    locations = db.session.query(BusLocation).join(
-        subquery,
-        db.and_(
-            BusLocation.bus_id == subquery.c.bus_id,
-            BusLocation.timestamp == subquery.c.max_timestamp
-        )
-    ).all()
+    # The most recent location for each bus, from this process's memory or the shared table
+    if app.config['LIVE_POSITION_STORE'] == 'database':
+        locations = latest_positions_from_db()
+    else:
+        _, locations = position_store.snapshot()
     
     if not locations:
         # Return default locations for demo
@@ -915,59 +1699,398 @@ def get_bus_locations():
     # Format real locations
     result = []
     for location in locations:
-        bus = Bus.query.get(location.bus_id)
-        result.append({
-            'bus_id': location.bus_id,
-            'bus_number': bus.bus_number if bus else 'Unknown',
-            'latitude': location.latitude,
-            'longitude': location.longitude,
-            'status': location.status,
-            'speed': location.speed,
-            'timestamp': location.timestamp.strftime('%I:%M %p')
-        })
+        result.append(format_position(location))
     
     return jsonify(result)
 
-@app.route('/api/optimize-routes', methods=['POST'])
-def optimize_routes():
-    """Dynamic route optimization using farthest-first clustering"""
-    today = datetime.now().date()
+# Streams end after this long and the browser reconnects, so a worker thread is never held forever
+SSE_MAX_STREAM_SECONDS = 300
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MILLISECONDS = 3000
+
+stream_slots = threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS'])
+
+@app.route('/api/stream/bus-locations')
+def stream_bus_locations():
+    """Server-Sent Events: a 'snapshot' of all latest positions, then 'positions' deltas as points arrive"""
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many live streams, poll /api/bus-locations instead'}), 503, {
+            'Retry-After': str(SSE_MAX_STREAM_SECONDS)}
+    
+    def events():
+        # Subscribed only once the server starts sending, so a response that is never sent leaks nothing
+        subscription = position_broadcaster.subscribe()
+        try:
+            yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+            _, positions = position_store.snapshot()
+            yield f"event: snapshot\ndata: {json.dumps([format_position(position) for position in positions])}\n\n"
+            
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    break  # Fell too far behind; the browser reconnects and gets a fresh snapshot
+                yield event
+        finally:
+            position_broadcaster.unsubscribe(subscription)
+    
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # The server closes every response, sent or not
+    response.call_on_close(stream_slots.release)
+    return response
+
+# Raw points folded into rollups per transaction during compaction
+COMPACTION_BATCH_SIZE = 5000
+
+# A bus that reports nothing for this long has finished its trip
+TRIP_GAP = timedelta(minutes=30)
+
+def close_bus_trips(now=None):
+    """Write every finished trip still only held as raw BusLocation points to BusTrack.
+    
+    Picks up each bus's points after the end of its last stored trip; points arriving later
+    than that for an already stored trip are left out of tracks. Returns the trips written.
+    """
+    now = now or datetime.utcnow()
+    watermarks = dict(db.session.query(BusTrack.bus_id, db.func.max(BusTrack.ended_at)).group_by(BusTrack.bus_id).all())
+    
+    tracks = []
+    for (bus_id,) in db.session.query(BusPosition.bus_id).order_by(BusPosition.bus_id).all():
+        points = db.session.query(
+            BusLocation.timestamp, BusLocation.latitude, BusLocation.longitude, BusLocation.speed
+        ).filter(BusLocation.bus_id == bus_id)
+        if bus_id in watermarks:
+            points = points.filter(BusLocation.timestamp > watermarks[bus_id])
+        points = points.order_by(BusLocation.timestamp).all()
+        if not points:
+            continue
+        
+        timestamps, latitudes, longitudes, speeds = zip(*points)
+        for start, end in split_trips(timestamps, TRIP_GAP):
+            # The trip still under way is closed on a later run
+            if timestamps[end - 1] > now - TRIP_GAP:
+                break
+            tracks.append({
+                'bus_id': bus_id,
+                'started_at': timestamps[start],
+                'ended_at': timestamps[end - 1],
+                'point_count': end - start,
+                'data': encode_track(timestamps[start:end], latitudes[start:end],
+                                     longitudes[start:end], speeds[start:end])
+            })
+    
+    if tracks:
+        db.session.execute(BusTrack.__table__.insert(), tracks)
+        db.session.commit()
+    return len(tracks)
+
+def compact_bus_locations(now=None):
+    """Store finished trips as tracks, fold raw BusLocation points past the retention window into
+    per-minute rollups, then archive or drop rollups past the rollup horizon. Returns counts of what was done.
+    
+    Raw points are only compacted up to a whole-minute boundary, so a minute is rolled up
+    in one go; late points for an already rolled-up minute are merged into its rollup.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = minute_of(now - timedelta(hours=app.config['LOCATION_RAW_RETENTION_HOURS']))
+    summary = {'trips_closed': 0, 'compacted_points': 0, 'rollups_written': 0, 'archived_rollups': 0,
+               'dropped_rollups': 0}
+    
+    # Finished trips are stored as tracks before their raw points can be dropped
+    summary['trips_closed'] = close_bus_trips(now)
+    
+    while True:
+        batch = db.session.query(
+            BusLocation.id, BusLocation.bus_id, BusLocation.timestamp, BusLocation.latitude,
+            BusLocation.longitude, BusLocation.speed, BusLocation.status
+        ).filter(BusLocation.timestamp < raw_cutoff).order_by(BusLocation.timestamp).limit(COMPACTION_BATCH_SIZE).all()
+        if not batch:
+            break
+        
+        rollups = rollup_points(row[1:] for row in batch)
+        # Merging below consumes rollups; the speed profile wants each new minute as rolled up
+        speed_samples = [(rollup['latitude'], rollup['longitude'], rollup['minute'], rollup['point_count'],
+                          rollup['avg_speed']) for rollup in rollups.values()]
+        minutes = [minute for _, minute in rollups]
+        existing = BusLocationRollup.query.filter(
+            BusLocationRollup.bus_id.in_({bus_id for bus_id, _ in rollups}),
+            BusLocationRollup.minute.between(min(minutes), max(minutes))
+        ).all()
+        for row in existing:
+            rollup = rollups.pop((row.bus_id, row.minute), None)
+            if rollup is not None:
+                merged = merge_rollups({field: getattr(row, field) for field in ROLLUP_FIELDS}, rollup)
+                for field in ROLLUP_FIELDS:
+                    setattr(row, field, merged[field])
+                summary['rollups_written'] += 1
+        if rollups:
+            db.session.execute(BusLocationRollup.__table__.insert(), list(rollups.values()))
+            summary['rollups_written'] += len(rollups)
+        
+        BusLocation.query.filter(BusLocation.id.in_([row[0] for row in batch])).delete(synchronize_session=False)
+        db.session.commit()
+        speed_profile.add(speed_samples)
+        summary['compacted_points'] += len(batch)
+    
+    rollup_cutoff = now - timedelta(days=app.config['LOCATION_ROLLUP_RETENTION_DAYS'])
+    expired = BusLocationRollup.query.filter(BusLocationRollup.minute < rollup_cutoff)
+    archive_path = app.config['LOCATION_ARCHIVE_PATH']
+    if archive_path:
+        write_header = not os.path.exists(archive_path)
+        with open(archive_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(ROLLUP_FIELDS)
+            for row in expired.order_by(BusLocationRollup.minute, BusLocationRollup.bus_id).yield_per(COMPACTION_BATCH_SIZE):
+                writer.writerow([getattr(row, field) for field in ROLLUP_FIELDS])
+                summary['archived_rollups'] += 1
+    dropped = expired.delete(synchronize_session=False)
+    db.session.commit()
+    summary['dropped_rollups'] = dropped - summary['archived_rollups']
+    return summary
+
+# Points per chunk when streaming a replayed track
+TRACK_STREAM_CHUNK = 1000
+
+@app.route('/api/tracks')
+def list_tracks():
+    """Stored trips started on a date (default today, UTC), optionally for one bus"""
+    try:
+        day = datetime.strptime(request.args['date'], '%Y-%m-%d') if 'date' in request.args else datetime.combine(
+            datetime.utcnow().date(), datetime.min.time())
+    except ValueError:
+        return jsonify({'error': 'date must be formatted as YYYY-MM-DD'}), 400
+    
+    tracks = db.session.query(
+        BusTrack.id, BusTrack.bus_id, BusTrack.started_at, BusTrack.ended_at, BusTrack.point_count,
+        db.func.length(BusTrack.data)
+    ).filter(BusTrack.started_at >= day, BusTrack.started_at < day + timedelta(days=1))
+    bus_id = request.args.get('bus_id', type=int)
+    if bus_id is not None:
+        tracks = tracks.filter(BusTrack.bus_id == bus_id)
+    
+    return jsonify({'tracks': [{
+        'id': track_id,
+        'bus_id': track_bus_id,
+        'started_at': started_at.isoformat(),
+        'ended_at': ended_at.isoformat(),
+        'point_count': point_count,
+        'size_bytes': size_bytes
+    } for track_id, track_bus_id, started_at, ended_at, point_count, size_bytes in
+        tracks.order_by(BusTrack.started_at, BusTrack.bus_id).all()]})
+
+@app.route('/api/tracks/<int:track_id>')
+def replay_track(track_id):
+    """Stream one stored trip, decoded straight from its track.
+    
+    JSON (default) holds points as [seconds from started_at, latitude, longitude, speed];
+    ?format=csv gives one timestamped row per point.
+    """
+    track = db.session.query(BusTrack.bus_id, BusTrack.started_at, BusTrack.data).filter(
+        BusTrack.id == track_id).first()
+    if track is None:
+        return jsonify({'error': 'Track not found'}), 404
+    started_at, seconds, latitudes, longitudes, speeds = decode_track(track.data)
+    
+    if request.args.get('format') == 'csv':
+        def generate_csv():
+            yield 'timestamp,latitude,longitude,speed\n'
+            for start in range(0, len(seconds), TRACK_STREAM_CHUNK):
+                end = start + TRACK_STREAM_CHUNK
+                yield ''.join(f"{(started_at + timedelta(seconds=offset)).isoformat()},{latitude},{longitude},{speed}\n"
+                              for offset, latitude, longitude, speed in zip(
+                                  seconds[start:end].tolist(), latitudes[start:end].tolist(),
+                                  longitudes[start:end].tolist(), speeds[start:end].tolist()))
+        return Response(generate_csv(), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename=track_{track_id}.csv'})
+    
+    def generate_json():
+        yield json.dumps({'id': track_id, 'bus_id': track.bus_id, 'started_at': started_at.isoformat()})[:-1]
+        yield ', "points": ['
+        for start in range(0, len(seconds), TRACK_STREAM_CHUNK):
+            end = start + TRACK_STREAM_CHUNK
+            chunk = list(zip(seconds[start:end].tolist(), latitudes[start:end].tolist(),
+                             longitudes[start:end].tolist(), speeds[start:end].tolist()))
+            yield (', ' if start else '') + json.dumps(chunk)[1:-1]
+        yield ']}'
+    return Response(generate_json(), mimetype='application/json')
+
+@app.cli.command('compact-locations')
+def compact_locations_command():
+    """Roll up old BusLocation points and expire old rollups"""
+    print(compact_bus_locations())
+
+def run_location_compaction(interval_minutes):
+    while True:
+        time.sleep(interval_minutes * 60)
+        try:
+            with app.app_context():
+                compact_bus_locations()
+        except Exception as e:
+            print(f"Location compaction failed: {e}")
+
+if app.config['LOCATION_COMPACTION_INTERVAL_MINUTES'] > 0:
+    threading.Thread(target=run_location_compaction, args=(app.config['LOCATION_COMPACTION_INTERVAL_MINUTES'],),
+                     name='location-compaction', daemon=True).start()
+
+@app.cli.command('reconcile-stop-demand')
+def reconcile_stop_demand_command():
+    """Rebuild today's StopDemand counters from DailyVote"""
+    print(reconcile_today_stop_demand())
+
+def run_stop_demand_reconciliation(interval_minutes):
+    while True:
+        time.sleep(interval_minutes * 60)
+        try:
+            with app.app_context():
+                reconcile_today_stop_demand()
+        except Exception as e:
+            print(f"Stop demand reconciliation failed: {e}")
+
+if app.config['STOP_DEMAND_RECONCILE_INTERVAL_MINUTES'] > 0:
+    threading.Thread(target=run_stop_demand_reconciliation,
+                     args=(app.config['STOP_DEMAND_RECONCILE_INTERVAL_MINUTES'],),
+                     name='stop-demand-reconciliation', daemon=True).start()
+
+def plan_assignment_filter(plan_key):
+    """Filter selecting the route assignments of the plan identified by plan_key_for().
+    
+    Dates planned before versioning existed have no version and keep their unversioned rows.
+    """
+    route_date, version_id = plan_key
+    if version_id is None:
+        return (RouteAssignment.route_date == route_date, RouteAssignment.plan_version_id.is_(None))
+    return (RouteAssignment.plan_version_id == version_id,)
+
+def current_route_assignments(route_date):
+    """Query for the route assignments of the current plan version on a date"""
+    return RouteAssignment.query.filter(*plan_assignment_filter(plan_key_for(route_date)))
+
+def publish_route_plan(route_date, fingerprint, payload):
+    """Make a plan the current one for its date, storing it as a new version if it was never saved.
+    
+    The new version's assignments go in with one bulk insert, each with its pickup time for reaching
+    college at COLLEGE_ARRIVAL_TIME, and the switch of the current version happens in the same
+    transaction, so readers see either the old plan or the new one. Superseded versions are kept.
+    """
+    current = RoutePlanVersion.query.filter_by(route_date=route_date, is_current=True).first()
+    if current is not None and current.fingerprint == fingerprint:
+        return current
+    
+    version = RoutePlanVersion.query.filter_by(route_date=route_date, fingerprint=fingerprint).order_by(
+        RoutePlanVersion.id.desc()).first()
+    if version is None:
+        engine = payload.get('engine') or {}
+        version = RoutePlanVersion(
+            route_date=route_date,
+            fingerprint=fingerprint,
+            engine=engine.get('engine'),
+            ordering=payload.get('ordering'),
+            total_cost=payload['total_cost'],
+            total_students=payload['total_students_served'],
+            total_buses=payload['total_buses_used']
+        )
+        db.session.add(version)
+        db.session.flush()
+        
+        arrival = datetime.combine(route_date, datetime.strptime(app.config['COLLEGE_ARRIVAL_TIME'], '%H:%M').time())
+        college = (COLLEGE_LOCATION['latitude'], COLLEGE_LOCATION['longitude'])
+        assignments = []
+        for route in payload['routes']:
+            times = pickup_times(speed_profile, [(stop['latitude'], stop['longitude']) for stop in route['stops']],
+                                 college, arrival)
+            assignments += [{
+                'bus_id': route['bus_id'],
+                'stop_id': stop['id'],
+                'route_date': route_date,
+                'stop_order': stop_order,
+                'estimated_time': pickup.time().replace(second=0, microsecond=0),
+                'plan_version_id': version.id
+            } for stop_order, (stop, pickup) in enumerate(zip(route['stops'], times), start=1)]
+        if assignments:
+            db.session.execute(RouteAssignment.__table__.insert(), assignments)
+    
+    RoutePlanVersion.query.filter(
+        RoutePlanVersion.route_date == route_date,
+        RoutePlanVersion.id != version.id
+    ).update({'is_current': False}, synchronize_session=False)
+    version.is_current = True
+    db.session.commit()
+    # Ingestion starts fencing the new plan's stops right away in this process
+    refresh_geofences(force=True)
+    return version
+
+def route_plan_fingerprint(today, stop_demand, available_buses, settings):
+    """Hash of everything a route plan depends on, used as its cache key and ETag.
+    
+    stop_demand rows carry each demanded stop's name, address and coordinates next to its count,
+    since the plan embeds them.
+    """
+    fingerprint = json.dumps({
+        'date': today.isoformat(),
+        'demand': [list(row) for row in stop_demand],
+        'buses': [[bus.id, bus.bus_number, bus.capacity, bus.driver_name] for bus in available_buses],
+        'settings': settings
+    }, sort_keys=True)
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+def build_route_plan(today, available_buses, engine, time_limit, ordering, incremental):
+    """Run the router for today's demand and format the plan for the frontend"""
+    global last_route_plan
     
     # Get all stops with students who voted yes
-    demanding_stops = db.session.query(BusStop, db.func.count(DailyVote.id).label('student_count')).join(
-        Student, BusStop.id == Student.stop_id
-    ).join(
-        DailyVote, Student.id == DailyVote.student_id
+    demanding_stops = db.session.query(BusStop, StopDemand.student_count).join(
+        StopDemand, BusStop.id == StopDemand.stop_id
     ).filter(
-        DailyVote.vote_date == today,
-        DailyVote.needs_bus == True
-    ).group_by(BusStop.id).all()
-    
-    # Vignan Institute of Technology, Deshmuki, Hyderabad coordinates
-    college_location = {'latitude': 17.4065, 'longitude': 78.4772}
+        StopDemand.demand_date == today,
+        StopDemand.student_count > 0
+    ).order_by(BusStop.id).all()
     
-    # Get available buses
-    available_buses = Bus.query.filter_by(is_active=True).all()
+    college_location = COLLEGE_LOCATION
     
     if not demanding_stops:
-        return jsonify({
+        return {
             'message': 'No students need bus service today',
             'routes': [],
             'total_cost': 0,
             'total_students_served': 0,
             'total_buses_used': 0
-        })
+        }
     
     # Initialize dynamic router
-    router = DynamicRouter(college_location, demanding_stops, available_buses)
-    
-    # Generate optimal routes
-    result = router.generate_optimal_routes()
+    distance_matrix = distance_cache.matrix_for([stop for stop, _ in demanding_stops])
+    router = DynamicRouter(college_location, demanding_stops, available_buses,
+                           distance_matrix=distance_matrix, ordering=ordering,
+                           workers=app.config['ROUTING_WORKERS'])
+    
+    # Generate optimal routes, repairing the previous plan when only a few stops changed
+    settings = (today, engine, ordering, tuple(sorted((bus.id, bus.capacity) for bus in available_buses)))
+    with route_plan_lock:
+        result = None
+        if incremental and last_route_plan is not None and last_route_plan.settings == settings:
+            max_stops = DynamicRouter.MAX_STOPS_PER_BUS if engine == DynamicRouter.FARTHEST_FIRST else None
+            result = router.repair_routes(last_route_plan, max_stops)
+        if result is None:
+            result = router.generate_optimal_routes(engine=engine, time_limit=time_limit)
+            last_route_plan = RoutePlan(
+                settings,
+                [(route['bus'].id, [stop.id for stop, _ in route['stops']]) for route in result['routes']],
+                [route['route_distance'] for route in result['routes']],
+                {stop.id: student_count for stop, student_count in demanding_stops}
+            )
     
     # Format response for frontend
     formatted_routes = []
     for route in result['routes']:
         formatted_route = {
+            'bus_id': route['bus'].id,
             'bus_number': route['bus'].bus_number,
             'driver_name': route['bus'].driver_name or 'TBD',
             'capacity': route['bus'].capacity,
@@ -991,16 +2114,327 @@ def optimize_routes():
         
         formatted_routes.append(formatted_route)
     
-    return jsonify({
+    return {
         'routes': formatted_routes,
         'total_cost': round(result['total_cost'], 2),
         'total_students_served': result['total_students_served'],
         'total_buses_used': result['total_buses_used'],
         'college_location': college_location,
-        'algorithm_used': 'Dynamic Farthest-First Clustering with Nearest Neighbor Optimization',
+        'algorithm_used': (DynamicRouter.FARTHEST_FIRST_DESCRIPTION if engine == DynamicRouter.FARTHEST_FIRST
+                           else ROUTING_ENGINES[engine].description),
+        'engine': result['engine'],
+        'ordering': ordering,
+        # Route costs are travel minutes over the road graph in 'road' mode, otherwise km
+        'cost_unit': 'min' if distance_matrix.road_graph is not None else 'km',
         'optimization_timestamp': datetime.now().isoformat()
+    }
+
+@app.route('/api/optimize-routes', methods=['POST'])
+def optimize_routes():
+    """Dynamic route optimization using the configured (or requested) routing engine.
+    
+    Plans are cached under a fingerprint of today's per-stop demand, the active fleet and the
+    algorithm settings. The fingerprint is sent as the ETag, so an unchanged plan costs one
+    aggregate query and a client holding it gets 304 Not Modified. Only a plan built with the
+    configured settings, or requested by an admin, becomes the college's current plan; any
+    other options just preview a plan.
+    """
+    today = datetime.now().date()
+    
+    options = request.get_json(silent=True)
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        return jsonify({'error': 'Options must be a JSON object'}), 400
+    engine = options.get('engine', app.config['ROUTING_ENGINE'])
+    if not isinstance(engine, str) or (engine != DynamicRouter.FARTHEST_FIRST and engine not in ROUTING_ENGINES):
+        return jsonify({'error': f"Unknown routing engine '{engine}'"}), 400
+    # Anyone may call this, so a request can shorten the search but never run longer than configured
+    max_time_limit = app.config['ROUTING_TIME_LIMIT']
+    try:
+        time_limit = float(options.get('time_limit', max_time_limit))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'time_limit must be a number of seconds'}), 400
+    if not 0 < time_limit <= max_time_limit:
+        return jsonify({'error': f'time_limit must be more than 0 and at most {max_time_limit} seconds'}), 400
+    ordering = options.get('ordering', app.config['ROUTE_ORDERING'])
+    if not isinstance(ordering, str) or ordering not in ORDERING_MODES:
+        return jsonify({'error': f"Unknown ordering mode '{ordering}'"}), 400
+    incremental = is_enabled(options.get('incremental', app.config['INCREMENTAL_ROUTING']))
+    
+    # Per-stop demand and the stop details the plan shows, as plain rows rather than BusStop objects
+    stop_demand = stop_demand_query(today).join(BusStop, StopDemand.stop_id == BusStop.id).add_columns(
+        BusStop.name, BusStop.address, BusStop.latitude, BusStop.longitude
+    ).order_by(StopDemand.stop_id).all()
+    
+    # Get available buses
+    available_buses = Bus.query.filter_by(is_active=True).order_by(Bus.id).all()
+    
+    etag = route_plan_fingerprint(today, stop_demand, available_buses,
+                                  [engine, time_limit, ordering, incremental, distance_cache.matrix.cache_key])
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    with route_plan_cache_lock:
+        payload = route_plan_cache.get(etag)
+        if payload is not None:
+            route_plan_cache.move_to_end(etag)
+    
+    if payload is None:
+        payload = build_route_plan(today, available_buses, engine, time_limit, ordering, incremental)
+        with route_plan_cache_lock:
+            route_plan_cache[etag] = payload
+            while len(route_plan_cache) > ROUTE_PLAN_CACHE_SIZE:
+                route_plan_cache.popitem(last=False)
+    
+    # Student route pages read the stored current version rather than re-optimizing
+    defaults = (app.config['ROUTING_ENGINE'], app.config['ROUTING_TIME_LIMIT'], app.config['ROUTE_ORDERING'],
+                app.config['INCREMENTAL_ROUTING'])
+    if (engine, time_limit, ordering, incremental) == defaults or 'admin_logged_in' in session:
+        publish_route_plan(today, etag, payload)
+    
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/route-plans')
+def route_plan_versions():
+    """Stored plan versions for a date (default today), newest first, for comparing plans"""
+    try:
+        route_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date() if 'date' in request.args \
+            else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'date must be formatted as YYYY-MM-DD'}), 400
+    
+    versions = RoutePlanVersion.query.filter_by(route_date=route_date).order_by(RoutePlanVersion.id.desc()).all()
+    return jsonify({
+        'date': route_date.isoformat(),
+        'versions': [{
+            'id': version.id,
+            'is_current': version.is_current,
+            'engine': version.engine,
+            'ordering': version.ordering,
+            'total_cost': version.total_cost,
+            'total_students_served': version.total_students,
+            'total_buses_used': version.total_buses,
+            'created_at': version.created_at.isoformat()
+        } for version in versions]
     })
 
+# Travel speeds learned from rolled-up GPS history, and the arrival estimates built on them
+speed_profile = SpeedProfile()
+eta_engine = EtaEngine(speed_profile)
+speed_profile_loader = None
+speed_profile_loader_lock = threading.Lock()
+
+def load_speed_profile():
+    """Rebuild the speed profile from every moving minute in BusLocationRollup"""
+    try:
+        with app.app_context():
+            speed_profile.replace(db.session.query(
+                BusLocationRollup.latitude, BusLocationRollup.longitude, BusLocationRollup.minute,
+                BusLocationRollup.point_count, BusLocationRollup.avg_speed
+            ).filter(BusLocationRollup.avg_speed > 0).yield_per(COMPACTION_BATCH_SIZE))
+    except Exception as e:
+        print(f"Speed profile load failed: {e}")
+
+def ensure_speed_profile():
+    """Build the speed profile in the background the first time estimates are asked for"""
+    global speed_profile_loader
+    with speed_profile_loader_lock:
+        if speed_profile_loader is None and not speed_profile.loaded:
+            speed_profile_loader = threading.Thread(target=load_speed_profile, name='speed-profile', daemon=True)
+            speed_profile_loader.start()
+
+def plan_key_for(route_date):
+    """Identifies the current plan of a date, so engines holding a plan can tell when it changed"""
+    version = db.session.query(RoutePlanVersion.id).filter_by(route_date=route_date, is_current=True).first()
+    return (route_date, version.id if version else None)
+
+def plan_stops(route_date):
+    """Stops of the current plan per bus id in visiting order, as (stop id, name, latitude, longitude)"""
+    rows = current_route_assignments(route_date).join(
+        BusStop, RouteAssignment.stop_id == BusStop.id
+    ).with_entities(
+        RouteAssignment.bus_id, BusStop.id, BusStop.name, BusStop.latitude, BusStop.longitude
+    ).order_by(RouteAssignment.bus_id, RouteAssignment.stop_order).all()
+    routes = {}
+    for bus_id, *stop in rows:
+        routes.setdefault(bus_id, []).append(tuple(stop))
+    return routes
+
+def refresh_etas(today):
+    """Load today's current plan into the ETA engine if it changed, then feed it the positions that moved"""
+    ensure_speed_profile()
+    plan_key = plan_key_for(today)
+    if eta_engine.plan_key != plan_key:
+        routes = plan_stops(today)
+        # Every route ends at the college
+        for route in routes.values():
+            route.append((None, 'College', COLLEGE_LOCATION['latitude'], COLLEGE_LOCATION['longitude']))
+        eta_engine.set_routes(plan_key, routes)
+    
+    if app.config['LIVE_POSITION_STORE'] == 'database':
+        sync_position_store()
+    eta_engine.catch_up(position_store)
+
+def minutes_until(moment, now):
+    return max(0, round((moment - now).total_seconds() / 60))
+
+@app.route('/api/etas')
+def get_etas():
+    """Predicted arrival at each remaining stop of every bus on today's plan (or one bus with ?bus_id=)"""
+    refresh_etas(datetime.now().date())
+    bus_id = request.args.get('bus_id', type=int)
+    bus_ids = [bus_id] if bus_id is not None else sorted(eta_engine.routes)
+    bus_numbers = dict(db.session.query(Bus.id, Bus.bus_number).filter(Bus.id.in_(bus_ids)).all())
+    now = datetime.utcnow()
+    
+    buses = []
+    for bus_id in bus_ids:
+        estimate = eta_engine.arrivals(bus_id)
+        buses.append({
+            'bus_id': bus_id,
+            'bus_number': bus_numbers.get(bus_id, 'Unknown'),
+            # Buses that have not reported a position yet have no estimates
+            'updated_at': estimate[0].isoformat() if estimate else None,
+            'stops': [{
+                'stop_id': stop_id,
+                'stop_name': stop_name,
+                'eta': arrival.isoformat(),
+                'minutes_away': minutes_until(arrival, now)
+            } for stop_id, stop_name, arrival in (estimate[1] if estimate else [])]
+        })
+    
+    return jsonify({'buses': buses, 'speed_profile_loaded': speed_profile.loaded})
+
+# Stop arrival detection on ingestion; the current plan is looked up at most this often
+GEOFENCE_PLAN_CHECK_SECONDS = 30
+geofence_engine = GeofenceEngine()
+geofence_stop_names = {}
+geofences_checked_at = None
+# Newest StopEvent id already pushed to stream clients (database mode only)
+last_stop_event_id = None
+
+def buses_at_stop(route_date):
+    """Stop each bus last arrived at without departing again, from the recorded events"""
+    last_events = db.session.query(db.func.max(StopEvent.id)).filter(
+        StopEvent.route_date == route_date).group_by(StopEvent.bus_id)
+    return dict(db.session.query(StopEvent.bus_id, StopEvent.stop_id).filter(
+        StopEvent.id.in_(last_events), StopEvent.event == ARRIVAL).all())
+
+def refresh_geofences(force=False):
+    """Fence the stops of today's current plan if it changed since it was last loaded"""
+    global geofences_checked_at
+    if not force and geofences_checked_at is not None and \
+            time.monotonic() - geofences_checked_at < GEOFENCE_PLAN_CHECK_SECONDS:
+        return
+    geofences_checked_at = time.monotonic()
+    today = datetime.now().date()
+    plan_key = plan_key_for(today)
+    if plan_key == geofence_engine.plan_key:
+        return
+    routes = plan_stops(today)
+    geofence_stop_names.update((stop_id, name) for stops in routes.values() for stop_id, name, _, _ in stops)
+    geofence_engine.set_routes(plan_key, {
+        bus_id: [(stop_id, latitude, longitude) for stop_id, _, latitude, longitude in stops]
+        for bus_id, stops in routes.items()
+    }, at_stop=buses_at_stop(today))
+
+def drop_repeated_events(events):
+    """Leave out events that repeat a bus's last recorded one, as when workers each see part of its points"""
+    last = {bus_id: (stop_id, event) for bus_id, stop_id, event in db.session.query(
+        StopEvent.bus_id, StopEvent.stop_id, StopEvent.event
+    ).filter(StopEvent.id.in_(db.session.query(db.func.max(StopEvent.id)).filter(
+        StopEvent.route_date == events[0]['route_date'],
+        StopEvent.bus_id.in_({event['bus_id'] for event in events})
+    ).group_by(StopEvent.bus_id))).all()}
+    kept = []
+    for event in events:
+        if last.get(event['bus_id']) != (event['stop_id'], event['event']):
+            kept.append(event)
+            last[event['bus_id']] = (event['stop_id'], event['event'])
+    return kept
+
+def detect_stop_events(rows):
+    """Run location rows through the geofences in time order; returns StopEvent rows to record"""
+    refresh_geofences()
+    if not geofence_engine.fences:
+        return []
+    route_date = geofence_engine.plan_key[0]
+    events = []
+    for row in sorted(rows, key=lambda row: row['timestamp']):
+        for event in geofence_engine.process(row['bus_id'], row['latitude'], row['longitude'], row['timestamp']):
+            events.append(dict(event, route_date=route_date))
+    if events and app.config['LIVE_POSITION_STORE'] == 'database':
+        events = drop_repeated_events(events)
+    return events
+
+def format_stop_event(event):
+    return {
+        'bus_id': event['bus_id'],
+        'stop_id': event['stop_id'],
+        'stop_name': geofence_stop_names.get(event['stop_id'], 'Unknown'),
+        'event': event['event'],
+        'timestamp': event['timestamp'].strftime('%I:%M %p'),
+        'updated_at': event['timestamp'].isoformat()
+    }
+
+def encode_stop_events(events):
+    return f"event: stops\ndata: {json.dumps([format_stop_event(event) for event in events])}\n\n"
+
+def publish_stop_events(events):
+    """Push new stop events to this process's stream clients; other workers pick them up from the table"""
+    if events and app.config['LIVE_POSITION_STORE'] != 'database':
+        position_broadcaster.broadcast(encode_stop_events(events))
+
+def sync_stop_events():
+    """Push stop events recorded (by any worker) since the last call, in database mode"""
+    global last_stop_event_id
+    try:
+        with app.app_context():
+            if last_stop_event_id is None:
+                last_stop_event_id = db.session.query(db.func.max(StopEvent.id)).scalar() or 0
+                return
+            rows = db.session.query(
+                StopEvent.id, StopEvent.bus_id, StopEvent.stop_id, StopEvent.event, StopEvent.timestamp
+            ).filter(StopEvent.id > last_stop_event_id).order_by(StopEvent.id).all()
+            if rows:
+                last_stop_event_id = rows[-1].id
+                position_broadcaster.broadcast(encode_stop_events(
+                    [{'bus_id': bus_id, 'stop_id': stop_id, 'event': event, 'timestamp': timestamp}
+                     for _, bus_id, stop_id, event, timestamp in rows]))
+    except Exception as e:
+        print(f"Stop event sync failed: {e}")
+
+@app.route('/api/stop-events')
+def get_stop_events():
+    """Recorded stop arrivals and departures of a day (default today), optionally for one bus or stop"""
+    try:
+        route_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date() if 'date' in request.args \
+            else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'date must be formatted as YYYY-MM-DD'}), 400
+    
+    events = db.session.query(
+        StopEvent.bus_id, StopEvent.stop_id, BusStop.name, StopEvent.event, StopEvent.timestamp
+    ).join(BusStop, StopEvent.stop_id == BusStop.id).filter(StopEvent.route_date == route_date)
+    for argument, column in (('bus_id', StopEvent.bus_id), ('stop_id', StopEvent.stop_id)):
+        value = request.args.get(argument, type=int)
+        if value is not None:
+            events = events.filter(column == value)
+    
+    return jsonify({'events': [{
+        'bus_id': bus_id,
+        'stop_id': stop_id,
+        'stop_name': stop_name,
+        'event': event,
+        'timestamp': timestamp.strftime('%I:%M %p'),
+        'updated_at': timestamp.isoformat()
+    } for bus_id, stop_id, stop_name, event, timestamp in events.order_by(StopEvent.timestamp, StopEvent.id).all()]})
+
 @app.route('/api/simulate-votes', methods=['POST'])
 def simulate_votes():
     """Simulate votes for all students for testing purposes"""
@@ -1026,6 +2460,8 @@ def simulate_votes():
         db.session.add(vote)
         votes_created += 1
     
+    db.session.flush()
+    reconcile_stop_demand(today)
     db.session.commit()
     
     return jsonify({
@@ -1140,6 +2576,8 @@ if __name__ == '__main__':
                 )
                 db.session.add(vote)
             
+            db.session.flush()
+            reconcile_stop_demand(today)
             db.session.commit()
             print("Sample data created with students and votes!")
     
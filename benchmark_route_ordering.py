@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Benchmark for stop ordering modes
+Prints runtime and route length by cluster size for greedy, heuristic and exact ordering
+"""
+
+import random
+import time
+
+from distance_matrix import pairwise_distances
+from route_ordering import EXACT, EXACT_MAX_STOPS, GREEDY, HEURISTIC, order_stops
+
+MODES = (GREEDY, HEURISTIC, EXACT)
+REPEATS = 3
+
+
+def random_matrix(stop_count, rng):
+    points = [(17.4 + rng.uniform(-0.1, 0.1), 78.47 + rng.uniform(-0.1, 0.1)) for _ in range(stop_count + 2)]
+    return pairwise_distances(points, points)
+
+
+def benchmark(max_stops=EXACT_MAX_STOPS, repeats=REPEATS, seed=42):
+    rng = random.Random(seed)
+    print(f"{'stops':>5} " + " ".join(f"{mode + ' ms':>13} {mode + ' km':>13}" for mode in MODES))
+    for stop_count in range(2, max_stops + 1):
+        matrices = [random_matrix(stop_count, rng) for _ in range(repeats)]
+        row = []
+        for mode in MODES:
+            started = time.perf_counter()
+            lengths = [order_stops(distances, mode)[1] for distances in matrices]
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeats
+            row.append(f"{elapsed_ms:13.2f} {sum(lengths) / repeats:13.2f}")
+        print(f"{stop_count:>5} " + " ".join(row))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV import helpers
+Reads an upload a chunk of rows at a time and collects one error report instead of a message per row
+"""
+
+import csv
+import io
+
+# Rows parsed, inserted and committed together
+IMPORT_CHUNK_ROWS = 5000
+# Errors listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def csv_chunks(stream, required_columns, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Lists of (line number, row dict) read from a binary CSV stream without loading it whole.
+
+    Raises ValueError if the header lacks one of required_columns, and UnicodeDecodeError
+    (a ValueError too) when the file is not UTF-8.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(text)
+        missing = [column for column in required_columns if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+        chunk = []
+        for row in reader:
+            # Line numbers count the header, as a spreadsheet shows them
+            chunk.append((reader.line_num, row))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        # Leave the upload's own stream open for whoever owns it
+        text.detach()
+
+
+class ImportReport:
+    """Counts of imported, skipped and rejected rows, with the first MAX_REPORTED_ERRORS errors"""
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message)
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self, noun):
+        summary = f'Imported {self.imported} {noun}, skipped {self.skipped} already present'
+        if self.error_count:
+            summary += f', rejected {self.error_count} rows'
+        return summary
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+            'errors_not_shown': self.error_count - len(self.errors)
+        }
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Distance matrix engine for route optimization
+Computes stop-to-stop and stop-to-college distances in one batched pass
+"""
+
+import math
+import os
+import threading
+
+import numpy as np
+
+# Distance modes: 'haversine' is fast (spherical earth), 'vincenty' is accurate (WGS-84 ellipsoid)
+HAVERSINE = 'haversine'
+VINCENTY = 'vincenty'
+DISTANCE_MODES = (HAVERSINE, VINCENTY)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid, the same model geopy's geodesic uses
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+def haversine_matrix(origins, destinations):
+    """Great-circle distances in km between every origin and every destination"""
+    lat1 = np.radians(origins[:, 0])[:, None]
+    lon1 = np.radians(origins[:, 1])[:, None]
+    lat2 = np.radians(destinations[:, 0])[None, :]
+    lon2 = np.radians(destinations[:, 1])[None, :]
+
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points, without numpy overhead for single lookups"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def vincenty_matrix(origins, destinations):
+    """Ellipsoidal (Vincenty inverse) distances in km between every origin and every destination"""
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(np.radians(origins[:, 0])))[:, None]
+    u2 = np.arctan((1 - f) * np.tan(np.radians(destinations[:, 0])))[None, :]
+    L = np.radians(destinations[:, 1])[None, :] - np.radians(origins[:, 1])[:, None]
+
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    lam = np.broadcast_to(L, (len(origins), len(destinations))).copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2
+                                + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos^2(alpha) == 0
+            cos_2sigma_m = np.where(cos_sq_alpha == 0, 0.0,
+                                    cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha)
+
+            c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            lam_prev = lam
+            lam = L + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+
+            if np.all(np.abs(lam - lam_prev) < VINCENTY_TOLERANCE):
+                break
+
+    u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+
+    distances = WGS84_B * big_a * (sigma - delta_sigma)
+
+    # Nearly antipodal pairs may not converge; a spherical distance is good enough there
+    unresolved = ~np.isfinite(distances)
+    if unresolved.any():
+        distances = np.where(unresolved, haversine_matrix(origins, destinations), distances)
+    return distances
+
+
+def pairwise_distances(origins, destinations, mode=HAVERSINE):
+    """Distance matrix in km between two lists of (latitude, longitude) points"""
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode '{mode}', expected one of {DISTANCE_MODES}")
+
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    if mode == VINCENTY:
+        return vincenty_matrix(origins, destinations)
+    return haversine_matrix(origins, destinations)
+
+
+class DistanceMatrix:
+    """Stop-to-stop and stop-to-college distances, looked up by stop id"""
+
+    def __init__(self, stops, college_location, mode=HAVERSINE, road_graph=None):
+        self.mode = mode
+        self.road_graph = road_graph  # When set, entries are road travel minutes instead of km
+        self.college_point = (college_location['latitude'], college_location['longitude'])
+        self._set_state([], np.empty((0, 2)), np.empty((0, 0)), np.empty(0))
+        self._add(list(stops))
+
+    def _set_state(self, stop_ids, coordinates, stop_distances, college_distances):
+        self.stop_ids = list(stop_ids)
+        self.index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.coordinates = coordinates
+        self.stop_distances = stop_distances
+        self.college_distances = college_distances
+
+    @property
+    def cache_key(self):
+        """What the saved entries were computed with; a different graph file invalidates them"""
+        return self.mode if self.road_graph is None else f'{self.mode}:{self.road_graph.checksum}'
+
+    def _measure(self, origins, destinations):
+        if self.road_graph is not None:
+            return self.road_graph.travel_time_matrix(origins, destinations)
+        return pairwise_distances(origins, destinations, self.mode)
+
+    def _add(self, stops):
+        """Append stops, computing only the new rows and columns"""
+        if not stops:
+            return
+        new_coordinates = np.array([(stop.latitude, stop.longitude) for stop in stops], dtype=float)
+        cross = self._measure(new_coordinates, self.coordinates)
+        block = self._measure(new_coordinates, new_coordinates)
+        # Average out rounding differences so a->b and b->a are exactly equal
+        block = (block + block.T) / 2
+
+        old_count = len(self.stop_ids)
+        stop_distances = np.empty((old_count + len(stops),) * 2)
+        stop_distances[:old_count, :old_count] = self.stop_distances
+        stop_distances[old_count:, :old_count] = cross
+        stop_distances[:old_count, old_count:] = cross.T
+        stop_distances[old_count:, old_count:] = block
+        college_distances = np.concatenate([
+            self.college_distances,
+            self._measure(new_coordinates, [self.college_point])[:, 0]
+        ])
+
+        self._set_state(self.stop_ids + [stop.id for stop in stops],
+                        np.vstack([self.coordinates, new_coordinates]),
+                        stop_distances, college_distances)
+
+    def _keep(self, positions):
+        positions = np.asarray(positions, dtype=int)
+        self._set_state([self.stop_ids[i] for i in positions],
+                        self.coordinates[positions],
+                        self.stop_distances[np.ix_(positions, positions)],
+                        self.college_distances[positions])
+
+    def _copy(self):
+        matrix = DistanceMatrix.__new__(DistanceMatrix)
+        matrix.mode = self.mode
+        matrix.road_graph = self.road_graph
+        matrix.college_point = self.college_point
+        matrix._set_state(self.stop_ids, self.coordinates, self.stop_distances, self.college_distances)
+        return matrix
+
+    def stale_stops(self, stops):
+        """Stops that are missing from the matrix or whose coordinates have changed"""
+        stale = []
+        for stop in stops:
+            i = self.index.get(stop.id)
+            if i is None or tuple(self.coordinates[i]) != (stop.latitude, stop.longitude):
+                stale.append(stop)
+        return stale
+
+    def with_stops(self, stops, prune=False):
+        """Matrix covering the given stops, recomputing only new or moved ones.
+
+        Returns self when nothing changed, otherwise a new matrix, so routers holding
+        the old one are never affected. With prune=True stops not listed are dropped.
+        """
+        stops = list(stops)
+        stale = self.stale_stops(stops)
+        stale_ids = {stop.id for stop in stale}
+        wanted_ids = {stop.id for stop in stops} if prune else None
+        keep = [i for i, stop_id in enumerate(self.stop_ids)
+                if stop_id not in stale_ids and (wanted_ids is None or stop_id in wanted_ids)]
+        if not stale and len(keep) == len(self.stop_ids):
+            return self
+
+        matrix = self._copy()
+        matrix._keep(keep)
+        matrix._add(stale)
+        return matrix
+
+    def save(self, path):
+        """Write the matrix to disk atomically"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     mode=np.array(self.cache_key),
+                     college_point=np.array(self.college_point, dtype=float),
+                     stop_ids=np.array(self.stop_ids, dtype=np.int64),
+                     coordinates=self.coordinates,
+                     stop_distances=self.stop_distances,
+                     college_distances=self.college_distances)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, college_location, mode=HAVERSINE, road_graph=None):
+        """Read a saved matrix, or return None if it is missing or was built for another college/mode/graph"""
+        if not os.path.exists(path):
+            return None
+        matrix = cls([], college_location, mode, road_graph)
+        try:
+            with np.load(path) as data:
+                if str(data['mode']) != matrix.cache_key or tuple(data['college_point']) != matrix.college_point:
+                    return None
+                matrix._set_state(data['stop_ids'].tolist(), data['coordinates'],
+                                  data['stop_distances'], data['college_distances'])
+        except (OSError, ValueError, KeyError):
+            return None
+        return matrix
+
+    @property
+    def units_per_km(self):
+        """Least an entry grows per km of straight-line separation (1 for km, less for road minutes)"""
+        return 1.0 if self.road_graph is None else self.road_graph.minutes_per_km
+
+    def __contains__(self, stop_id):
+        return stop_id in self.index
+
+    def between(self, stop_id_a, stop_id_b):
+        """Distance in km between two stops"""
+        return float(self.stop_distances[self.index[stop_id_a], self.index[stop_id_b]])
+
+    def to_college(self, stop_id):
+        """Distance in km between a stop and the college"""
+        return float(self.college_distances[self.index[stop_id]])
+
+
+class DistanceCache:
+    """Persistent stop distance matrix shared by the router and the stop importers"""
+
+    def __init__(self, path, college_location, mode=HAVERSINE, road_graph=None):
+        self.path = path
+        self.college_location = college_location
+        self.mode = mode
+        self.road_graph = road_graph
+        self.lock = threading.Lock()
+        self.matrix = DistanceMatrix([], college_location, mode, road_graph)
+        self.loaded_mtime = None
+
+    def load(self):
+        """Load the matrix file if another process has written a newer one"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.loaded_mtime:
+            return
+        matrix = DistanceMatrix.load(self.path, self.college_location, self.mode, self.road_graph)
+        if matrix is not None:
+            self.matrix = matrix
+        self.loaded_mtime = mtime
+
+    def _store(self, matrix):
+        if matrix is self.matrix:
+            return
+        self.matrix = matrix
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        matrix.save(self.path)
+        self.loaded_mtime = os.path.getmtime(self.path)
+
+    def matrix_for(self, stops):
+        """Cached matrix covering the given stops; only uncached stops are computed"""
+        with self.lock:
+            self.load()
+            self._store(self.matrix.with_stops(stops))
+            return self.matrix
+
+    def refresh(self, stops):
+        """Bring the cache in line with the full stop list after an import"""
+        with self.lock:
+            self.load()
+            self._store(self.matrix.with_stops(stops, prune=True))
+            return self.matrix
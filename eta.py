@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Stop arrival time prediction from historical bus tracks
+Learns speeds per map cell and time of day from GPS rollups and projects them along each bus's remaining stops
+"""
+
+import math
+import threading
+from datetime import timedelta
+
+from distance_matrix import haversine_km
+from road_network import DEFAULT_SPEED_KMH, travel_minutes
+
+BUCKET_MINUTES = 15
+CELL_DEGREES = 0.01  # About 1.1 km
+# Fewer points than this in a cell and bucket fall back to the bucket's citywide speed
+MIN_CELL_POINTS = 3
+MIN_SPEED_KMH = 5.0
+# Legs are sampled at this spacing to pick up the speed of every cell they cross
+SAMPLE_SPACING_KM = 0.5
+# Roads are longer than the straight line between two stops
+ROAD_DETOUR_FACTOR = 1.3
+STOP_DWELL_MINUTES = 1.0
+# A bus this close to its next stop has reached it
+ARRIVAL_RADIUS_KM = 0.15
+# A bus whose detour via its position is at most this times a leg's length is driving that leg
+LEG_CORRIDOR_FACTOR = 1.5
+
+
+def time_bucket(moment):
+    return (moment.hour * 60 + moment.minute) // BUCKET_MINUTES
+
+
+def cell_of(latitude, longitude):
+    return math.floor(latitude / CELL_DEGREES), math.floor(longitude / CELL_DEGREES)
+
+
+def distance_km(a, b):
+    return haversine_km(a[0], a[1], b[0], b[1])
+
+
+class SpeedProfile:
+    """Mean bus speed per (map cell, time-of-day bucket), built from per-minute GPS rollups"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cells = {}  # (cell, bucket) -> [speed * points, points]
+        self.buckets = {}  # bucket -> [speed * points, points] over every cell
+        self.legs = {}  # (start, end, bucket) -> minutes, cleared whenever speeds change
+        self.loaded = False
+
+    @staticmethod
+    def _fold(cells, buckets, samples):
+        for latitude, longitude, minute, point_count, avg_speed in samples:
+            # Parked minutes say nothing about traffic
+            if not avg_speed or avg_speed <= 0:
+                continue
+            bucket = time_bucket(minute)
+            for totals in (cells.setdefault((cell_of(latitude, longitude), bucket), [0.0, 0]),
+                           buckets.setdefault(bucket, [0.0, 0])):
+                totals[0] += avg_speed * point_count
+                totals[1] += point_count
+
+    def replace(self, samples):
+        """Rebuild from (latitude, longitude, minute, point_count, avg_speed) samples"""
+        cells, buckets = {}, {}
+        self._fold(cells, buckets, samples)
+        with self.lock:
+            self.cells, self.buckets, self.legs = cells, buckets, {}
+            self.loaded = True
+
+    def add(self, samples):
+        """Fold in newly rolled-up minutes"""
+        with self.lock:
+            self._fold(self.cells, self.buckets, samples)
+            self.legs = {}
+
+    def speed(self, cell, bucket):
+        totals = self.cells.get((cell, bucket))
+        if totals is None or totals[1] < MIN_CELL_POINTS:
+            totals = self.buckets.get(bucket)
+        if totals is None or not totals[1]:
+            return DEFAULT_SPEED_KMH
+        return max(totals[0] / totals[1], MIN_SPEED_KMH)
+
+    def leg_minutes(self, start, end, bucket, cache=True):
+        """Minutes to drive from start to end (latitude, longitude) in a time bucket.
+
+        The leg is split into short pieces, each driven at the speed of the cell it lies in.
+        Legs between fixed points (stops) are cached; legs from a bus's live position are not.
+        """
+        key = (start, end, bucket)
+        with self.lock:
+            if cache and key in self.legs:
+                return self.legs[key]
+            road_km = distance_km(start, end) * ROAD_DETOUR_FACTOR
+            pieces = max(1, math.ceil(road_km / SAMPLE_SPACING_KM))
+            minutes = 0.0
+            for i in range(pieces):
+                fraction = (i + 0.5) / pieces
+                cell = cell_of(start[0] + (end[0] - start[0]) * fraction, start[1] + (end[1] - start[1]) * fraction)
+                minutes += travel_minutes(road_km / pieces, self.speed(cell, bucket))
+            if cache:
+                self.legs[key] = minutes
+            return minutes
+
+
+class EtaEngine:
+    """Arrival estimates for the remaining stops of every bus, advanced as buses report positions"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.lock = threading.RLock()
+        self.plan_key = None
+        self.routes = {}  # bus id -> [(stop id, stop name, latitude, longitude)], ending at the destination
+        self.stop_buses = {}  # stop id -> ids of the buses calling there
+        self.progress = {}  # bus id -> index of the next stop on its route
+        self.estimates = {}  # bus id -> (position timestamp, [(route entry, arrival time)])
+        self.store_version = 0  # Position store version already observed
+
+    def set_routes(self, plan_key, routes):
+        """Switch to a new plan; returns False if plan_key is already loaded"""
+        with self.lock:
+            if plan_key == self.plan_key:
+                return False
+            self.plan_key = plan_key
+            self.routes = routes
+            self.stop_buses = {}
+            for bus_id, route in routes.items():
+                for entry in route:
+                    self.stop_buses.setdefault(entry[0], []).append(bus_id)
+            self.progress = {}
+            self.estimates = {}
+            self.store_version = 0
+            return True
+
+    def catch_up(self, store):
+        """Observe every position that changed in a PositionStore since the last call"""
+        with self.lock:
+            version, positions = store.changes_since(self.store_version)
+            for position in positions:
+                self.observe(position)
+            self.store_version = version
+
+    def observe(self, position):
+        """Move a bus along its route to a reported position and re-estimate its remaining stops.
+
+        The first stop has to be reached (within ARRIVAL_RADIUS_KM), since the drive out to it
+        may pass later stops. After that a stop also counts as passed once the bus is driving
+        the next leg and is nearer its end than the stop is, so positions may arrive sparsely.
+        Work is proportional to the stops left on the route.
+        """
+        with self.lock:
+            bus_id = position['bus_id']
+            route = self.routes.get(bus_id)
+            if not route:
+                return
+            previous = self.estimates.get(bus_id)
+            if previous is not None and previous[0] > position['timestamp']:
+                return
+
+            here = (position['latitude'], position['longitude'])
+            index = self.progress.get(bus_id, 0)
+            while index < len(route) - 1:
+                stop, following = route[index][2:], route[index + 1][2:]
+                leg_km = distance_km(stop, following)
+                to_stop, to_following = distance_km(here, stop), distance_km(here, following)
+                if to_stop <= ARRIVAL_RADIUS_KM or (
+                        index > 0 and to_following < leg_km and to_stop + to_following <= leg_km * LEG_CORRIDOR_FACTOR):
+                    index += 1
+                else:
+                    break
+            self.progress[bus_id] = index
+
+            clock = position['timestamp']
+            origin = here
+            arrivals = []
+            for offset, entry in enumerate(route[index:]):
+                stop = entry[2:]
+                clock += timedelta(minutes=self.profile.leg_minutes(origin, stop, time_bucket(clock), cache=offset > 0))
+                arrivals.append((entry, clock))
+                clock += timedelta(minutes=STOP_DWELL_MINUTES)
+                origin = stop
+            self.estimates[bus_id] = (position['timestamp'], arrivals)
+
+    def arrivals(self, bus_id):
+        """(position timestamp, [(stop id, stop name, arrival time)]) for a bus, or None before it reports"""
+        with self.lock:
+            estimate = self.estimates.get(bus_id)
+            if estimate is None:
+                return None
+            timestamp, arrivals = estimate
+            return timestamp, [(entry[0], entry[1], arrival) for entry, arrival in arrivals]
+
+    def next_arrival(self, stop_id):
+        """(bus id, arrival time) of the earliest estimated bus still to reach a stop, or None"""
+        with self.lock:
+            best = None
+            for bus_id in self.stop_buses.get(stop_id, ()):
+                estimate = self.estimates.get(bus_id)
+                for entry, arrival in estimate[1] if estimate else ():
+                    if entry[0] == stop_id and (best is None or arrival < best[1]):
+                        best = (bus_id, arrival)
+            return best
+
+
+def pickup_times(profile, stops, destination, arrival):
+    """Times a bus must reach each of stops (latitude, longitude), visited in order, to get to
+    destination at arrival; worked back from the arrival, stopping STOP_DWELL_MINUTES at each stop
+    """
+    clock = arrival
+    origin = destination
+    times = []
+    for stop in reversed(stops):
+        clock -= timedelta(minutes=profile.leg_minutes(stop, origin, time_bucket(clock)))
+        times.append(clock)
+        clock -= timedelta(minutes=STOP_DWELL_MINUTES)
+        origin = stop
+    return times[::-1]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Stop arrival and departure detection for incoming GPS points
+Checks each point only against the fences around the stops on its own bus's route
+"""
+
+import threading
+
+from distance_matrix import haversine_km
+from spatial_index import bounding_box
+
+# A bus comes within this distance of a stop to arrive, and has to get this far away to depart;
+# the gap keeps GPS jitter at the edge of a fence from producing a run of arrivals and departures
+ARRIVAL_RADIUS_KM = 0.1
+DEPARTURE_RADIUS_KM = 0.15
+
+ARRIVAL = 'arrival'
+DEPARTURE = 'departure'
+
+
+def _contains(box, latitude, longitude):
+    min_lat, max_lat, min_lon, max_lon = box
+    return min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+
+
+class GeofenceEngine:
+    """Tracks which route stop each bus is at and turns its GPS points into stop events"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.plan_key = None
+        self.fences = {}  # bus id -> (box around all its fences, {stop id: (latitude, longitude, arrival box)})
+        self.at_stop = {}  # bus id -> stop id it is inside the fence of
+        self.last_seen = {}  # bus id -> timestamp of its last processed point
+
+    def set_routes(self, plan_key, routes, at_stop=None):
+        """Fence the stops of a new plan; routes maps bus id -> [(stop id, latitude, longitude)].
+
+        at_stop optionally gives the stop each bus is already at, e.g. from recorded events.
+        Returns False if plan_key is already loaded.
+        """
+        with self.lock:
+            if plan_key == self.plan_key:
+                return False
+            fences = {}
+            for bus_id, stops in routes.items():
+                if not stops:
+                    continue
+                stop_fences = {stop_id: (latitude, longitude, bounding_box((latitude, longitude), ARRIVAL_RADIUS_KM))
+                               for stop_id, latitude, longitude in stops}
+                boxes = [bounding_box((latitude, longitude), DEPARTURE_RADIUS_KM)
+                         for _, latitude, longitude in stops]
+                route_box = (min(box[0] for box in boxes), max(box[1] for box in boxes),
+                             min(box[2] for box in boxes), max(box[3] for box in boxes))
+                fences[bus_id] = (route_box, stop_fences)
+            self.plan_key = plan_key
+            self.fences = fences
+            self.at_stop = {bus_id: stop_id for bus_id, stop_id in (at_stop or {}).items()
+                            if stop_id in fences.get(bus_id, (None, {}))[1]}
+            self.last_seen = {}
+            return True
+
+    def process(self, bus_id, latitude, longitude, timestamp):
+        """Events ({'bus_id', 'stop_id', 'event', 'timestamp'}) caused by one point, in order.
+
+        Points older than the last one seen for the bus are ignored. Most points fall outside
+        every fence of their route and cost one box check.
+        """
+        with self.lock:
+            fences = self.fences.get(bus_id)
+            if fences is None or timestamp < self.last_seen.get(bus_id, timestamp):
+                return []
+            self.last_seen[bus_id] = timestamp
+            route_box, stop_fences = fences
+
+            events = []
+            stop_id = self.at_stop.get(bus_id)
+            if stop_id is not None:
+                stop_latitude, stop_longitude, _ = stop_fences[stop_id]
+                if haversine_km(latitude, longitude, stop_latitude, stop_longitude) <= DEPARTURE_RADIUS_KM:
+                    return []
+                del self.at_stop[bus_id]
+                events.append({'bus_id': bus_id, 'stop_id': stop_id, 'event': DEPARTURE, 'timestamp': timestamp})
+
+            if not _contains(route_box, latitude, longitude):
+                return events
+            for stop_id, (stop_latitude, stop_longitude, box) in stop_fences.items():
+                if (_contains(box, latitude, longitude)
+                        and haversine_km(latitude, longitude, stop_latitude, stop_longitude) <= ARRIVAL_RADIUS_KM):
+                    self.at_stop[bus_id] = stop_id
+                    events.append({'bus_id': bus_id, 'stop_id': stop_id, 'event': ARRIVAL, 'timestamp': timestamp})
+                    break
+            return events
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Incremental repair of the last route plan when per-stop demand changes
+Only routes whose stops changed are touched; a full rebuild is needed once the plan drifts too far
+"""
+
+# Rebuild from scratch once km per student is this much worse than right after the last rebuild
+REBUILD_DRIFT = 0.10
+
+
+class RoutePlan:
+    """Last optimized plan as (bus id, [stop ids]) routes, with the demand it was built for"""
+
+    def __init__(self, settings, routes, route_distances, demands):
+        self.settings = settings  # Engine, ordering and fleet the plan was built with
+        self.routes = [(bus_id, list(stop_ids)) for bus_id, stop_ids in routes]
+        self.route_distances = list(route_distances)
+        self.demands = dict(demands)
+        self.unserved = []
+        self.rebuild_cost = self.total_cost()
+        self.rebuild_students = self.students_served()
+
+    def route_load(self, stop_ids):
+        return sum(self.demands.get(stop_id, 0) for stop_id in stop_ids)
+
+    def total_cost(self):
+        return sum(self.route_distances)
+
+    def students_served(self):
+        return sum(self.route_load(stop_ids) for _, stop_ids in self.routes)
+
+    def has_drifted(self):
+        """True when the repaired plan is noticeably less efficient than a fresh one was"""
+        if self.unserved:
+            return True
+        if not self.rebuild_students or not self.students_served():
+            return bool(self.routes)
+        rebuilt_ratio = self.rebuild_cost / self.rebuild_students
+        return self.total_cost() / self.students_served() > rebuilt_ratio * (1 + REBUILD_DRIFT)
+
+
+def route_cost(stop_ids, distances):
+    """Closed tour college -> stops -> college"""
+    if not stop_ids:
+        return 0.0
+    cost = distances.to_college(stop_ids[0]) + distances.to_college(stop_ids[-1])
+    for a, b in zip(stop_ids, stop_ids[1:]):
+        cost += distances.between(a, b)
+    return cost
+
+
+def _removal_gain(stop_ids, i, distances):
+    prev_cost = distances.to_college(stop_ids[i]) if i == 0 else distances.between(stop_ids[i - 1], stop_ids[i])
+    is_last = i == len(stop_ids) - 1
+    next_cost = distances.to_college(stop_ids[i]) if is_last else distances.between(stop_ids[i], stop_ids[i + 1])
+    if len(stop_ids) == 1:
+        bridge = 0.0
+    elif i == 0:
+        bridge = distances.to_college(stop_ids[1])
+    elif is_last:
+        bridge = distances.to_college(stop_ids[i - 1])
+    else:
+        bridge = distances.between(stop_ids[i - 1], stop_ids[i + 1])
+    return prev_cost + next_cost - bridge
+
+
+def _cheapest_insertion(stop_ids, stop_id, distances):
+    """(extra km, position) for inserting stop_id into a route"""
+    best = None
+    for position in range(len(stop_ids) + 1):
+        before = distances.to_college(stop_id) if position == 0 else distances.between(stop_ids[position - 1], stop_id)
+        after = (distances.to_college(stop_id) if position == len(stop_ids)
+                 else distances.between(stop_id, stop_ids[position]))
+        if not stop_ids:
+            removed = 0.0
+        elif position == 0:
+            removed = distances.to_college(stop_ids[0])
+        elif position == len(stop_ids):
+            removed = distances.to_college(stop_ids[-1])
+        else:
+            removed = distances.between(stop_ids[position - 1], stop_ids[position])
+        candidate = (before + after - removed, position)
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def repair_plan(plan, demands, capacities, distances, max_stops=None):
+    """Update plan in place for new per-stop demand; returns the indices of routes that changed.
+
+    Stops that lost all demand are dropped, overloaded routes shed their cheapest-to-remove stops,
+    and displaced or new stops go to the route with the cheapest insertion that has room, in seats
+    and, when max_stops is given, in stops. If no route has room a free bus is opened; stops that
+    still don't fit stay unserved.
+    """
+    demands = {stop_id: count for stop_id, count in demands.items() if count > 0}
+    plan.demands = demands
+    changed = set()
+
+    # Stops that no longer need a bus
+    for r, (_, stop_ids) in enumerate(plan.routes):
+        kept = [stop_id for stop_id in stop_ids if stop_id in demands]
+        if len(kept) != len(stop_ids):
+            stop_ids[:] = kept
+            changed.add(r)
+
+    # Overloaded routes give up stops until they fit
+    to_place = []
+    for r, (bus_id, stop_ids) in enumerate(plan.routes):
+        while len(stop_ids) > 1 and plan.route_load(stop_ids) > capacities[bus_id]:
+            i = max(range(len(stop_ids)), key=lambda i: _removal_gain(stop_ids, i, distances))
+            to_place.append(stop_ids.pop(i))
+            changed.add(r)
+
+    routed = {stop_id for _, stop_ids in plan.routes for stop_id in stop_ids}
+    to_place += sorted(stop_id for stop_id in demands if stop_id not in routed and stop_id not in to_place)
+
+    plan.unserved = []
+    for stop_id in to_place:
+        best = None
+        for r, (bus_id, stop_ids) in enumerate(plan.routes):
+            if max_stops is not None and len(stop_ids) >= max_stops:
+                continue
+            if stop_ids and plan.route_load(stop_ids) + demands[stop_id] <= capacities[bus_id]:
+                extra, position = _cheapest_insertion(stop_ids, stop_id, distances)
+                if best is None or (extra, r) < best[:2]:
+                    best = (extra, r, position)
+
+        if best is not None:
+            _, r, position = best
+            plan.routes[r][1].insert(position, stop_id)
+            changed.add(r)
+            continue
+
+        # Open a new bus: an emptied route's bus or a free one, smallest that holds the stop
+        used = {bus_id for bus_id, stop_ids in plan.routes if stop_ids}
+        free = sorted((capacity, bus_id) for bus_id, capacity in capacities.items() if bus_id not in used)
+        fitting = [bus_id for capacity, bus_id in free if capacity >= demands[stop_id]]
+        if not fitting:
+            plan.unserved.append(stop_id)
+            continue
+        empty = [r for r, (bus_id, stop_ids) in enumerate(plan.routes) if bus_id == fitting[0]]
+        if empty:
+            plan.routes[empty[0]][1].append(stop_id)
+            changed.add(empty[0])
+        else:
+            plan.routes.append((fitting[0], [stop_id]))
+            plan.route_distances.append(0.0)
+            changed.add(len(plan.routes) - 1)
+
+    for r in changed:
+        plan.route_distances[r] = route_cost(plan.routes[r][1], distances)
+    return changed
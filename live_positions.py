@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Process-wide store of the latest position of every bus
+Serves live tracking and nearest-bus lookups from memory and fans position changes out to streaming subscribers
+"""
+
+import queue
+import threading
+
+from distance_matrix import haversine_km
+from spatial_index import SpatialGrid
+
+# Events a subscriber may fall behind by before it is disconnected (the client then reconnects)
+MAX_PENDING_EVENTS = 100
+# Grid cell for the fleet index; a city fleet is spread thinly, so cells are much larger than for stops
+FLEET_CELL_SIZE_KM = 1.0
+
+
+class PositionStore:
+    """Latest position per bus id, kept only if newer than what is already held"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.positions = {}
+        self.changed_at = {}  # bus id -> version of its last change
+        self.version = 0  # Bumped on every accepted update
+        self.grid = SpatialGrid([], FLEET_CELL_SIZE_KM)  # Bus ids by position, for nearest() lookups
+
+    def _set(self, position):
+        # Coordinates arrive from JSON and database rows alike; the grid needs numbers
+        position = dict(position, latitude=float(position['latitude']), longitude=float(position['longitude']))
+        self.version += 1
+        self.positions[position['bus_id']] = position
+        self.changed_at[position['bus_id']] = self.version
+        self.grid.insert(position['bus_id'], position['latitude'], position['longitude'])
+
+    def update(self, position):
+        """Store a position dict with at least 'bus_id' and 'timestamp'; returns False if stale or unchanged"""
+        with self.lock:
+            current = self.positions.get(position['bus_id'])
+            if current is not None and (current['timestamp'] > position['timestamp'] or current == position):
+                return False
+            self._set(position)
+            self.changed.notify_all()
+            return True
+
+    def replace(self, positions):
+        """Swap in a full set of positions, e.g. rebuilt from the database"""
+        with self.lock:
+            self.positions = {}
+            self.changed_at = {}
+            self.grid = SpatialGrid([], FLEET_CELL_SIZE_KM)
+            for position in positions:
+                self._set(position)
+            self.version += 1
+            self.changed.notify_all()
+
+    def changes_since(self, version):
+        """(current version, positions changed after version ordered by bus id)"""
+        with self.lock:
+            changed = sorted(bus_id for bus_id, changed_at in self.changed_at.items() if changed_at > version)
+            return self.version, [dict(self.positions[bus_id]) for bus_id in changed]
+
+    def wait_for_change(self, version, timeout):
+        """Block until the version moves past version or timeout seconds pass"""
+        with self.lock:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+
+    def nearest(self, latitude, longitude, k, max_km=None, accept=None):
+        """Up to k (km, position) pairs closest to a point, skipping positions for which accept(position) is false"""
+        with self.lock:
+            positions = self.positions
+            matches = self.grid.nearest_k(
+                latitude, longitude, k,
+                distance=lambda bus_id: haversine_km(latitude, longitude,
+                                                     positions[bus_id]['latitude'], positions[bus_id]['longitude']),
+                accept=None if accept is None else lambda bus_id: accept(positions[bus_id]),
+                max_km=max_km)
+            return [(km, dict(positions[bus_id])) for km, bus_id in matches]
+
+    def snapshot(self):
+        """(version, positions ordered by bus id)"""
+        with self.lock:
+            return self.version, [dict(self.positions[bus_id]) for bus_id in sorted(self.positions)]
+
+    def __len__(self):
+        return len(self.positions)
+
+
+class PositionBroadcaster:
+    """One producer thread turning store changes into encoded events, shared by every subscriber"""
+
+    def __init__(self, store, encode, refresh=None, poll_interval=2.0):
+        self.store = store
+        self.encode = encode  # List of changed positions -> event text, encoded once per change
+        self.refresh = refresh  # Optional callable that pulls positions from elsewhere into the store
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+
+    def subscribe(self):
+        """Queue receiving encoded events; None means the subscriber fell behind and was dropped"""
+        subscription = queue.Queue(MAX_PENDING_EVENTS)
+        with self.lock:
+            self.subscribers.add(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='position-broadcaster', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, positions):
+        """Encode one event and hand it to every subscriber"""
+        self.broadcast(self.encode(positions))
+
+    def broadcast(self, event):
+        """Hand already encoded event text to every subscriber"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                self._drop(subscription)
+
+    def _drop(self, subscription):
+        """Unsubscribe a subscriber that fell behind and end its stream with None"""
+        with self.lock:
+            if subscription not in self.subscribers:
+                return  # Another publisher already dropped it
+            self.subscribers.discard(subscription)
+        # Publishers that listed it before the drop may still be filling the queue, so make room until the marker fits
+        while True:
+            try:
+                subscription.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        version = self.store.version
+        while True:
+            if self.refresh is not None:
+                self.refresh()
+            self.store.wait_for_change(version, self.poll_interval)
+            version, positions = self.store.changes_since(version)
+            if positions:
+                self.publish(positions)
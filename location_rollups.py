@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Per-minute rollups of raw bus GPS points
+Folds points into one summary per bus per minute so old raw history can be dropped
+"""
+
+ROLLUP_FIELDS = ('bus_id', 'minute', 'point_count', 'latitude', 'longitude',
+                 'avg_speed', 'max_speed', 'last_seen', 'status')
+
+
+def minute_of(timestamp):
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def merge_rollups(rollup, other):
+    """Combine two rollups of the same bus and minute into rollup; means are weighted by point count"""
+    total = rollup['point_count'] + other['point_count']
+    for field in ('latitude', 'longitude', 'avg_speed'):
+        rollup[field] = (rollup[field] * rollup['point_count'] + other[field] * other['point_count']) / total
+    rollup['point_count'] = total
+    rollup['max_speed'] = max(rollup['max_speed'], other['max_speed'])
+    if other['last_seen'] >= rollup['last_seen']:
+        rollup['last_seen'] = other['last_seen']
+        rollup['status'] = other['status']
+    return rollup
+
+
+def rollup_points(points, rollups=None):
+    """Fold (bus_id, timestamp, latitude, longitude, speed, status) points into {(bus_id, minute): rollup}"""
+    rollups = {} if rollups is None else rollups
+    for bus_id, timestamp, latitude, longitude, speed, status in points:
+        speed = speed or 0.0
+        point = {
+            'bus_id': bus_id,
+            'minute': minute_of(timestamp),
+            'point_count': 1,
+            'latitude': latitude,
+            'longitude': longitude,
+            'avg_speed': speed,
+            'max_speed': speed,
+            'last_seen': timestamp,
+            'status': status
+        }
+        key = (bus_id, point['minute'])
+        if key in rollups:
+            merge_rollups(rollups[key], point)
+        else:
+            rollups[key] = point
+    return rollups
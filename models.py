@@ -26,6 +26,11 @@ class BusLocation(db.Model):
     status = db.Column(db.String(20), default='moving')  # moving, stopped, delayed
     
     bus = db.relationship('Bus')
+    
+    __table_args__ = (
+        db.Index('ix_bus_location_bus_timestamp', 'bus_id', 'timestamp'),
+        db.Index('ix_bus_location_timestamp', 'timestamp'),
+    )
 
 class BusRoute(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Offline road network travel times for route optimization
+Loads a local edge list, snaps points to their nearest node and runs Dijkstra over the graph
+"""
+
+import csv
+import hashlib
+import heapq
+import math
+
+import numpy as np
+
+from distance_matrix import haversine_km, haversine_matrix
+from spatial_index import SpatialGrid
+
+# Distance mode whose matrix holds travel minutes over a road graph instead of geodesic km
+ROAD = 'road'
+
+# Speed for edges without one, for the off-road gap to a snapped node and for unconnected pairs
+DEFAULT_SPEED_KMH = 25.0
+MINUTES_PER_HOUR = 60.0
+
+
+def travel_minutes(length_km, speed_kmh=DEFAULT_SPEED_KMH):
+    return length_km / speed_kmh * MINUTES_PER_HOUR
+
+
+class RoadGraph:
+    """Directed road graph with edge weights in minutes"""
+
+    def __init__(self, nodes, edges, checksum=''):
+        """nodes maps node id -> (latitude, longitude); edges are (source id, target id, minutes)"""
+        self.node_ids = list(nodes)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.coordinates = np.array([nodes[node_id] for node_id in self.node_ids], dtype=float).reshape(-1, 2)
+        self.checksum = checksum  # Identifies the graph in saved matrices
+
+        self.forward = [[] for _ in self.node_ids]
+        self.backward = [[] for _ in self.node_ids]
+        # Fastest straight-line progress any edge makes; off-graph legs move at DEFAULT_SPEED_KMH
+        fastest_kmh = DEFAULT_SPEED_KMH
+        for source, target, minutes in edges:
+            i, j = self.node_index[source], self.node_index[target]
+            self.forward[i].append((j, minutes))
+            self.backward[j].append((i, minutes))
+            span_km = haversine_km(*nodes[source], *nodes[target])
+            if span_km > 0:
+                fastest_kmh = max(fastest_kmh, span_km / minutes * MINUTES_PER_HOUR) if minutes > 0 else math.inf
+        # Least travel minutes per km of straight-line separation, a lower bound for nearest-stop searches
+        self.minutes_per_km = MINUTES_PER_HOUR / fastest_kmh
+
+        self.grid = SpatialGrid((i, latitude, longitude) for i, (latitude, longitude) in enumerate(self.coordinates))
+
+    @classmethod
+    def load(cls, path):
+        """Read an OSM-derived edge list CSV.
+
+        Columns: source, source_lat, source_lon, target, target_lat, target_lon, length_km,
+        and optionally speed_kmh and oneway (1 for one-way; edges are two-way otherwise).
+        """
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        nodes = {}
+        edges = []
+        for row in csv.DictReader(content.decode('utf-8-sig').splitlines()):
+            source, target = row['source'].strip(), row['target'].strip()
+            nodes[source] = (float(row['source_lat']), float(row['source_lon']))
+            nodes[target] = (float(row['target_lat']), float(row['target_lon']))
+            speed = float(row.get('speed_kmh') or DEFAULT_SPEED_KMH)
+            minutes = travel_minutes(float(row['length_km']), speed)
+            edges.append((source, target, minutes))
+            if (row.get('oneway') or '0').strip().lower() not in ('1', 'true', 'yes'):
+                edges.append((target, source, minutes))
+        if not edges:
+            raise ValueError(f'No road edges in {path}')
+
+        return cls(nodes, edges, hashlib.sha1(content).hexdigest())
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def snap(self, latitude, longitude):
+        """(km to the nearest node, node index)"""
+        return self.grid.nearest(latitude, longitude)
+
+    def shortest_times(self, source, targets, reverse=False):
+        """Dijkstra from source, stopping once every target is settled; minutes per target (inf if unreachable).
+
+        With reverse=True edges are followed backwards, giving times from each target to source.
+        """
+        adjacency = self.backward if reverse else self.forward
+        best = {source: 0.0}
+        settled = set()
+        remaining = set(targets)
+        heap = [(0.0, source)]
+        while heap and remaining:
+            minutes, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            remaining.discard(node)
+            for neighbour, edge_minutes in adjacency[node]:
+                candidate = minutes + edge_minutes
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        return [best.get(target, math.inf) for target in targets]
+
+    def travel_time_matrix(self, origins, destinations):
+        """Travel minutes between every origin and destination, averaged over both directions.
+
+        Averaging keeps the matrix symmetric on one-way streets, which the routing engines assume.
+        Each point drives its straight-line gap to the nearest node; pairs the graph does not
+        connect fall back to straight-line distance at DEFAULT_SPEED_KMH.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+        origin_snaps = [self.snap(latitude, longitude) for latitude, longitude in origins]
+        destination_snaps = [self.snap(latitude, longitude) for latitude, longitude in destinations]
+        targets = [node for _, node in destination_snaps]
+
+        times = np.empty((len(origins), len(destinations)))
+        for i, (_, node) in enumerate(origin_snaps):
+            outbound = self.shortest_times(node, targets)
+            inbound = self.shortest_times(node, targets, reverse=True)
+            times[i] = (np.array(outbound) + np.array(inbound)) / 2
+
+        access_km = (np.array([km for km, _ in origin_snaps])[:, None]
+                     + np.array([km for km, _ in destination_snaps])[None, :])
+        times += travel_minutes(access_km)
+
+        unreachable = ~np.isfinite(times)
+        if unreachable.any():
+            times = np.where(unreachable, travel_minutes(haversine_matrix(origins, destinations)), times)
+
+        # A point to itself costs nothing, even when it is off the graph
+        times[(origins[:, None, :] == destinations[None, :, :]).all(axis=2)] = 0.0
+        return times
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Stop ordering within a single route
+Orders the stops between a fixed start (index 0) and end (index n-1) of a distance matrix
+"""
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Ordering modes: 'greedy' is nearest neighbour, 'heuristic' adds bounded 2-opt,
+# 'exact' is Held-Karp dynamic programming for small routes
+GREEDY = 'greedy'
+HEURISTIC = 'heuristic'
+EXACT = 'exact'
+ORDERING_MODES = (GREEDY, HEURISTIC, EXACT)
+
+# Held-Karp needs 2^n * n^2 work; beyond this many stops 'exact' falls back to 'heuristic'
+EXACT_MAX_STOPS = 15
+TWO_OPT_MAX_PASSES = 50
+IMPROVEMENT_EPSILON = 1e-9
+# Below this many routes, handing matrices to worker processes costs more than ordering serially
+PARALLEL_MIN_ROUTES = 64
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def path_length(distances, order):
+    return float(sum(distances[a][b] for a, b in zip(order, order[1:])))
+
+
+def greedy_order(distances):
+    """Nearest-neighbour path from the start through every stop to the end"""
+    n = len(distances)
+    order = [0]
+    unvisited = list(range(1, n - 1))
+    current = 0
+    while unvisited:
+        # min() keeps the first stop on ties, like a strict < scan
+        current = min(unvisited, key=lambda i: distances[current][i])
+        unvisited.remove(current)
+        order.append(current)
+    order.append(n - 1)
+    return order
+
+
+def two_opt_order(distances, order=None, max_passes=TWO_OPT_MAX_PASSES):
+    """Improve a path with segment reversals, keeping both ends fixed, for at most max_passes passes"""
+    order = list(order if order is not None else greedy_order(distances))
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(order) - 2):
+            for j in range(i + 1, len(order) - 1):
+                delta = (distances[order[i - 1]][order[j]] + distances[order[i]][order[j + 1]]
+                         - distances[order[i - 1]][order[i]] - distances[order[j]][order[j + 1]])
+                if delta < -IMPROVEMENT_EPSILON:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def held_karp_order(distances):
+    """Shortest path from the start through every stop to the end (Held-Karp, vectorised per subset size)"""
+    d = np.asarray(distances, dtype=float)
+    n = len(d)
+    m = n - 2
+    if m <= 1:
+        return list(range(n))
+
+    inner = d[1:-1, 1:-1]
+    masks = np.arange(1 << m)
+    popcount = np.zeros(1 << m, dtype=int)
+    for k in range(m):
+        popcount += (masks >> k) & 1
+
+    # cost[mask, k]: shortest path from the start visiting the stops in mask and ending at stop k
+    cost = np.full((1 << m, m), np.inf)
+    parent = np.full((1 << m, m), -1, dtype=np.int8)
+    for k in range(m):
+        cost[1 << k, k] = d[0, k + 1]
+
+    for size in range(2, m + 1):
+        layer = masks[popcount == size]
+        for k in range(m):
+            ending_at_k = layer[(layer >> k) & 1 == 1]
+            candidates = cost[ending_at_k ^ (1 << k)] + inner[:, k]
+            best = candidates.argmin(axis=1)
+            cost[ending_at_k, k] = candidates[np.arange(len(ending_at_k)), best]
+            parent[ending_at_k, k] = best
+
+    full = (1 << m) - 1
+    last = int((cost[full] + d[1:-1, -1]).argmin())
+
+    path = []
+    mask, k = full, last
+    while k >= 0:
+        path.append(k + 1)
+        mask, k = mask ^ (1 << k), int(parent[mask, k])
+    return [0] + path[::-1] + [n - 1]
+
+
+def order_stops(distances, mode=GREEDY):
+    """Order stops between the fixed ends of the matrix; returns (order, path length)"""
+    if mode not in ORDERING_MODES:
+        raise ValueError(f"Unknown ordering mode '{mode}', expected one of {ORDERING_MODES}")
+
+    stop_count = len(distances) - 2
+    if mode == EXACT and stop_count <= EXACT_MAX_STOPS:
+        order = held_karp_order(distances)
+    elif mode in (EXACT, HEURISTIC):
+        order = two_opt_order(distances)
+    else:
+        order = greedy_order(distances)
+    return order, path_length(distances, order)
+
+
+def _get_pool(workers):
+    """Process pool shared by every call in this process, created on first use"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Forked workers start from this module already loaded: nothing re-imports the
+            # application or restarts its threads, and they only ever run order_stops
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+
+
+def order_many(matrices, mode=GREEDY, workers=1):
+    """order_stops for many independent routes, in worker processes when there are enough of them.
+
+    Results are merged back in input order, so the output is identical to a serial run.
+    """
+    matrices = list(matrices)
+    if workers <= 1 or len(matrices) < PARALLEL_MIN_ROUTES:
+        return [order_stops(distances, mode) for distances in matrices]
+
+    chunksize = max(1, len(matrices) // (workers * 4))
+    return list(_get_pool(workers).map(order_stops, matrices, [mode] * len(matrices), chunksize=chunksize))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Pluggable routing engines for DynamicRouter
+Engines solve a compact, index-based capacitated routing problem built from the distance matrix
+"""
+
+import time
+
+import numpy as np
+
+# Candidate neighbours per stop for savings pairs and relocate moves
+NEIGHBOUR_COUNT = 30
+# Default wall-clock budget for an engine run, in seconds
+DEFAULT_TIME_LIMIT = 5.0
+IMPROVEMENT_EPSILON = 1e-9
+
+
+def nearest_neighbours(distances, count):
+    """Indices of the `count` nearest other stops for every stop, closest first"""
+    n = len(distances)
+    count = min(count, n - 1)
+    if count <= 0:
+        return [[] for _ in range(n)]
+
+    masked = np.array(distances, dtype=float)
+    np.fill_diagonal(masked, np.inf)
+    nearest = np.argpartition(masked, count - 1, axis=1)[:, :count]
+    order = np.take_along_axis(masked, nearest, axis=1).argsort(axis=1, kind='stable')
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+
+class RoutingProblem:
+    """Capacitated routing problem: stops are 0..n-1 and the college (depot) is node n"""
+
+    def __init__(self, stop_distances, depot_distances, demands, capacities):
+        self.size = len(demands)
+        self.depot = self.size
+        self.demands = [int(demand) for demand in demands]
+        self.capacities = [int(capacity) for capacity in capacities]  # One per available bus
+
+        # One matrix with the depot as the last row/column keeps every lookup the same shape
+        n = self.size
+        self.distances = np.zeros((n + 1, n + 1))
+        self.distances[:n, :n] = stop_distances
+        self.distances[:n, n] = depot_distances
+        self.distances[n, :n] = depot_distances
+        self.neighbours = nearest_neighbours(self.distances[:n, :n], NEIGHBOUR_COUNT)
+
+    def route_cost(self, route):
+        """Length of a closed tour college -> stops -> college"""
+        if not route:
+            return 0.0
+        tour = [self.depot] + list(route) + [self.depot]
+        return float(self.distances[tour[:-1], tour[1:]].sum())
+
+    def route_load(self, route):
+        return sum(self.demands[stop] for stop in route)
+
+
+class RoutingSolution:
+    """Routes as (bus index, [stop indices]) plus statistics about the engine run"""
+
+    def __init__(self, engine, routes, cost, baseline_cost, iterations, elapsed):
+        self.engine = engine
+        self.routes = routes
+        self.cost = cost
+        self.baseline_cost = baseline_cost
+        self.iterations = iterations
+        self.elapsed = elapsed
+
+    def stats(self):
+        improvement = self.baseline_cost - self.cost
+        return {
+            'engine': self.engine,
+            'iterations': self.iterations,
+            'baseline_cost': round(self.baseline_cost, 2),
+            'cost': round(self.cost, 2),
+            'improvement': round(improvement, 2),
+            'improvement_percent': round(improvement / self.baseline_cost * 100, 1) if self.baseline_cost else 0.0,
+            'elapsed_seconds': round(self.elapsed, 3)
+        }
+
+
+def assign_buses(problem, routes):
+    """Best-fit decreasing: heaviest routes first, each on the smallest free bus that holds it.
+
+    A single stop with more students than any bus still gets the largest free bus, as
+    farthest-first clustering does. Routes left without a bus are not served.
+    """
+    free_buses = sorted(range(len(problem.capacities)), key=lambda b: (problem.capacities[b], b))
+    assigned = []
+    for route in sorted(routes, key=lambda r: (-problem.route_load(r), r[0])):
+        if not free_buses:
+            break
+        load = problem.route_load(route)
+        bus = next((b for b in free_buses if problem.capacities[b] >= load), None)
+        if bus is None and len(route) == 1:
+            bus = free_buses[-1]
+        if bus is not None:
+            free_buses.remove(bus)
+            assigned.append((bus, route))
+    return sorted(assigned)
+
+
+class LocalSearch:
+    """2-opt, or-opt and relocate improvement of bus routes within a deadline"""
+
+    def __init__(self, problem, assigned_routes, deadline):
+        self.problem = problem
+        self.d = problem.distances
+        self.depot = problem.depot
+        self.deadline = deadline
+        self.buses = [bus for bus, _ in assigned_routes]
+        self.routes = [list(route) for _, route in assigned_routes]
+        self.loads = [problem.route_load(route) for route in self.routes]
+        self.route_of = [-1] * problem.size
+        self.position = [-1] * problem.size
+        for r in range(len(self.routes)):
+            self._index_route(r)
+
+    def _index_route(self, r):
+        for i, stop in enumerate(self.routes[r]):
+            self.route_of[stop] = r
+            self.position[stop] = i
+
+    def _neighbours_in_tour(self, r, i):
+        route = self.routes[r]
+        prev_node = route[i - 1] if i > 0 else self.depot
+        next_node = route[i + 1] if i + 1 < len(route) else self.depot
+        return prev_node, next_node
+
+    def timed_out(self):
+        return time.monotonic() >= self.deadline
+
+    def run(self):
+        """Apply improving moves until none is left or time runs out; returns the move count"""
+        moves = 0
+        improved = True
+        while improved and not self.timed_out():
+            improved = False
+            for r in range(len(self.routes)):
+                if self.timed_out():
+                    break
+                route_moves = self.two_opt(r) + self.or_opt(r)
+                moves += route_moves
+                improved = improved or route_moves > 0
+            relocations = self.relocate()
+            moves += relocations
+            improved = improved or relocations > 0
+        return moves
+
+    def solution_routes(self):
+        # Routes emptied by relocate free their bus
+        return [(bus, route) for bus, route in zip(self.buses, self.routes) if route]
+
+    def two_opt(self, r):
+        """Reverse route segments while that shortens the tour"""
+        d = self.d
+        moves = 0
+        improved = True
+        while improved:
+            improved = False
+            tour = [self.depot] + self.routes[r] + [self.depot]
+            for i in range(1, len(tour) - 2):
+                for j in range(i + 1, len(tour) - 1):
+                    delta = (d[tour[i - 1], tour[j]] + d[tour[i], tour[j + 1]]
+                             - d[tour[i - 1], tour[i]] - d[tour[j], tour[j + 1]])
+                    if delta < -IMPROVEMENT_EPSILON:
+                        tour[i:j + 1] = tour[i:j + 1][::-1]
+                        improved = True
+                        moves += 1
+            self.routes[r] = tour[1:-1]
+        self._index_route(r)
+        return moves
+
+    def or_opt(self, r):
+        """Move segments of one to three consecutive stops elsewhere in the same route"""
+        d = self.d
+        moves = 0
+        improved = True
+        while improved:
+            improved = False
+            tour = [self.depot] + self.routes[r] + [self.depot]
+            for length in (1, 2, 3):
+                for i in range(1, len(tour) - length):
+                    first, last = tour[i], tour[i + length - 1]
+                    prev_node, next_node = tour[i - 1], tour[i + length]
+                    removal_gain = d[prev_node, first] + d[last, next_node] - d[prev_node, next_node]
+                    rest = tour[:i] + tour[i + length:]
+                    segment = tour[i:i + length]
+                    for p in range(len(rest) - 1):
+                        a, b = rest[p], rest[p + 1]
+                        base = d[a, b]
+                        forward = d[a, first] + d[last, b] - base
+                        backward = d[a, last] + d[first, b] - base
+                        if min(forward, backward) - removal_gain < -IMPROVEMENT_EPSILON:
+                            inserted = segment if forward <= backward else segment[::-1]
+                            tour = rest[:p + 1] + inserted + rest[p + 1:]
+                            improved = True
+                            moves += 1
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+            self.routes[r] = tour[1:-1]
+        self._index_route(r)
+        return moves
+
+    def relocate(self):
+        """Move single stops next to a nearby stop on another bus that has room"""
+        d = self.d
+        problem = self.problem
+        moves = 0
+        for stop in range(problem.size):
+            if self.timed_out():
+                break
+            r1 = self.route_of[stop]
+            if r1 < 0:
+                continue
+            prev_node, next_node = self._neighbours_in_tour(r1, self.position[stop])
+            removal_gain = d[prev_node, stop] + d[stop, next_node] - d[prev_node, next_node]
+
+            best = None
+            for other in problem.neighbours[stop]:
+                r2 = self.route_of[other]
+                if r2 < 0 or r2 == r1:
+                    continue
+                if self.loads[r2] + problem.demands[stop] > problem.capacities[self.buses[r2]]:
+                    continue
+                i = self.position[other]
+                other_prev, other_next = self._neighbours_in_tour(r2, i)
+                # Insert just before or just after the neighbouring stop
+                for a, b, at in ((other_prev, other, i), (other, other_next, i + 1)):
+                    delta = d[a, stop] + d[stop, b] - d[a, b] - removal_gain
+                    if delta < -IMPROVEMENT_EPSILON and (best is None or delta < best[0]):
+                        best = (delta, r2, at)
+
+            if best is not None:
+                _, r2, at = best
+                self.routes[r1].pop(self.position[stop])
+                self.routes[r2].insert(at, stop)
+                self.loads[r1] -= problem.demands[stop]
+                self.loads[r2] += problem.demands[stop]
+                self._index_route(r1)
+                self._index_route(r2)
+                moves += 1
+        return moves
+
+
+class SavingsEngine:
+    """Clarke-Wright savings construction improved with 2-opt, or-opt and relocate moves"""
+
+    name = 'savings'
+    description = 'Clarke-Wright Savings with 2-opt, Or-opt and Relocate Local Search'
+
+    def construct(self, problem):
+        """Merge single-stop routes in order of decreasing savings while capacity allows"""
+        if not problem.capacities:
+            return []
+        capacity = max(problem.capacities)
+        d = problem.distances
+        depot = problem.depot
+
+        pairs = sorted({(min(i, j), max(i, j)) for i in range(problem.size) for j in problem.neighbours[i]})
+        if not pairs:
+            return [[i] for i in range(problem.size)]
+        first = np.array([i for i, _ in pairs])
+        second = np.array([j for _, j in pairs])
+        savings = d[first, depot] + d[second, depot] - d[first, second]
+        order = np.lexsort((second, first, -savings))
+
+        routes = {i: [i] for i in range(problem.size)}
+        loads = {i: problem.demands[i] for i in range(problem.size)}
+        route_of = list(range(problem.size))
+        for k in order:
+            if savings[k] <= 0:
+                break
+            i, j = int(first[k]), int(second[k])
+            ri, rj = route_of[i], route_of[j]
+            if ri == rj or loads[ri] + loads[rj] > capacity:
+                continue
+            a, b = routes[ri], routes[rj]
+            # Only route ends can be joined: a must end with i and b must start with j
+            if (a[-1] != i and a[0] != i) or (b[0] != j and b[-1] != j):
+                continue
+            if a[-1] != i:
+                a.reverse()
+            if b[0] != j:
+                b.reverse()
+
+            a.extend(b)
+            loads[ri] += loads[rj]
+            for stop in b:
+                route_of[stop] = ri
+            del routes[rj], loads[rj]
+
+        return [routes[r] for r in sorted(routes)]
+
+    def solve(self, problem, time_limit=DEFAULT_TIME_LIMIT):
+        started = time.monotonic()
+        assigned = assign_buses(problem, self.construct(problem))
+        baseline_cost = sum(problem.route_cost(route) for _, route in assigned)
+
+        search = LocalSearch(problem, assigned, started + time_limit)
+        iterations = search.run()
+        routes = search.solution_routes()
+        cost = sum(problem.route_cost(route) for _, route in routes)
+
+        return RoutingSolution(self.name, routes, cost, baseline_cost, iterations, time.monotonic() - started)
+
+
+ROUTING_ENGINES = {
+    SavingsEngine.name: SavingsEngine,
+}
+
+
+def get_routing_engine(name):
+    """Instantiate a registered routing engine by name"""
+    if name not in ROUTING_ENGINES:
+        raise ValueError(f"Unknown routing engine '{name}'")
+    return ROUTING_ENGINES[name]()
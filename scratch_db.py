@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Scratch database for the tests that drive the Flask app
+Points the app at a temporary SQLite file before it is imported, resets its process-wide state between tests
+and seeds a small fleet of stops, buses and voting students; captured_selects records the queries a call makes
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import event
+
+TMP_DIR = tempfile.mkdtemp()
+# The app reads its configuration at import time, so this has to happen before the import below
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TMP_DIR, 'scratch.db')}"
+os.environ['DISTANCE_CACHE_PATH'] = os.path.join(TMP_DIR, 'distance_cache.npz')
+os.environ['LOCATION_COMPACTION_INTERVAL_MINUTES'] = '0'
+os.environ['STOP_DEMAND_RECONCILE_INTERVAL_MINUTES'] = '0'
+
+import app as transport  # noqa: E402
+from eta import EtaEngine  # noqa: E402
+from geofence import GeofenceEngine  # noqa: E402
+
+
+def reset_database():
+    """Empty every table and forget everything the app keeps in memory about the old rows.
+
+    Call inside an app context. Plan keys restart with the row ids, so the engines holding a
+    plan are replaced rather than asked to notice the change.
+    """
+    transport.db.session.remove()
+    transport.db.drop_all()
+    transport.upgrade_schema()
+    transport.position_store.replace([])
+    transport.route_plan_cache.clear()
+    transport.day_views.clear()
+    transport.last_route_plan = None
+    transport.eta_engine = EtaEngine(transport.speed_profile)
+    transport.geofence_engine = GeofenceEngine()
+    transport.geofence_stop_names.clear()
+    transport.geofences_checked_at = None
+    transport.last_stop_event_id = None
+
+
+def seed_fleet(stop_count=6, bus_count=3, student_count=30):
+    """Reset the database, then add stops 'Stop i', buses 'TSi' and students 'Si' spread round the
+    stops in turn, every student voting yes today; returns (stops, buses, students).
+    """
+    db = transport.db
+    reset_database()
+    stops = [transport.BusStop(name=f'Stop {i}', latitude=17.40 + i / 100, longitude=78.47)
+             for i in range(stop_count)]
+    buses = [transport.Bus(bus_number=f'TS{i}', capacity=40) for i in range(bus_count)]
+    db.session.add_all(stops + buses)
+    db.session.commit()
+    students = [transport.Student(student_id=f'S{i}', name=f'Student {i}', password_hash='x',
+                                  stop_id=stops[i % stop_count].id) for i in range(student_count)]
+    db.session.add_all(students)
+    db.session.commit()
+    today = datetime.now().date()
+    db.session.add_all([transport.DailyVote(student_id=student.id, vote_date=today, needs_bus=True)
+                        for student in students])
+    transport.reconcile_stop_demand(today)
+    db.session.commit()
+    return stops, buses, students
+
+
+def logged_in_client(student_id=None, admin=False):
+    """Test client signed in as a student (by primary key) and/or as admin"""
+    client = transport.app.test_client()
+    with client.session_transaction() as session:
+        if student_id is not None:
+            session['_user_id'] = str(student_id)
+        if admin:
+            session['admin_logged_in'] = True
+    return client
+
+
+def captured_selects(run):
+    """SELECT statements (with parameters) issued while run() executes"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(transport.db.engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(transport.db.engine, 'before_cursor_execute', capture)
+    return statements
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Spatial index for nearest-stop and radius searches
+Uniform grid over a local flat projection of latitude/longitude, with deletion
+"""
+
+import bisect
+import math
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON_AT_EQUATOR = 111.320
+# Flat-projection distances can be slightly off from true ones; shrink ring bounds so searches stay exact
+RING_BOUND_SLACK = 0.98
+# Aim for about this many items per grid cell
+ITEMS_PER_CELL = 2
+MIN_CELL_SIZE_KM = 0.05
+
+
+def bounding_box(point, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) that contains every point within radius_km of point"""
+    latitude, longitude = point
+    margin = radius_km * 1.01
+    delta_lat = margin / KM_PER_DEGREE_LAT
+    # Longitude degrees are shortest at the box edge farthest from the equator
+    widest_lat = min(abs(latitude) + delta_lat, 89.9)
+    delta_lon = margin / (KM_PER_DEGREE_LON_AT_EQUATOR * math.cos(math.radians(widest_lat)))
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+class SpatialGrid:
+    """Grid of keyed points supporting removal, nearest-match and radius queries"""
+
+    def __init__(self, items, cell_size_km=None):
+        items = [(key, float(latitude), float(longitude)) for key, latitude, longitude in items]
+
+        # Scale longitude at the latitude farthest from the equator so projected distances never overstate
+        self._set_widest_latitude(max((abs(latitude) for _, latitude, _ in items), default=0.0))
+
+        if cell_size_km is None:
+            cell_size_km = self._auto_cell_size(items)
+        self.cell_size_km = cell_size_km
+
+        self.coordinates = {}
+        self.positions = {}
+        self.cells = {}
+        self.cell_bounds = None
+        for key, latitude, longitude in items:
+            self.insert(key, latitude, longitude)
+
+    def _set_widest_latitude(self, widest_lat):
+        self.widest_lat = widest_lat
+        self.km_per_degree_lon = KM_PER_DEGREE_LON_AT_EQUATOR * math.cos(math.radians(min(widest_lat, 89.9)))
+
+    def _auto_cell_size(self, items):
+        if len(items) < 2:
+            return 1.0
+        xs = [self._project(latitude, longitude)[0] for _, latitude, longitude in items]
+        ys = [self._project(latitude, longitude)[1] for _, latitude, longitude in items]
+        area = max(max(xs) - min(xs), MIN_CELL_SIZE_KM) * max(max(ys) - min(ys), MIN_CELL_SIZE_KM)
+        return max(math.sqrt(area * ITEMS_PER_CELL / len(items)), MIN_CELL_SIZE_KM)
+
+    def _project(self, latitude, longitude):
+        return longitude * self.km_per_degree_lon, latitude * KM_PER_DEGREE_LAT
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size_km)), int(math.floor(y / self.cell_size_km))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def insert(self, key, latitude, longitude):
+        if key in self.positions:
+            self.remove(key)
+        if abs(latitude) > self.widest_lat:
+            # A point beyond the projection's latitude would have its distances overstated; reproject everything
+            self._set_widest_latitude(abs(latitude))
+            items = [(other, *point) for other, point in self.coordinates.items()]
+            self.coordinates, self.positions, self.cells, self.cell_bounds = {}, {}, {}, None
+            for item in items:
+                self.insert(*item)
+        x, y = self._project(latitude, longitude)
+        cell = self._cell(x, y)
+        self.coordinates[key] = (latitude, longitude)
+        self.positions[key] = (x, y, cell)
+        self.cells.setdefault(cell, set()).add(key)
+
+        if self.cell_bounds is None:
+            self.cell_bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            bounds = self.cell_bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), max(bounds[1], cell[0])
+            bounds[2], bounds[3] = min(bounds[2], cell[1]), max(bounds[3], cell[1])
+
+    def remove(self, key):
+        del self.coordinates[key]
+        _, _, cell = self.positions.pop(key)
+        members = self.cells[cell]
+        members.discard(key)
+        if not members:
+            del self.cells[cell]
+
+    def _ring(self, cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def _planar_distance(self, x, y, key):
+        px, py, _ = self.positions[key]
+        return math.hypot(px - x, py - y)
+
+    def nearest(self, latitude, longitude, distance=None, accept=None, units_per_km=1.0):
+        """Closest (distance, key) among items passing accept(key), or None.
+
+        distance(key) gives the true distance in km (defaults to the flat projection).
+        When it measures something else, such as travel minutes, units_per_km must be the least it
+        can grow per km of straight-line separation, or the search may stop before the closest item.
+        Ties go to the smallest key.
+        """
+        best = self.nearest_k(latitude, longitude, 1, distance=distance, accept=accept, units_per_km=units_per_km)
+        return best[0] if best else None
+
+    def nearest_k(self, latitude, longitude, k, distance=None, accept=None, max_km=None, units_per_km=1.0):
+        """Up to k closest (distance, key) pairs among items passing accept(key), closest first.
+
+        Items farther than max_km (in distance's units) are left out. distance and units_per_km
+        are as for nearest().
+        """
+        x, y = self._project(latitude, longitude)
+        if distance is None:
+            distance = lambda key: self._planar_distance(x, y, key)
+        if not self.positions or k < 1:
+            return []
+
+        cx, cy = self._cell(x, y)
+        min_x, max_x, min_y, max_y = self.cell_bounds
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+
+        best = []
+        for ring in range(last_ring + 1):
+            # Every cell in this ring is at least (ring - 1) cells away from the query point
+            ring_bound = (ring - 1) * self.cell_size_km * RING_BOUND_SLACK * units_per_km
+            if len(best) == k and best[-1][0] <= ring_bound:
+                break
+            if max_km is not None and max_km < ring_bound:
+                break
+            scan_all = 8 * ring > len(self.positions)
+            if scan_all:
+                # Sparse grid: scanning everything is cheaper than walking empty cells
+                best = []
+                candidates = self.positions.keys()
+            else:
+                candidates = [key for cell in self._ring(cx, cy, ring) for key in self.cells.get(cell, ())]
+            for key in candidates:
+                if accept is not None and not accept(key):
+                    continue
+                candidate = (distance(key), key)
+                if max_km is not None and candidate[0] > max_km:
+                    continue
+                if len(best) < k or candidate < best[-1]:
+                    bisect.insort(best, candidate)
+                    del best[k:]
+            if scan_all:
+                break
+        return best
+
+    def within(self, latitude, longitude, radius_km, distance=None):
+        """All (distance, key) pairs within radius_km, closest first"""
+        x, y = self._project(latitude, longitude)
+        if distance is None:
+            distance = lambda key: self._planar_distance(x, y, key)
+
+        reach = int(math.ceil(radius_km / (self.cell_size_km * RING_BOUND_SLACK)))
+        cx, cy = self._cell(x, y)
+        if (2 * reach + 1) ** 2 > len(self.cells):
+            candidates = self.positions.keys()
+        else:
+            candidates = [key
+                          for gx in range(cx - reach, cx + reach + 1)
+                          for gy in range(cy - reach, cy + reach + 1)
+                          for key in self.cells.get((gx, gy), ())]
+
+        matches = []
+        for key in candidates:
+            item_distance = distance(key)
+            if item_distance <= radius_km:
+                matches.append((item_distance, key))
+        return sorted(matches)
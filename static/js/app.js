@@ -33,6 +33,81 @@ function handleEmergencyRequest() {
     });
 }
 
+// Live bus positions: pushed over Server-Sent Events, polling /api/bus-locations as a fallback
+class LiveBusFeed {
+    constructor(pollInterval = 30000) {
+        this.pollInterval = pollInterval;
+        this.positions = {};
+        this.listeners = [];
+        this.source = null;
+        this.pollTimer = null;
+        this.failures = 0;
+    }
+    
+    subscribe(listener) {
+        this.listeners.push(listener);
+        if (this.listeners.length === 1) this.start();
+        else listener(this.list());
+    }
+    
+    list() {
+        return Object.values(this.positions);
+    }
+    
+    apply(positions, replace) {
+        if (replace) this.positions = {};
+        positions.forEach(position => { this.positions[position.bus_id] = position; });
+        const all = this.list();
+        this.listeners.forEach(listener => listener(all));
+    }
+    
+    start() {
+        if (!window.EventSource) {
+            this.startPolling();
+            return;
+        }
+        this.source = new EventSource('/api/stream/bus-locations');
+        this.source.addEventListener('snapshot', event => {
+            this.failures = 0;
+            this.apply(JSON.parse(event.data), true);
+        });
+        this.source.addEventListener('positions', event => this.apply(JSON.parse(event.data), false));
+        // Stop arrivals and departures go to whoever listens on the document
+        this.source.addEventListener('stops', event => {
+            document.dispatchEvent(new CustomEvent('bus-stop-events', { detail: JSON.parse(event.data) }));
+        });
+        this.source.onerror = () => {
+            // The browser reconnects by itself; give up on streaming if that keeps failing, or at
+            // once if the server refused the stream (503 when it has too many open)
+            this.failures += 1;
+            if (this.failures >= 3 || this.source.readyState === EventSource.CLOSED) {
+                this.source.close();
+                this.source = null;
+                this.startPolling();
+            }
+        };
+    }
+    
+    startPolling() {
+        const poll = () => fetch('/api/bus-locations')
+            .then(response => response.json())
+            .then(data => this.apply(data, true))
+            .catch(error => console.error('Error updating bus locations:', error));
+        poll();
+        this.pollTimer = setInterval(poll, this.pollInterval);
+    }
+    
+    stop() {
+        if (this.source) this.source.close();
+        if (this.pollTimer) clearInterval(this.pollTimer);
+        this.source = null;
+        this.pollTimer = null;
+    }
+}
+
+// Shared by every widget on the page so there is one stream per tab
+const liveBusFeed = new LiveBusFeed();
+
 // Real-time updates
 class RealTimeUpdater {
     constructor() {
@@ -43,8 +118,10 @@ class RealTimeUpdater {
     start() {
         if (this.isActive) return;
         this.isActive = true;
+        liveBusFeed.subscribe(positions => {
+            document.dispatchEvent(new CustomEvent('bus-locations', { detail: positions }));
+        });
         this.updateInterval = setInterval(() => {
-            this.updateBusLocations();
             this.updateEmergencyStatus();
         }, 30000); // Update every 30 seconds
     }
@@ -56,16 +133,6 @@ class RealTimeUpdater {
         }
     }
     
-    updateBusLocations() {
-        // Fetch current bus locations
-        fetch('/api/bus-locations')
-            .then(response => response.json())
-            .then(data => {
-                updateBusMarkers(data.buses);
-            })
-            .catch(error => console.error('Error updating bus locations:', error));
-    }
-    
     updateEmergencyStatus() {
         // Check if emergency window is active
         fetch('/api/emergency-status')
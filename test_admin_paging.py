@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test for the admin dashboard paging
+Checks stop riders and emergency requests come back a page at a time, in order, with working cursors
+"""
+
+from datetime import datetime, timedelta
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def test_stop_riders_page_by_student_id():
+    with transport.app.app_context():
+        stops, _, _ = seed_fleet()
+        client = logged_in_client(admin=True)
+        assert client.get('/admin/dashboard').status_code == 200
+
+        riders = client.get(f'/admin/stops/{stops[0].id}/students').get_json()
+        assert [rider['student_id'] for rider in riders['students']] == ['S0', 'S6', 'S12', 'S18', 'S24']
+        assert riders['next_after'] is None
+
+        today = datetime.now().date()
+        pages, cursor = [], None
+        while True:
+            page, cursor = transport.stop_students_page(stops[0].id, today, cursor, limit=2)
+            pages.append([student.student_id for student in page])
+            if cursor is None:
+                break
+        assert pages == [['S0', 'S6'], ['S12', 'S18'], ['S24']]
+
+
+def test_emergencies_page_newest_first():
+    with transport.app.app_context():
+        stops, _, students = seed_fleet()
+        now = datetime.utcnow()
+        # Two requests share a time, so the cursor has to break ties by id; the last is outside the window
+        request_times = [now - timedelta(minutes=5), now - timedelta(minutes=5), now - timedelta(minutes=1),
+                         now - timedelta(hours=3)]
+        for student, request_time in zip(students, request_times):
+            transport.db.session.add(transport.EmergencyRequest(student_id=student.id, stop_id=student.stop_id,
+                                                                request_time=request_time))
+        transport.db.session.commit()
+
+        emergencies, cursor = [], None
+        while True:
+            page, cursor = transport.emergency_page(now - timedelta(hours=1), cursor, limit=1)
+            emergencies.extend((emergency.request_time, emergency.id) for emergency, _, _ in page)
+            if cursor is None:
+                break
+        assert len(emergencies) == 3 and emergencies == sorted(emergencies, reverse=True)
+
+        try:
+            transport.emergency_page(now - timedelta(hours=1), 'not-a-cursor')
+            assert False, 'malformed cursor was accepted'
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_stop_riders_page_by_student_id()
+    test_emergencies_page_newest_first()
+    print("[OK] Admin lists are read a page at a time")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test for the streaming CSV import helpers
+Checks chunked reading with line numbers, header validation and the capped error report
+"""
+
+import io
+
+import bulk_import
+from bulk_import import ImportReport, csv_chunks
+
+COLUMNS = ('student_id', 'name')
+
+
+def upload(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def test_rows_come_in_chunks_with_line_numbers():
+    lines = ['﻿student_id,name'] + [f'S{i},Student {i}' for i in range(5)]
+    stream = upload('\r\n'.join(lines) + '\r\n')
+    chunks = list(csv_chunks(stream, COLUMNS, chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    # The byte order mark does not end up in the first column name
+    assert chunks[0][0] == (2, {'student_id': 'S0', 'name': 'Student 0'})
+    assert chunks[2][0][0] == 6
+    # The upload stream is still usable afterwards
+    assert not stream.closed
+
+
+def test_missing_columns_are_rejected():
+    try:
+        list(csv_chunks(upload('student_id,full_name\nS1,A\n'), COLUMNS))
+        assert False, 'header without name was accepted'
+    except ValueError as e:
+        assert 'name' in str(e)
+
+
+def test_report_caps_listed_errors():
+    report = ImportReport()
+    for line in range(bulk_import.MAX_REPORTED_ERRORS + 5):
+        report.error(line, 'bad row')
+    report.imported, report.skipped = 10, 2
+    summary = report.as_dict()
+    assert summary['error_count'] == bulk_import.MAX_REPORTED_ERRORS + 5
+    assert len(summary['errors']) == bulk_import.MAX_REPORTED_ERRORS and summary['errors_not_shown'] == 5
+    assert report.summary('students') == 'Imported 10 students, skipped 2 already present, rejected 105 rows'
+
+
+if __name__ == "__main__":
+    test_rows_come_in_chunks_with_line_numbers()
+    test_missing_columns_are_rejected()
+    test_report_caps_listed_errors()
+    print("[OK] CSV imports stream in chunks and report errors")
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Test for the /bus-routes page
+Checks it lists today's riders per stop from a cached view that a vote invalidates
+"""
+
+from scratch_db import captured_selects, logged_in_client, seed_fleet, transport
+
+
+def test_routes_page_is_cached_until_a_vote():
+    with transport.app.app_context():
+        _, _, students = seed_fleet()
+        client = logged_in_client(students[0].id)
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+
+        page = client.get('/bus-routes')
+        assert page.status_code == 200 and b'Student 0' in page.data and b'Student 29' in page.data
+        # A cached view only costs looking up the plan key and the vote stamp
+        assert len(captured_selects(lambda: client.get('/bus-routes'))) == 2
+
+        assert client.post('/vote', data={'needs_bus': 'no'}).status_code == 302
+        pages = []
+        # The vote moved the stamp, so the view is rebuilt with one more query
+        assert len(captured_selects(lambda: pages.append(client.get('/bus-routes')))) == 3
+        assert b'Student 0' not in pages[0].data and b'Student 6' in pages[0].data
+
+
+if __name__ == "__main__":
+    test_routes_page_is_cached_until_a_vote()
+    print("[OK] Bus routes page is served from a cached per-day view")
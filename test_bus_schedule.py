@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test for the dashboard bus schedule
+Checks the schedule comes from one grouped query, is served from the day cache and shows the user's route
+"""
+
+import io
+
+from scratch_db import captured_selects, logged_in_client, seed_fleet, transport
+
+
+def test_schedule_is_built_once_and_cached():
+    with transport.app.app_context():
+        stops, _, students = seed_fleet()
+        client = logged_in_client(students[0].id)
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+
+        transport.day_views.clear()
+        # The plan key, the cache stamp and then the one grouped query
+        assert len(captured_selects(transport.get_bus_schedule_data)) == 3
+        schedule = transport.get_bus_schedule_data()
+        assert sum(route['total_students'] for route in schedule) == 30
+        assert sorted(stop['stop_id'] for route in schedule for stop in route['stops']) == sorted(
+            stop.id for stop in stops)
+        assert len(captured_selects(transport.get_bus_schedule_data)) == 2
+
+        # A new student changes the stamp, so the schedule is rebuilt
+        transport.db.session.add(transport.Student(student_id='S30', name='Student 30', password_hash='x',
+                                                   stop_id=stops[0].id))
+        transport.db.session.commit()
+        assert sum(route['total_students'] for route in transport.get_bus_schedule_data()) == 31
+
+
+def test_schedule_follows_every_roster_change():
+    with transport.app.app_context():
+        stops, buses, students = seed_fleet()
+        assert transport.app.test_client().post('/api/optimize-routes', json={}).status_code == 200
+
+        def stop_counts():
+            return {stop['stop_id']: stop['student_count'] for route in transport.get_bus_schedule_data()
+                    for stop in route['stops']}
+
+        # Moving a student between stops keeps every id the same
+        assert stop_counts()[stops[0].id] == 5
+        students[0].stop_id = stops[1].id
+        transport.db.session.commit()
+        assert (stop_counts()[stops[0].id], stop_counts()[stops[1].id]) == (4, 6)
+
+        # Deleting the newest student and adding another leaves the same newest id on SQLite
+        newest = students[-1]
+        transport.DailyVote.query.filter_by(student_id=newest.id).delete()
+        transport.db.session.delete(newest)
+        transport.db.session.commit()
+        transport.db.session.add(transport.Student(student_id='S99', name='Student 99', password_hash='x',
+                                                   stop_id=stops[0].id))
+        transport.db.session.commit()
+        assert stop_counts()[stops[0].id] == 5
+
+        # Renamed stops, relabelled buses and CSV imports show up too
+        stops[2].name = 'Renamed Stop'
+        buses[0].bus_number = 'TS-NEW'
+        transport.db.session.commit()
+        schedule = transport.get_bus_schedule_data()
+        assert 'Renamed Stop' in [stop['stop_name'] for route in schedule for stop in route['stops']]
+        assert 'TS-NEW' in [route['bus_number'] for route in schedule]
+
+        client = logged_in_client(admin=True)
+        upload = 'student_id,name,password,stop_name\nS100,New,pw,Stop 0\n'
+        assert client.post('/admin/import/students',
+                           data={'file': (io.BytesIO(upload.encode()), 'students.csv')}).status_code == 200
+        assert stop_counts()[stops[0].id] == 6
+
+
+def test_dashboard_shows_the_route_serving_the_users_stop():
+    with transport.app.app_context():
+        stops, _, students = seed_fleet()
+        client = logged_in_client(students[1].id)
+        # No plan yet, so no route to show
+        assert b'Bus TS' not in client.get('/dashboard').data
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+
+        serving = next(route for route in transport.get_bus_schedule_data()
+                       if any(stop['stop_id'] == stops[1].id for stop in route['stops']))
+        page = client.get('/dashboard')
+        assert page.status_code == 200 and f"Bus {serving['bus_number']}".encode() in page.data
+
+
+if __name__ == "__main__":
+    test_schedule_is_built_once_and_cached()
+    test_schedule_follows_every_roster_change()
+    test_dashboard_shows_the_route_serving_the_users_stop()
+    print("[OK] Dashboard schedule comes from one cached query")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test for the admin CSV imports
+Checks the student and bus stop uploads report imported, skipped and rejected rows and store only good ones
+"""
+
+import io
+
+from werkzeug.security import check_password_hash
+
+from scratch_db import logged_in_client, reset_database, transport
+
+
+def seed():
+    reset_database()
+    stops = [transport.BusStop(name=f'Stop {i}', latitude=17.40 + i / 100, longitude=78.47) for i in range(3)]
+    transport.db.session.add_all(stops)
+    transport.db.session.flush()
+    transport.db.session.add(transport.Student(student_id='S0', name='Student 0', password_hash='x',
+                                               stop_id=stops[0].id))
+    transport.db.session.commit()
+
+
+def upload(client, path, text):
+    return client.post(path, data={'file': (io.BytesIO(text.encode()), 'upload.csv')})
+
+
+def test_student_import_reports_every_row():
+    with transport.app.app_context():
+        seed()
+        client = logged_in_client(admin=True)
+        students_csv = ('student_id,name,password,stop_name\nS0,Student 0,x,Stop 0\nS100,New,pw,Stop 2\n'
+                        'S101,Lost,pw,Nowhere\nS102,,pw,Stop 2\nS100,Again,pw,Stop 2\n')
+        page = upload(client, '/admin/import/students', students_csv)
+        assert page.status_code == 200
+        assert b'Imported 1 students, skipped 2 already present, rejected 2 rows' in page.data
+        assert b'Bus stop &#39;Nowhere&#39; not found' in page.data
+
+        student = transport.Student.query.filter_by(student_id='S100').one()
+        assert student.stop.name == 'Stop 2'
+        # Imported passwords get the same hash as registration, so nothing changes at first login
+        password_hash = student.password_hash
+        assert check_password_hash(password_hash, 'pw')
+        assert client.post('/login', data={'student_id': 'S100', 'password': 'pw'}).status_code == 302
+        assert transport.Student.query.filter_by(student_id='S100').one().password_hash == password_hash
+
+
+def test_stop_import_reports_every_row_and_refreshes_distances():
+    with transport.app.app_context():
+        seed()
+        client = logged_in_client(admin=True)
+        stops_csv = ('name,latitude,longitude,address\nStop 1,17.41,78.47,\nNew Stop,17.5,78.5,Main Road\n'
+                     'Far Stop,95,78.5,\nBad Stop,north,78.5,\n,17.5,78.5,\nNew Stop,17.6,78.6,\n')
+        page = upload(client, '/admin/import/stops', stops_csv)
+        assert page.status_code == 200
+        assert b'Imported 1 bus stops, skipped 2 already present, rejected 3 rows' in page.data
+        assert b'coordinates out of range' in page.data
+
+        stop = transport.BusStop.query.filter_by(name='New Stop').one()
+        assert (stop.latitude, stop.longitude, stop.address) == (17.5, 78.5, 'Main Road')
+        assert stop.id in transport.distance_cache.matrix
+
+        page = upload(client, '/admin/import/stops', 'name,address\nOnly Name,\n')
+        assert b'Missing CSV columns: latitude, longitude' in page.data
+
+
+if __name__ == "__main__":
+    test_student_import_reports_every_row()
+    test_stop_import_reports_every_row_and_refreshes_distances()
+    print("[OK] CSV imports report rejected rows and keep the good ones")
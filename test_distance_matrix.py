@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Accuracy test for the distance matrix engine
+Checks batched haversine/Vincenty distances against geopy's geodesic
+"""
+
+import os
+import tempfile
+from types import SimpleNamespace
+
+from geopy.distance import geodesic
+
+from distance_matrix import DistanceCache, DistanceMatrix, HAVERSINE, VINCENTY, pairwise_distances
+
+# Sample stops around Hyderabad plus a few long-range points
+POINTS = [
+    (17.4065, 78.4772),
+    (17.4156, 78.4856),
+    (17.3987, 78.4689),
+    (17.4325, 78.4923),
+    (17.3856, 78.4567),
+    (17.4456, 78.5012),
+    (17.3789, 78.4456),
+    (12.9716, 77.5946),
+    (28.6139, 77.2090),
+    (0.0, 0.0),
+    (0.0, 10.0),
+]
+
+# Vincenty must agree with geodesic to within a metre, haversine to within 0.5%
+VINCENTY_TOLERANCE_KM = 0.001
+HAVERSINE_RELATIVE_TOLERANCE = 0.005
+
+
+def test_vincenty_matches_geodesic():
+    matrix = pairwise_distances(POINTS, POINTS, VINCENTY)
+    for i, point1 in enumerate(POINTS):
+        for j, point2 in enumerate(POINTS):
+            expected = geodesic(point1, point2).kilometers
+            assert abs(matrix[i, j] - expected) < VINCENTY_TOLERANCE_KM, (point1, point2, matrix[i, j], expected)
+
+
+def test_haversine_matches_geodesic():
+    matrix = pairwise_distances(POINTS, POINTS, HAVERSINE)
+    for i, point1 in enumerate(POINTS):
+        for j, point2 in enumerate(POINTS):
+            expected = geodesic(point1, point2).kilometers
+            assert abs(matrix[i, j] - expected) <= expected * HAVERSINE_RELATIVE_TOLERANCE + 1e-9
+
+
+def test_distance_matrix_lookup_by_stop_id():
+    college = {'latitude': 17.4065, 'longitude': 78.4772}
+    stops = [SimpleNamespace(id=10 + i, latitude=lat, longitude=lon) for i, (lat, lon) in enumerate(POINTS[1:7])]
+    distances = DistanceMatrix(stops, college, mode=VINCENTY)
+
+    for stop in stops:
+        expected = geodesic((stop.latitude, stop.longitude), (college['latitude'], college['longitude'])).kilometers
+        assert abs(distances.to_college(stop.id) - expected) < VINCENTY_TOLERANCE_KM
+    assert distances.between(10, 10) == 0
+    assert distances.between(10, 11) == distances.between(11, 10)
+
+
+def test_unknown_mode_rejected():
+    try:
+        pairwise_distances(POINTS, POINTS, 'manhattan')
+    except ValueError:
+        return
+    raise AssertionError('Unknown distance mode should raise ValueError')
+
+
+def test_cache_computes_only_new_stops():
+    college = {'latitude': 17.4065, 'longitude': 78.4772}
+    stops = [SimpleNamespace(id=i + 1, latitude=lat, longitude=lon) for i, (lat, lon) in enumerate(POINTS[1:7])]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'distance_cache.npz')
+        cache = DistanceCache(path, college)
+        first = cache.refresh(stops[:4])
+        assert os.path.exists(path)
+        assert cache.matrix_for(stops[:2]) is first
+
+        # A new worker picks the matrix up from disk
+        reloaded = DistanceCache(path, college)
+        reloaded.load()
+        assert reloaded.matrix.stop_ids == first.stop_ids
+        assert reloaded.matrix.stale_stops(stops) == stops[4:]
+
+        # Adding stops keeps existing rows and matches a full rebuild
+        stops[0].latitude += 0.01
+        updated = reloaded.refresh(stops[1:])
+        full = DistanceMatrix(stops[1:], college)
+        assert 1 not in updated
+        for a in stops[1:]:
+            assert abs(updated.to_college(a.id) - full.to_college(a.id)) < 1e-9
+            for b in stops[1:]:
+                assert abs(updated.between(a.id, b.id) - full.between(a.id, b.id)) < 1e-9
+
+        # A cache built for another distance mode is ignored
+        assert DistanceMatrix.load(path, college, VINCENTY) is None
+
+
+if __name__ == "__main__":
+    test_vincenty_matches_geodesic()
+    test_haversine_matches_geodesic()
+    test_distance_matrix_lookup_by_stop_id()
+    test_unknown_mode_rejected()
+    test_cache_computes_only_new_stops()
+    print("[OK] Distance matrix matches geodesic within tolerance")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test for emergency pickup dispatch
+Checks an emergency is assigned the nearest bus with a fresh position and a free seat
+"""
+
+from datetime import datetime, timedelta
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def report_positions(client, buses, stop, ages):
+    now = datetime.utcnow()
+    points = [{'bus_id': bus.id, 'latitude': stop.latitude + i / 1000, 'longitude': stop.longitude,
+               'timestamp': (now - age).isoformat()} for i, (bus, age) in enumerate(zip(buses, ages))]
+    assert client.post('/api/update-locations', json=points).status_code == 200
+
+
+def test_emergency_goes_to_the_nearest_fresh_bus():
+    with transport.app.app_context():
+        stops, buses, students = seed_fleet()
+        client = logged_in_client(students[0].id)
+        # TS0 is nearest but last reported two days ago; TS1 is next closest and fresh
+        report_positions(client, buses, stops[0], [timedelta(days=2), timedelta(minutes=1), timedelta(minutes=1)])
+
+        window_active = transport.is_emergency_window_active
+        transport.is_emergency_window_active = lambda: True
+        try:
+            response = client.post('/emergency').get_json()
+        finally:
+            transport.is_emergency_window_active = window_active
+        assert response['assigned_bus'] == 'TS1' and response['nearby_buses'] == 2
+        assert transport.EmergencyRequest.query.one().assigned_bus_id == buses[1].id
+
+
+def test_full_buses_are_passed_over():
+    with transport.app.app_context():
+        stops, buses, _ = seed_fleet()
+        client = logged_in_client()
+        report_positions(client, buses, stops[0], [timedelta(minutes=1)] * 3)
+        buses[0].capacity = 0
+        transport.db.session.commit()
+        nearby = transport.find_nearby_buses((stops[0].latitude, stops[0].longitude))
+        assert [match['bus'].bus_number for match in nearby] == ['TS1', 'TS2']
+
+
+if __name__ == "__main__":
+    test_emergency_goes_to_the_nearest_fresh_bus()
+    test_full_buses_are_passed_over()
+    print("[OK] Emergencies are assigned the nearest available bus")
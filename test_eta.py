@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test for stop arrival time prediction
+Checks learned speeds per cell and time of day, and estimates as a bus works through its stops
+"""
+
+from datetime import datetime, timedelta
+
+from eta import (ROAD_DETOUR_FACTOR, STOP_DWELL_MINUTES, EtaEngine, SpeedProfile, cell_of, distance_km,
+                 time_bucket)
+from road_network import DEFAULT_SPEED_KMH
+from live_positions import PositionStore
+
+MORNING = datetime(2024, 1, 1, 7, 5)
+
+# Three stops heading south to the college, about 2.2 km apart
+ROUTE = [(1, 'North', 17.45, 78.47), (2, 'Middle', 17.43, 78.47), (3, 'South', 17.41, 78.47),
+         (None, 'College', 17.39, 78.47)]
+
+
+def leg_minutes_at(speed_kmh, start, end):
+    return distance_km(start, end) * ROAD_DETOUR_FACTOR / speed_kmh * 60
+
+
+def test_speed_profile_per_cell_and_bucket():
+    profile = SpeedProfile()
+    profile.replace([
+        (17.425, 78.475, MORNING, 10, 12.0),
+        (17.425, 78.475, MORNING + timedelta(minutes=1), 10, 18.0),
+        (17.445, 78.475, MORNING, 20, 40.0),
+        (17.445, 78.475, MORNING, 5, 0.0),  # Parked
+    ])
+    bucket = time_bucket(MORNING)
+    assert profile.speed(cell_of(17.425, 78.475), bucket) == 15.0
+    # A cell without data uses the bucket's speed over all cells, weighted by points
+    assert profile.speed(cell_of(17.50, 78.50), bucket) == (12 * 10 + 18 * 10 + 40 * 20) / 40
+    # A time of day without data uses the default
+    assert profile.speed(cell_of(17.425, 78.475), time_bucket(MORNING + timedelta(hours=5))) == DEFAULT_SPEED_KMH
+
+    start, end = (17.425, 78.4751), (17.4251, 78.475)
+    before = profile.leg_minutes(start, end, bucket)
+    assert abs(before - leg_minutes_at(15.0, start, end)) < 1e-9
+    profile.add([(17.425, 78.475, MORNING, 20, 30.0)])
+    assert abs(profile.leg_minutes(start, end, bucket) - leg_minutes_at(22.5, start, end)) < 1e-9
+
+
+def test_estimates_follow_bus_along_route():
+    profile = SpeedProfile()
+    engine = EtaEngine(profile)
+    store = PositionStore()
+    assert engine.set_routes('plan-1', {7: list(ROUTE)})
+    assert not engine.set_routes('plan-1', {})
+
+    # Heading out to the first stop, level with the second: no stop is skipped on the way out
+    store.update({'bus_id': 7, 'latitude': 17.43, 'longitude': 78.4701, 'timestamp': MORNING})
+    engine.catch_up(store)
+    _, arrivals = engine.arrivals(7)
+    assert [stop_id for stop_id, _, _ in arrivals] == [1, 2, 3, None]
+
+    # Reaching the first stop, then skipping ahead to between the second and third
+    store.update({'bus_id': 7, 'latitude': 17.45, 'longitude': 78.47, 'timestamp': MORNING + timedelta(minutes=10)})
+    engine.catch_up(store)
+    assert [stop_id for stop_id, _, _ in engine.arrivals(7)[1]] == [2, 3, None]
+    moment = MORNING + timedelta(minutes=20)
+    store.update({'bus_id': 7, 'latitude': 17.42, 'longitude': 78.4701, 'timestamp': moment})
+    engine.catch_up(store)
+    updated_at, arrivals = engine.arrivals(7)
+    assert updated_at == moment
+    assert [stop_id for stop_id, _, _ in arrivals] == [3, None]
+
+    # Nothing learned yet, so every leg is driven at the default speed
+    first = leg_minutes_at(DEFAULT_SPEED_KMH, (17.42, 78.4701), ROUTE[2][2:])
+    assert abs((arrivals[0][2] - moment).total_seconds() / 60 - first) < 1e-6
+    second = leg_minutes_at(DEFAULT_SPEED_KMH, ROUTE[2][2:], ROUTE[3][2:])
+    assert abs((arrivals[1][2] - arrivals[0][2]).total_seconds() / 60 - second - STOP_DWELL_MINUTES) < 1e-6
+    assert engine.next_arrival(3) == (7, arrivals[0][2])
+    assert engine.next_arrival(1) is None
+
+    # An older point arriving late does not move the bus back
+    engine.observe({'bus_id': 7, 'latitude': 17.45, 'longitude': 78.47, 'timestamp': MORNING})
+    assert engine.arrivals(7)[0] == moment
+
+
+if __name__ == "__main__":
+    test_speed_profile_per_cell_and_bucket()
+    test_estimates_follow_bus_along_route()
+    print("[OK] Arrival estimates follow learned speeds and bus progress")
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test for the stop ETA endpoint
+Checks every bus on today's plan gets estimates for its remaining stops once it reports a position
+"""
+
+from datetime import datetime
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def test_buses_get_estimates_after_reporting():
+    with transport.app.app_context():
+        seed_fleet()
+        client = logged_in_client()
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        transport.load_speed_profile()
+
+        routes = transport.plan_stops(datetime.now().date())
+        etas = client.get('/api/etas').get_json()
+        assert etas['speed_profile_loaded']
+        assert [bus['bus_id'] for bus in etas['buses']] == sorted(routes)
+        # Nothing reported yet, so nothing to estimate from
+        assert all(bus['updated_at'] is None and bus['stops'] == [] for bus in etas['buses'])
+
+        bus_id = min(routes)
+        first_stop = routes[bus_id][0]
+        point = {'bus_id': bus_id, 'latitude': first_stop[2] - 0.01, 'longitude': first_stop[3],
+                 'speed': 30, 'timestamp': datetime.utcnow().isoformat()}
+        assert client.post('/api/update-locations', json=[point]).status_code == 200
+        estimate = client.get(f'/api/etas?bus_id={bus_id}').get_json()['buses'][0]
+        assert estimate['updated_at'] is not None
+        assert estimate['stops'][0]['stop_id'] == first_stop[0] and estimate['stops'][-1]['stop_name'] == 'College'
+        minutes = [stop['minutes_away'] for stop in estimate['stops']]
+        assert minutes == sorted(minutes) and minutes[0] >= 0
+
+
+if __name__ == "__main__":
+    test_buses_get_estimates_after_reporting()
+    print("[OK] ETA endpoint estimates each bus's remaining stops")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test for geofence stop-arrival detection
+Checks arrivals and departures along a route, jitter at the fence edge and stops of other buses
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from geofence import ARRIVAL, DEPARTURE, GeofenceEngine
+
+START = datetime(2024, 1, 1, 7, 0)
+# About 0.11 km per 0.001 degrees of latitude
+ROUTES = {1: [(10, 17.40, 78.47), (11, 17.42, 78.47)], 2: [(20, 17.41, 78.47)]}
+
+
+def events_for(engine, bus_id, latitudes):
+    events = []
+    for minute, latitude in enumerate(latitudes):
+        for event in engine.process(bus_id, latitude, 78.47, START + timedelta(minutes=minute)):
+            events.append((event['stop_id'], event['event']))
+    return events
+
+
+def test_arrival_and_departure_along_route():
+    engine = GeofenceEngine()
+    assert engine.set_routes('plan', ROUTES)
+    # Approach stop 10, jitter at its edge, leave, pass stop 20 of bus 2, then reach stop 11
+    latitudes = [17.397, 17.3995, 17.4011, 17.3992, 17.4012, 17.402, 17.41, 17.4195, 17.42]
+    assert events_for(engine, 1, latitudes) == [(10, ARRIVAL), (10, DEPARTURE), (11, ARRIVAL)]
+    # A late point from before the departure changes nothing
+    assert engine.process(1, 17.40, 78.47, START) == []
+
+
+def test_known_position_survives_plan_reload():
+    engine = GeofenceEngine()
+    engine.set_routes('plan-1', ROUTES, at_stop={1: 10, 2: 99})
+    assert engine.at_stop == {1: 10}
+    assert events_for(engine, 1, [17.4005]) == []
+    assert events_for(engine, 1, [17.405]) == [(10, DEPARTURE)]
+    assert not engine.set_routes('plan-1', {})
+
+
+def test_points_far_from_every_stop_are_cheap():
+    engine = GeofenceEngine()
+    engine.set_routes('plan', {bus_id: [(bus_id * 10 + i, 17.40 + i * 0.005, 78.47) for i in range(20)]
+                               for bus_id in range(500)})
+    started = time.perf_counter()
+    for i in range(20000):
+        engine.process(i % 500, 17.60, 78.60, START + timedelta(seconds=i))
+    assert (time.perf_counter() - started) / 20000 < 0.0001
+
+
+if __name__ == "__main__":
+    test_arrival_and_departure_along_route()
+    test_known_position_survives_plan_reload()
+    test_points_far_from_every_stop_are_cheap()
+    print("[OK] Geofences detect stop arrivals and departures")
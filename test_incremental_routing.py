@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental route plan repair
+Checks that only affected routes change and capacity is respected after demand changes
+"""
+
+from types import SimpleNamespace
+
+from distance_matrix import DistanceMatrix
+from incremental_routing import RoutePlan, repair_plan, route_cost
+
+COLLEGE = {'latitude': 17.4065, 'longitude': 78.4772}
+STOPS = [SimpleNamespace(id=i, latitude=17.40 + 0.01 * i, longitude=78.47 + 0.005 * (i % 3)) for i in range(1, 9)]
+CAPACITIES = {101: 10, 102: 10, 103: 10}
+
+
+def build_plan():
+    distances = DistanceMatrix(STOPS, COLLEGE)
+    routes = [(101, [1, 2, 3]), (102, [4, 5, 6])]
+    demands = {1: 3, 2: 3, 3: 3, 4: 3, 5: 3, 6: 3}
+    plan = RoutePlan('settings', routes, [route_cost(stop_ids, distances) for _, stop_ids in routes], demands)
+    return plan, distances
+
+
+def test_unchanged_demand_changes_nothing():
+    plan, distances = build_plan()
+    assert repair_plan(plan, dict(plan.demands), CAPACITIES, distances) == set()
+    assert plan.routes == [(101, [1, 2, 3]), (102, [4, 5, 6])]
+
+
+def test_dropped_stop_only_touches_its_route():
+    plan, distances = build_plan()
+    demands = {**plan.demands, 5: 0}
+    assert repair_plan(plan, demands, CAPACITIES, distances) == {1}
+    assert plan.routes[0] == (101, [1, 2, 3])
+    assert plan.routes[1] == (102, [4, 6])
+    assert abs(plan.route_distances[1] - route_cost([4, 6], distances)) < 1e-9
+
+
+def test_overloaded_route_moves_stop_or_opens_bus():
+    plan, distances = build_plan()
+    demands = {**plan.demands, 2: 6, 7: 4}
+    changed = repair_plan(plan, demands, CAPACITIES, distances)
+
+    served = sorted(stop_id for _, stop_ids in plan.routes for stop_id in stop_ids)
+    assert served == [1, 2, 3, 4, 5, 6, 7]
+    for bus_id, stop_ids in plan.routes:
+        assert plan.route_load(stop_ids) <= CAPACITIES[bus_id]
+    assert 0 in changed
+    assert not plan.unserved
+
+
+def test_stop_cap_is_kept_when_inserting():
+    plan, distances = build_plan()
+    demands = {**plan.demands, 7: 1}
+    repair_plan(plan, dict(demands), CAPACITIES, distances)
+    assert max(len(stop_ids) for _, stop_ids in plan.routes) == 4
+
+    plan, distances = build_plan()
+    repair_plan(plan, demands, CAPACITIES, distances, max_stops=3)
+    assert plan.routes[:2] == [(101, [1, 2, 3]), (102, [4, 5, 6])]
+    assert plan.routes[2] == (103, [7])
+    assert not plan.unserved
+
+
+def test_unservable_demand_forces_rebuild():
+    plan, distances = build_plan()
+    demands = {stop.id: 9 for stop in STOPS}
+    repair_plan(plan, demands, CAPACITIES, distances)
+    assert plan.unserved
+    assert plan.has_drifted()
+
+
+if __name__ == "__main__":
+    test_unchanged_demand_changes_nothing()
+    test_dropped_stop_only_touches_its_route()
+    test_overloaded_route_moves_stop_or_opens_bus()
+    test_stop_cap_is_kept_when_inserting()
+    test_unservable_demand_forces_rebuild()
+    print("[OK] Incremental plan repair verified")
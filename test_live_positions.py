@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test for the in-memory latest bus position store
+Checks that only the newest point per bus is kept, nearest-bus lookups and pushed deltas
+"""
+
+import queue
+from datetime import datetime, timedelta
+
+from live_positions import MAX_PENDING_EVENTS, PositionBroadcaster, PositionStore
+
+START = datetime(2024, 1, 1, 7, 0)
+
+
+def point(bus_id, minutes, latitude=17.4):
+    return {'bus_id': bus_id, 'latitude': latitude, 'longitude': 78.47, 'timestamp': START + timedelta(minutes=minutes)}
+
+
+def test_keeps_newest_position_per_bus():
+    store = PositionStore()
+    assert store.update(point(2, 1, 17.41))
+    assert store.update(point(1, 1, 17.42))
+    assert store.update(point(2, 3, 17.43))
+    # A late-arriving older point does not overwrite the newer one
+    assert not store.update(point(2, 2, 17.44))
+
+    version, positions = store.snapshot()
+    assert version == 3
+    assert [(p['bus_id'], p['latitude']) for p in positions] == [(1, 17.42), (2, 17.43)]
+
+
+def test_coordinates_are_stored_as_numbers():
+    store = PositionStore()
+    assert store.update(dict(point(1, 0), latitude='17.41', longitude='78.47'))
+    assert store.positions[1]['latitude'] == 17.41 and store.nearest(17.41, 78.47, 1)[0][1]['bus_id'] == 1
+    # A coordinate that is not a number is refused without touching what is held
+    try:
+        store.update(dict(point(1, 5), latitude='north'))
+        assert False, 'non-numeric latitude was stored'
+    except ValueError:
+        pass
+    assert store.positions[1]['latitude'] == 17.41 and store.version == 1
+
+
+def test_snapshot_is_a_copy():
+    store = PositionStore()
+    store.replace([point(1, 0)])
+    _, positions = store.snapshot()
+    positions[0]['latitude'] = 0.0
+    assert store.snapshot()[1][0]['latitude'] == 17.4
+    assert len(store) == 1
+
+
+def test_nearest_follows_moving_buses():
+    store = PositionStore()
+    store.replace([point(1, 0, 17.40), point(2, 0, 17.45), point(3, 0, 17.50)])
+    assert [p['bus_id'] for _, p in store.nearest(17.40, 78.47, 2)] == [1, 2]
+
+    # Bus 3 drives up to the query point and bus 1 is filtered out, e.g. because it is full
+    store.update(point(3, 1, 17.401))
+    matches = store.nearest(17.40, 78.47, 5, max_km=3, accept=lambda p: p['bus_id'] != 1)
+    assert [p['bus_id'] for _, p in matches] == [3]
+    assert abs(matches[0][0] - 0.111) < 0.001
+
+
+def test_broadcaster_pushes_deltas_to_every_subscriber():
+    store = PositionStore()
+    store.replace([point(1, 0), point(2, 0)])
+    broadcaster = PositionBroadcaster(store, lambda positions: [p['bus_id'] for p in positions], poll_interval=0.1)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+
+    store.update(point(2, 1))
+    assert first.get(timeout=5) == [2]
+    assert second.get(timeout=5) == [2]
+
+    # Re-sending the same point is not a change
+    assert not store.update(point(2, 1))
+    assert store.changes_since(store.version) == (store.version, [])
+
+
+def test_slow_subscriber_is_dropped():
+    store = PositionStore()
+    broadcaster = PositionBroadcaster(store, lambda positions: positions)
+    slow = broadcaster.subscribe()
+    for minute in range(MAX_PENDING_EVENTS + 1):
+        broadcaster.publish([point(1, minute)])
+    assert slow not in broadcaster.subscribers
+    events = [slow.get_nowait() for _ in range(slow.qsize())]
+    assert events[-1] is None
+
+
+class RefilledQueue(queue.Queue):
+    """Queue that another publisher tops up again whenever an item is taken out"""
+
+    def get_nowait(self):
+        item = super().get_nowait()
+        if self.refills:
+            self.refills -= 1
+            self.put_nowait('late event')
+        return item
+
+
+def test_drop_survives_concurrent_publishers():
+    broadcaster = PositionBroadcaster(PositionStore(), lambda positions: positions)
+    slow = RefilledQueue(2)
+    slow.refills = 3
+    slow.put_nowait('event')
+    slow.put_nowait('event')
+    broadcaster.subscribers.add(slow)
+    broadcaster.broadcast('one too many')
+    assert slow not in broadcaster.subscribers
+    assert list(slow.queue)[-1] is None
+    # A second publisher that listed it before the drop leaves the ended stream alone
+    ended = list(slow.queue)
+    broadcaster._drop(slow)
+    assert list(slow.queue) == ended
+
+
+if __name__ == "__main__":
+    test_keeps_newest_position_per_bus()
+    test_coordinates_are_stored_as_numbers()
+    test_snapshot_is_a_copy()
+    test_nearest_follows_moving_buses()
+    test_broadcaster_pushes_deltas_to_every_subscriber()
+    test_slow_subscriber_is_dropped()
+    test_drop_survives_concurrent_publishers()
+    print("[OK] Position store keeps the latest point per bus")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Test for the live bus position stream
+Checks the per-process stream limit and that streams release their slot and subscription however they end
+"""
+
+import threading
+
+from scratch_db import reset_database, transport
+
+
+def test_streams_over_the_limit_are_refused():
+    with transport.app.app_context():
+        reset_database()
+    slots = transport.stream_slots
+    transport.stream_slots = threading.BoundedSemaphore(1)
+    try:
+        client = transport.app.test_client()
+        first = client.get('/api/stream/bus-locations', buffered=False)
+        assert first.status_code == 200
+        assert next(first.response).startswith(b'retry:')
+        assert len(transport.position_broadcaster.subscribers) == 1
+
+        refused = client.get('/api/stream/bus-locations')
+        assert refused.status_code == 503 and refused.headers['Retry-After']
+
+        first.close()
+        assert len(transport.position_broadcaster.subscribers) == 0
+        # A stream that is closed before anything was sent frees its slot and never subscribes
+        unsent = client.get('/api/stream/bus-locations', buffered=False)
+        assert unsent.status_code == 200
+        unsent.close()
+        assert len(transport.position_broadcaster.subscribers) == 0
+        assert client.get('/api/stream/bus-locations', buffered=False).status_code == 200
+    finally:
+        transport.stream_slots = slots
+
+
+if __name__ == "__main__":
+    test_streams_over_the_limit_are_refused()
+    print("[OK] Live streams are capped per process and always released")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test for GPS point ingestion through the app
+Checks that single and batch updates validate and coerce points the same way before anything is stored
+"""
+
+from scratch_db import reset_database, transport
+
+
+def seed():
+    reset_database()
+    bus = transport.Bus(bus_number='TS1', capacity=40)
+    transport.db.session.add(bus)
+    transport.db.session.commit()
+    return bus.id
+
+
+def test_single_update_coerces_like_the_batch_endpoint():
+    with transport.app.app_context():
+        bus_id = seed()
+        client = transport.app.test_client()
+        point = {'bus_id': str(bus_id), 'latitude': '17.41', 'longitude': '78.48', 'speed': '30'}
+        # Posted twice, the string id must still find the bus's one BusPosition row
+        assert client.post('/api/update-location', json=point).status_code == 200
+        assert client.post('/api/update-location', json=dict(point, latitude='17.42')).status_code == 200
+        positions = transport.BusPosition.query.all()
+        assert [(p.bus_id, p.latitude) for p in positions] == [(bus_id, 17.42)]
+        live = transport.position_store.positions[bus_id]
+        assert (live['latitude'], live['longitude'], live['speed']) == (17.42, 78.48, 30.0)
+        assert transport.BusLocation.query.count() == 2
+
+
+def test_bad_single_points_are_rejected_before_storing():
+    with transport.app.app_context():
+        bus_id = seed()
+        client = transport.app.test_client()
+        bad_points = [
+            {'bus_id': bus_id, 'latitude': 'north'},
+            {'bus_id': bus_id, 'latitude': 95},
+            {'bus_id': 999},
+            {'bus_id': bus_id, 'timestamp': 'yesterday'},
+            # Statuses are shown on student pages, so only the known ones get in
+            {'bus_id': bus_id, 'status': '<svg/onload=alert()>'},
+            {'bus_id': bus_id, 'status': ['moving']},
+        ]
+        for point in bad_points:
+            response = client.post('/api/update-location', json=point)
+            assert response.status_code == 400 and response.get_json()['error']
+        assert client.post('/api/update-location', data='not json').status_code == 400
+        assert transport.BusLocation.query.count() == 0 and transport.BusPosition.query.count() == 0
+        assert transport.position_store.positions == {}
+
+
+def test_batch_points_with_unknown_status_are_rejected():
+    with transport.app.app_context():
+        bus_id = seed()
+        client = transport.app.test_client()
+        points = [{'bus_id': bus_id, 'latitude': 17.41, 'longitude': 78.48, 'status': status}
+                  for status in ('stopped', '<svg/onload=alert()>', 'delayed')]
+        response = client.post('/api/update-locations', json=points).get_json()
+        assert [result['accepted'] for result in response['results']] == [True, False, True]
+        assert sorted(status for status, in transport.db.session.query(transport.BusLocation.status)) == [
+            'delayed', 'stopped']
+
+
+if __name__ == "__main__":
+    test_single_update_coerces_like_the_batch_endpoint()
+    test_bad_single_points_are_rejected_before_storing()
+    test_batch_points_with_unknown_status_are_rejected()
+    print("[OK] GPS points are validated before they are stored")
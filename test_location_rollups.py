@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test for per-minute bus location rollups
+Checks that rollups match the raw points and merge the same however points are batched
+"""
+
+from datetime import datetime, timedelta
+
+from location_rollups import merge_rollups, rollup_points
+
+START = datetime(2024, 1, 1, 7, 0)
+
+
+def points():
+    # Two buses reporting every 10 seconds for three minutes
+    for k in range(18):
+        for bus_id in (1, 2):
+            yield (bus_id, START + timedelta(seconds=10 * k), 17.4 + k / 1000, 78.47, float(k), f'status{k}')
+
+
+def test_rollup_summarises_each_bus_minute():
+    rollups = rollup_points(points())
+    assert sorted(rollups) == [(bus_id, START + timedelta(minutes=m)) for bus_id in (1, 2) for m in range(3)]
+
+    first = rollups[(1, START)]
+    assert first['point_count'] == 6
+    assert abs(first['latitude'] - (17.4 + 2.5 / 1000)) < 1e-9
+    assert first['avg_speed'] == 2.5 and first['max_speed'] == 5.0
+    assert first['last_seen'] == START + timedelta(seconds=50)
+    assert first['status'] == 'status5'
+
+
+def test_batched_rollups_merge_to_the_same_result():
+    all_points = list(points())
+    whole = rollup_points(all_points)
+
+    # Compaction works in batches; later batches merge into rollups already written
+    merged = rollup_points(all_points[:15])
+    for key, rollup in rollup_points(all_points[15:]).items():
+        if key in merged:
+            merge_rollups(merged[key], rollup)
+        else:
+            merged[key] = rollup
+
+    assert merged.keys() == whole.keys()
+    for key in whole:
+        for field, value in whole[key].items():
+            if isinstance(value, float):
+                assert abs(merged[key][field] - value) < 1e-9, (key, field)
+            else:
+                assert merged[key][field] == value, (key, field)
+
+
+if __name__ == "__main__":
+    test_rollup_summarises_each_bus_minute()
+    test_batched_rollups_merge_to_the_same_result()
+    print("[OK] Location rollups summarise raw points per bus per minute")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test for the route optimization endpoint
+Checks how request options are read and validated, that a plan is only repaired incrementally when asked,
+and how plans are cached and revalidated by ETag
+"""
+
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+from distance_matrix import DistanceMatrix
+from route_ordering import PARALLEL_MIN_ROUTES
+from scratch_db import reset_database, transport
+
+
+def seed():
+    reset_database()
+    db = transport.db
+    stops = [transport.BusStop(name=f'Stop {i}', latitude=17.40 + i / 100, longitude=78.47) for i in range(4)]
+    db.session.add_all(stops + [transport.Bus(bus_number='TS1', capacity=40), transport.Bus(bus_number='TS2', capacity=40)])
+    db.session.commit()
+    students = [transport.Student(student_id=f'S{i}', name=f'Student {i}', password_hash='x',
+                                  stop_id=stops[i % len(stops)].id) for i in range(8)]
+    db.session.add_all(students)
+    db.session.commit()
+    today = datetime.now().date()
+    db.session.add_all([transport.DailyVote(student_id=student.id, vote_date=today, needs_bus=True)
+                        for student in students])
+    db.session.flush()
+    transport.reconcile_stop_demand(today)
+    db.session.commit()
+    return students
+
+
+def test_flags_read_like_the_environment():
+    assert all(transport.is_enabled(value) for value in (True, 1, '1', 'true', 'Yes', ' TRUE '))
+    assert not any(transport.is_enabled(value) for value in (False, 0, '0', 'false', 'no', 'off', ''))
+
+
+def test_incremental_false_string_runs_a_full_plan():
+    with transport.app.app_context():
+        students = seed()
+        client = transport.app.test_client()
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        # One student drops out, so the cached plan no longer applies
+        with client.session_transaction() as session:
+            session['_user_id'] = str(students[0].id)
+        assert client.post('/vote', data={'needs_bus': 'no'}).status_code == 302
+
+        plan = client.post('/api/optimize-routes', json={'incremental': 'false'}).get_json()
+        assert plan['engine']['mode'] == 'full' and plan['total_students_served'] == 7
+        # Another student drops out instead; now the plan is repaired
+        assert client.post('/vote', data={'needs_bus': 'yes'}).status_code == 302
+        with client.session_transaction() as session:
+            session['_user_id'] = str(students[1].id)
+        assert client.post('/vote', data={'needs_bus': 'no'}).status_code == 302
+        plan = client.post('/api/optimize-routes', json={'incremental': 'yes'}).get_json()
+        assert plan['engine']['mode'] == 'incremental' and plan['total_students_served'] == 7
+
+
+def test_malformed_options_are_rejected():
+    with transport.app.app_context():
+        seed()
+        client = transport.app.test_client()
+        limit = transport.app.config['ROUTING_TIME_LIMIT']
+        for body in ([1], 'savings', {'engine': [1]}, {'ordering': {'mode': 'exact'}}, {'engine': 'nope'},
+                     {'time_limit': 'soon'}, {'time_limit': 'nan'}, {'time_limit': 'inf'}, {'time_limit': 0},
+                     {'time_limit': -1}, {'time_limit': limit * 10}):
+            response = client.post('/api/optimize-routes', json=body)
+            assert response.status_code == 400 and response.get_json()['error'], body
+        assert client.post('/api/optimize-routes', json={'time_limit': limit / 2}).status_code == 200
+        # No body at all still means the configured defaults
+        assert client.post('/api/optimize-routes').status_code == 200
+
+
+def test_etag_follows_everything_the_plan_shows():
+    with transport.app.app_context():
+        seed()
+        client = transport.app.test_client()
+        response = client.post('/api/optimize-routes', json={})
+        etag = response.headers['ETag']
+        assert response.status_code == 200 and etag
+
+        response = client.post('/api/optimize-routes', json={}, headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.headers['ETag'] == etag and not response.data
+        assert client.post('/api/optimize-routes', json={}).headers['ETag'] == etag
+
+        # Renaming a stop changes the plan even though demand, fleet and settings did not,
+        # including in a process whose cached plans were never cleared
+        stop = transport.BusStop.query.first()
+        stop.name = 'Renamed Stop'
+        transport.db.session.commit()
+        response = client.post('/api/optimize-routes', json={}, headers={'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert 'Renamed Stop' in [stop['name'] for route in response.get_json()['routes'] for stop in route['stops']]
+
+        etag = response.headers['ETag']
+        stop.address = 'New Road'
+        transport.db.session.commit()
+        assert client.post('/api/optimize-routes', json={}).headers['ETag'] != etag
+
+
+def test_plan_cache_evicts_least_recently_used():
+    cache_size = transport.ROUTE_PLAN_CACHE_SIZE
+    transport.ROUTE_PLAN_CACHE_SIZE = 2
+    try:
+        with transport.app.app_context():
+            seed()
+            client = transport.app.test_client()
+            limit = transport.app.config['ROUTING_TIME_LIMIT']
+
+            def plan(divisor):
+                return client.post('/api/optimize-routes', json={'time_limit': limit / divisor}).get_etag()[0]
+
+            first, second = plan(2), plan(3)
+            assert list(transport.route_plan_cache) == [first, second]
+            # A hit makes a plan the most recently used, so the other one goes first
+            assert plan(2) == first
+            third = plan(4)
+            assert list(transport.route_plan_cache) == [first, third]
+    finally:
+        transport.ROUTE_PLAN_CACHE_SIZE = cache_size
+
+
+def test_parallel_cluster_ordering_matches_serial():
+    # Enough three-stop clusters for the routes to be ordered in worker processes
+    rng = random.Random(2)
+    stops = [SimpleNamespace(id=i, latitude=17.4 + rng.uniform(-0.3, 0.3), longitude=78.47 + rng.uniform(-0.3, 0.3))
+             for i in range(3 * (PARALLEL_MIN_ROUTES + 6))]
+    demanding_stops = [(stop, rng.randint(1, 10)) for stop in stops]
+    buses = [SimpleNamespace(id=i, capacity=40) for i in range(len(stops) // 3)]
+    distances = DistanceMatrix(stops, transport.COLLEGE_LOCATION)
+
+    def plan(workers):
+        router = transport.DynamicRouter(transport.COLLEGE_LOCATION, demanding_stops, buses,
+                                         distance_matrix=distances, workers=workers)
+        routes = router.generate_optimal_routes()['routes']
+        return [(route['bus'].id, [stop.id for stop, _ in route['stops']], route['route_distance']) for route in routes]
+
+    serial = plan(1)
+    assert sum(len(stop_ids) > 1 for _, stop_ids, _ in serial) >= PARALLEL_MIN_ROUTES
+    assert plan(2) == serial
+
+
+if __name__ == "__main__":
+    test_flags_read_like_the_environment()
+    test_incremental_false_string_runs_a_full_plan()
+    test_malformed_options_are_rejected()
+    test_etag_follows_everything_the_plan_shows()
+    test_plan_cache_evicts_least_recently_used()
+    test_parallel_cluster_ordering_matches_serial()
+    print("[OK] Route optimization options are parsed strictly")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression test for the hot tables
+Runs the main endpoints against a scratch database and fails if SQLite plans a full table scan
+"""
+
+import io
+import re
+from datetime import datetime, timedelta
+
+from scratch_db import captured_selects, logged_in_client, seed_fleet, transport
+
+# Tables that grow with students, days or GPS points; a plain scan of one of these is a regression
+HOT_TABLES = ('bus_location', 'daily_vote', 'route_assignment', 'emergency_request', 'bus_stop', 'bus_track',
+              'stop_event')
+# "SCAN t" (or "SCAN TABLE t" on older SQLite) without an index is a full table scan
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+FILTERED = re.compile(r'\b(?:WHERE|JOIN)\b')
+
+STOPS_CSV = 'name,latitude,longitude,address\nStop 1,17.41,78.47,\nNew Stop,17.5,78.5,\n'
+STUDENTS_CSV = 'student_id,name,password,stop_name\nS0,Student 0,x,Stop 0\nS100,New,pw,Stop 2\nS101,Lost,pw,Nowhere\n'
+
+
+def seed():
+    stops, buses, students = seed_fleet()
+    transport.db.session.add(transport.EmergencyRequest(student_id=students[0].id, stop_id=stops[0].id))
+    transport.db.session.commit()
+    return students[0].id, stops[0].id, [bus.id for bus in buses]
+
+
+def full_scans(statements):
+    """(table, statement) for every hot table the planner would read without an index"""
+    scans = []
+    with transport.db.engine.connect() as conn:
+        for statement, parameters in statements:
+            # Reading a whole table on purpose (e.g. every stop for the distance cache) is not a regression
+            if not FILTERED.search(statement):
+                continue
+            for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+                match = FULL_SCAN.match(row[-1])
+                if match and match.group(1) in HOT_TABLES:
+                    scans.append((match.group(1), statement))
+    return scans
+
+
+def test_endpoint_queries_use_indexes():
+    with transport.app.app_context():
+        student_id, stop_id, bus_ids = seed()
+    client = logged_in_client(student_id, admin=True)
+
+    def exercise_endpoints():
+        # Behaviour is covered by each feature's own tests; this only drives their queries
+        now = datetime.utcnow()
+        points = [{'bus_id': bus_id, 'latitude': 17.4, 'longitude': 78.47, 'timestamp': (now - timedelta(days=2)).isoformat()}
+                  for bus_id in bus_ids]
+        at_stop = [dict(point, timestamp=now.isoformat()) for point in points]
+        requests = [
+            ('post', '/api/update-locations', {'json': points}),
+            ('post', '/api/update-location', {'json': {'bus_id': bus_ids[0]}}),
+            ('post', '/api/optimize-routes', {'json': {}}),
+            ('get', '/api/etas', {}),
+            ('get', '/api/bus-schedule', {}),
+            ('get', '/dashboard', {}),
+            ('get', '/bus-routes', {}),
+            ('post', '/vote', {'data': {'needs_bus': 'no'}}),
+            ('get', '/bus-routes', {}),
+            ('get', '/api/bus-locations', {}),
+            ('get', '/api/live-location', {}),
+            ('post', '/emergency', {}),
+            ('get', '/admin/dashboard', {}),
+            ('get', f'/admin/stops/{stop_id}/students', {}),
+            ('post', '/api/update-locations', {'json': at_stop}),
+            ('get', '/api/stop-events', {}),
+            ('post', '/admin/import/stops', {'data': {'file': (io.BytesIO(STOPS_CSV.encode()), 'stops.csv')}}),
+            ('post', '/admin/import/students', {'data': {'file': (io.BytesIO(STUDENTS_CSV.encode()), 'students.csv')}}),
+        ]
+        window_active = transport.is_emergency_window_active
+        transport.is_emergency_window_active = lambda: True
+        try:
+            for method, path, arguments in requests:
+                assert getattr(client, method)(path, **arguments).status_code in (200, 302), path
+        finally:
+            transport.is_emergency_window_active = window_active
+        transport.load_speed_profile()
+        _, cursor = transport.stop_students_page(stop_id, datetime.now().date(), limit=2)
+        transport.stop_students_page(stop_id, datetime.now().date(), cursor, limit=2)
+        _, cursor = transport.emergency_page(now - timedelta(hours=1), limit=1)
+        transport.emergency_page(now - timedelta(hours=1), cursor, limit=1)
+        transport.reconcile_today_stop_demand()
+
+        transport.app.config['LIVE_POSITION_STORE'] = 'database'
+        try:
+            assert client.get('/api/live-location').status_code == 200
+            events = client.get('/api/stop-events').get_json()['events']
+            transport.drop_repeated_events([dict(bus_id=event['bus_id'], stop_id=event['stop_id'], event='arrival',
+                                                 timestamp=now, route_date=datetime.now().date())
+                                            for event in events])
+            transport.sync_stop_events()
+            transport.sync_stop_events()
+        finally:
+            transport.app.config['LIVE_POSITION_STORE'] = 'memory'
+        # An empty BusPosition table is backfilled from the latest BusLocation points
+        transport.BusPosition.query.delete()
+        transport.load_position_store()
+        transport.compact_bus_locations()
+        tracks = client.get(f'/api/tracks?date={now - timedelta(days=2):%Y-%m-%d}&bus_id={bus_ids[0]}').get_json()
+        assert client.get(f"/api/tracks/{tracks['tracks'][0]['id']}").status_code == 200
+
+    with transport.app.app_context():
+        statements = captured_selects(exercise_endpoints)
+        assert statements
+        scans = full_scans(statements)
+    assert not scans, '\n\n'.join(f'{table}: {statement}' for table, statement in scans)
+
+
+def test_missing_index_is_detected():
+    # The check itself must notice a scan: filtering on an unindexed column has to show up
+    with transport.app.app_context():
+        statements = captured_selects(lambda: transport.BusLocation.query.filter_by(status='moving').all())
+        assert [table for table, _ in full_scans(statements)] == ['bus_location']
+
+
+if __name__ == "__main__":
+    test_endpoint_queries_use_indexes()
+    test_missing_index_is_detected()
+    print("[OK] Endpoint queries on hot tables use indexes")
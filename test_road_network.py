@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test for offline road network travel times
+Checks Dijkstra times on a small grid of streets and the cached road matrix
+"""
+
+import os
+import random
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+from distance_matrix import DistanceMatrix, haversine_matrix
+from road_network import ROAD, RoadGraph, travel_minutes
+
+# 3x3 street grid about 1.1 km apart; the middle row is a one-way street heading east
+EDGE_LIST = """source,source_lat,source_lon,target,target_lat,target_lon,length_km,speed_kmh,oneway
+a,17.40,78.46,b,17.40,78.47,1.0,30,0
+b,17.40,78.47,c,17.40,78.48,1.0,30,0
+d,17.41,78.46,e,17.41,78.47,1.0,60,1
+e,17.41,78.47,f,17.41,78.48,1.0,60,1
+g,17.42,78.46,h,17.42,78.47,1.0,30,0
+h,17.42,78.47,i,17.42,78.48,1.0,30,0
+a,17.40,78.46,d,17.41,78.46,1.0,30,0
+d,17.41,78.46,g,17.42,78.46,1.0,30,0
+c,17.40,78.48,f,17.41,78.48,1.0,30,0
+f,17.41,78.48,i,17.42,78.48,1.0,30,0
+"""
+
+COLLEGE = {'latitude': 17.42, 'longitude': 78.48}
+
+
+def load_graph(tmp_dir, content=EDGE_LIST):
+    path = os.path.join(tmp_dir, 'road_graph.csv')
+    with open(path, 'w') as f:
+        f.write(content)
+    return RoadGraph.load(path)
+
+
+def test_shortest_times_follow_one_way_streets():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graph = load_graph(tmp_dir)
+    d, f = graph.node_index['d'], graph.node_index['f']
+
+    # East along the fast one-way street: 2 km at 60 km/h
+    assert abs(graph.shortest_times(d, [f])[0] - 2.0) < 1e-9
+    # West has to go round: f-c-b-a-d or f-i-h-g-d, 4 km at 30 km/h
+    assert abs(graph.shortest_times(f, [d])[0] - 8.0) < 1e-9
+    assert abs(graph.shortest_times(d, [f], reverse=True)[0] - 8.0) < 1e-9
+
+
+def test_travel_time_matrix_snaps_and_averages_directions():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graph = load_graph(tmp_dir)
+
+    # Both points sit exactly on nodes d and f
+    points = [(17.41, 78.46), (17.41, 78.48)]
+    times = graph.travel_time_matrix(points, points)
+    assert times[0, 0] == times[1, 1] == 0.0
+    assert abs(times[0, 1] - 5.0) < 1e-9 and abs(times[1, 0] - 5.0) < 1e-9
+
+    # Off-graph points add their straight-line gap to the nearest node
+    snap_km, node = graph.snap(17.401, 78.46)
+    assert graph.node_ids[node] == 'a'
+    times = graph.travel_time_matrix([(17.401, 78.46)], [(17.40, 78.47)])
+    assert abs(times[0, 0] - (2.0 + travel_minutes(snap_km))) < 1e-6
+
+
+def test_unconnected_points_fall_back_to_straight_line():
+    island = EDGE_LIST + "x,17.50,78.60,y,17.50,78.61,1.0,30,0\n"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graph = load_graph(tmp_dir, island)
+    times = graph.travel_time_matrix([(17.40, 78.46)], [(17.50, 78.60)])
+    assert 0 < times[0, 0] < float('inf')
+
+
+def test_minutes_per_km_bounds_travel_times():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graph = load_graph(tmp_dir)
+    # The one-way street covers about 1.06 km of straight line per minute
+    assert 0.9 < graph.minutes_per_km < 1.0
+
+    rng = random.Random(4)
+    points = np.array([(rng.uniform(17.39, 17.43), rng.uniform(78.45, 78.49)) for _ in range(40)])
+    times = graph.travel_time_matrix(points, points)
+    assert (times >= haversine_matrix(points, points) * graph.minutes_per_km - 1e-9).all()
+
+    matrix = DistanceMatrix([], COLLEGE, ROAD, graph)
+    assert matrix.units_per_km == graph.minutes_per_km
+    assert DistanceMatrix([], COLLEGE).units_per_km == 1.0
+
+
+def test_road_matrix_cache_is_tied_to_graph_file():
+    stops = [SimpleNamespace(id=1, latitude=17.40, longitude=78.46),
+             SimpleNamespace(id=2, latitude=17.41, longitude=78.46),
+             SimpleNamespace(id=3, latitude=17.40, longitude=78.48)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        graph = load_graph(tmp_dir)
+        matrix = DistanceMatrix(stops, COLLEGE, ROAD, graph)
+        assert abs(matrix.between(1, 3) - 4.0) < 1e-9
+        # Out via the fast one-way street in 6 minutes, back round the block in 8
+        assert abs(matrix.to_college(1) - 7.0) < 1e-9
+
+        # Adding a stop computes only its rows and matches a full rebuild
+        grown = DistanceMatrix(stops[:2], COLLEGE, ROAD, graph).with_stops(stops)
+        for a in stops:
+            assert abs(grown.to_college(a.id) - matrix.to_college(a.id)) < 1e-9
+            for b in stops:
+                assert abs(grown.between(a.id, b.id) - matrix.between(a.id, b.id)) < 1e-9
+
+        path = os.path.join(tmp_dir, 'distance_cache.npz')
+        matrix.save(path)
+        assert DistanceMatrix.load(path, COLLEGE, ROAD, graph).stop_ids == [1, 2, 3]
+        changed = load_graph(tmp_dir, EDGE_LIST.replace(',60,1', ',40,1'))
+        assert DistanceMatrix.load(path, COLLEGE, ROAD, changed) is None
+
+
+if __name__ == "__main__":
+    test_shortest_times_follow_one_way_streets()
+    test_travel_time_matrix_snaps_and_averages_directions()
+    test_unconnected_points_fall_back_to_straight_line()
+    test_minutes_per_km_bounds_travel_times()
+    test_road_matrix_cache_is_tied_to_graph_file()
+    print("[OK] Road network travel times match hand-computed routes")
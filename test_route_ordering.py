@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for stop ordering modes
+Checks Held-Karp against brute force and the heuristics against the exact optimum
+"""
+
+import itertools
+import random
+
+from distance_matrix import pairwise_distances
+from route_ordering import (EXACT, GREEDY, HEURISTIC, EXACT_MAX_STOPS, PARALLEL_MIN_ROUTES, held_karp_order,
+                            order_many, order_stops, path_length)
+
+
+def random_matrix(stop_count, seed):
+    rng = random.Random(seed)
+    points = [(17.4 + rng.uniform(-0.1, 0.1), 78.47 + rng.uniform(-0.1, 0.1)) for _ in range(stop_count + 2)]
+    return pairwise_distances(points, points)
+
+
+def brute_force_length(distances):
+    n = len(distances)
+    return min(path_length(distances, [0] + list(p) + [n - 1]) for p in itertools.permutations(range(1, n - 1)))
+
+
+def test_held_karp_matches_brute_force():
+    for stop_count in range(0, 8):
+        for seed in range(3):
+            distances = random_matrix(stop_count, seed)
+            order = held_karp_order(distances)
+            assert sorted(order) == list(range(len(distances)))
+            assert order[0] == 0 and order[-1] == len(distances) - 1
+            assert abs(path_length(distances, order) - brute_force_length(distances)) < 1e-9
+
+
+def test_modes_are_ordered_by_quality():
+    for seed in range(5):
+        distances = random_matrix(12, seed)
+        _, greedy = order_stops(distances, GREEDY)
+        _, heuristic = order_stops(distances, HEURISTIC)
+        _, exact = order_stops(distances, EXACT)
+        assert exact <= heuristic + 1e-9 <= greedy + 2e-9
+
+
+def test_exact_falls_back_above_limit():
+    distances = random_matrix(EXACT_MAX_STOPS + 5, 1)
+    assert order_stops(distances, EXACT) == order_stops(distances, HEURISTIC)
+
+
+def test_parallel_ordering_matches_serial():
+    matrices = [random_matrix(8, seed) for seed in range(PARALLEL_MIN_ROUTES + 6)]
+    for mode in (GREEDY, EXACT):
+        serial = [order_stops(distances, mode) for distances in matrices]
+        assert order_many(matrices, mode, workers=2) == serial
+        # Too few routes to be worth the pool
+        assert order_many(matrices[:3], mode, workers=2) == serial[:3]
+
+
+if __name__ == "__main__":
+    test_held_karp_matches_brute_force()
+    test_modes_are_ordered_by_quality()
+    test_exact_falls_back_above_limit()
+    test_parallel_ordering_matches_serial()
+    print("[OK] Ordering modes verified")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test for stored route plan versions
+Checks that optimized plans are published as versions with pickup times, who may switch the current one,
+and that an existing database gains the version column
+"""
+
+from datetime import datetime
+
+from scratch_db import logged_in_client, reset_database, seed_fleet, transport
+
+
+def current_assignments(today):
+    return transport.current_route_assignments(today).order_by(
+        transport.RouteAssignment.bus_id, transport.RouteAssignment.stop_order).all()
+
+
+def set_votes(students, needs_bus):
+    today = datetime.now().date()
+    transport.DailyVote.query.filter(transport.DailyVote.vote_date == today, transport.DailyVote.student_id.in_(
+        [student.id for student in students])).update({'needs_bus': needs_bus}, synchronize_session=False)
+    transport.reconcile_stop_demand(today)
+    transport.db.session.commit()
+
+
+def test_new_demand_publishes_a_new_current_version():
+    with transport.app.app_context():
+        _, _, students = seed_fleet()
+        today = datetime.now().date()
+        client = transport.app.test_client()
+        first = client.post('/api/optimize-routes', json={}).get_json()
+        assignments = current_assignments(today)
+        assert len(assignments) == sum(len(route['stops']) for route in first['routes'])
+        # Pickups are scheduled back from the college arrival time, each stop before the next
+        for route in first['routes']:
+            times = [assignment.estimated_time for assignment in assignments if assignment.bus_id == route['bus_id']]
+            assert all(times) and times == sorted(times)
+            assert times[-1] < datetime.strptime(transport.app.config['COLLEGE_ARRIVAL_TIME'], '%H:%M').time()
+
+        # Every student at one stop drops out, so the plan changes
+        set_votes(students[::6], False)
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        versions = client.get('/api/route-plans').get_json()['versions']
+        assert [version['is_current'] for version in versions] == [True, False]
+        assert versions[0]['total_students_served'] == len(students) - len(students[::6])
+        assert {assignment.stop_id for assignment in current_assignments(today)} == {
+            stop['id'] for route in first['routes'] for stop in route['stops']} - {students[0].stop_id}
+        stored = transport.RouteAssignment.query.count()
+
+        # Back to the first demand: its stored version becomes current again rather than a copy
+        set_votes(students[::6], True)
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        versions = client.get('/api/route-plans').get_json()['versions']
+        assert [version['is_current'] for version in versions] == [False, True]
+        assert transport.RouteAssignment.query.count() == stored
+        assert [row.id for row in current_assignments(today)] == [row.id for row in assignments]
+
+
+def test_only_default_settings_or_admins_publish():
+    with transport.app.app_context():
+        seed_fleet()
+        today = datetime.now().date()
+        client = transport.app.test_client()
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        current = transport.plan_key_for(today)
+
+        # A preview with other options leaves the college's plan alone
+        preview = client.post('/api/optimize-routes', json={'ordering': 'exact', 'incremental': False})
+        assert preview.status_code == 200 and preview.get_json()['routes']
+        assert transport.plan_key_for(today) == current
+        assert len(client.get('/api/route-plans').get_json()['versions']) == 1
+
+        admin = logged_in_client(admin=True)
+        assert admin.post('/api/optimize-routes', json={'ordering': 'exact', 'incremental': False}).status_code == 200
+        assert transport.plan_key_for(today) != current
+        versions = admin.get('/api/route-plans').get_json()['versions']
+        assert versions[0]['is_current'] and versions[0]['ordering'] == 'exact'
+
+
+def test_route_plans_rejects_bad_dates():
+    with transport.app.app_context():
+        reset_database()
+        client = transport.app.test_client()
+        assert client.get('/api/route-plans?date=17-10-2026').status_code == 400
+        assert client.get('/api/route-plans?date=2020-01-01').get_json() == {'date': '2020-01-01', 'versions': []}
+
+
+def test_upgrade_adds_plan_versions_to_an_existing_database():
+    with transport.app.app_context():
+        seed_fleet()
+        db = transport.db
+        stop_id = transport.BusStop.query.first().id
+        bus_id = transport.Bus.query.first().id
+        # route_assignment as it was before plans were versioned, with one row planned back then
+        transport.RouteAssignment.__table__.drop(db.engine)
+        db.session.execute(db.text(
+            'CREATE TABLE route_assignment (id INTEGER PRIMARY KEY, bus_id INTEGER NOT NULL, '
+            'stop_id INTEGER NOT NULL, route_date DATE NOT NULL, stop_order INTEGER NOT NULL, estimated_time TIME)'))
+        db.session.execute(db.text(
+            "INSERT INTO route_assignment (bus_id, stop_id, route_date, stop_order, estimated_time) "
+            "VALUES (:bus_id, :stop_id, '2020-01-01', 1, '07:40:00.000000')"), {'bus_id': bus_id, 'stop_id': stop_id})
+        db.session.commit()
+
+        transport.upgrade_schema()
+        inspector = db.inspect(db.engine)
+        assert 'plan_version_id' in {column['name'] for column in inspector.get_columns('route_assignment')}
+        assert {'ix_route_assignment_date_bus_order', 'ix_route_assignment_plan_version_id'} <= {
+            index['name'] for index in inspector.get_indexes('route_assignment')}
+        # Old plans stay readable as unversioned rows, and new ones are versioned
+        old = transport.current_route_assignments(datetime(2020, 1, 1).date()).all()
+        assert [(row.stop_id, row.plan_version_id) for row in old] == [(stop_id, None)]
+        assert transport.app.test_client().post('/api/optimize-routes', json={}).status_code == 200
+        assert all(row.plan_version_id for row in current_assignments(datetime.now().date()))
+        # Running it again changes nothing
+        transport.upgrade_schema()
+
+
+if __name__ == "__main__":
+    test_new_demand_publishes_a_new_current_version()
+    test_only_default_settings_or_admins_publish()
+    test_route_plans_rejects_bad_dates()
+    test_upgrade_adds_plan_versions_to_an_existing_database()
+    print("[OK] Route plans are versioned and published only with the configured settings")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the pluggable routing engines
+Checks capacity, coverage and cost of the savings engine on a random instance
+"""
+
+import random
+
+from distance_matrix import pairwise_distances
+from route_solvers import RoutingProblem, SavingsEngine, get_routing_engine
+
+COLLEGE = (17.4065, 78.4772)
+
+
+def build_problem(stop_count=120, bus_count=40, capacity=40, seed=7):
+    rng = random.Random(seed)
+    points = [(COLLEGE[0] + rng.uniform(-0.1, 0.1), COLLEGE[1] + rng.uniform(-0.1, 0.1)) for _ in range(stop_count)]
+    demands = [rng.randint(1, 8) for _ in range(stop_count)]
+    return RoutingProblem(
+        pairwise_distances(points, points),
+        pairwise_distances(points, [COLLEGE])[:, 0],
+        demands,
+        [capacity] * bus_count
+    )
+
+
+def test_savings_routes_respect_capacity_and_cover_all_stops():
+    problem = build_problem()
+    solution = SavingsEngine().solve(problem, time_limit=5)
+
+    served = sorted(stop for _, route in solution.routes for stop in route)
+    assert served == list(range(problem.size))
+    for bus, route in solution.routes:
+        assert problem.route_load(route) <= problem.capacities[bus]
+    assert len({bus for bus, _ in solution.routes}) == len(solution.routes)
+
+
+def test_savings_improves_on_construction_and_reports_stats():
+    problem = build_problem()
+    solution = SavingsEngine().solve(problem, time_limit=5)
+    stats = solution.stats()
+
+    assert stats['engine'] == 'savings'
+    assert solution.cost <= solution.baseline_cost + 1e-9
+    assert abs(solution.cost - sum(problem.route_cost(route) for _, route in solution.routes)) < 1e-9
+    assert stats['iterations'] >= 0
+    # Far fewer buses than one per stop
+    assert len(solution.routes) < problem.size / 3
+
+
+def test_savings_is_deterministic():
+    first = SavingsEngine().solve(build_problem(), time_limit=5)
+    second = SavingsEngine().solve(build_problem(), time_limit=5)
+    assert first.routes == second.routes
+
+
+def test_zero_time_limit_returns_construction():
+    problem = build_problem()
+    solution = SavingsEngine().solve(problem, time_limit=0)
+    assert solution.iterations == 0
+    assert solution.cost == solution.baseline_cost
+
+
+def test_unknown_engine_rejected():
+    try:
+        get_routing_engine('genetic')
+    except ValueError:
+        return
+    raise AssertionError('Unknown routing engine should raise ValueError')
+
+
+if __name__ == "__main__":
+    test_savings_routes_respect_capacity_and_cover_all_stops()
+    test_savings_improves_on_construction_and_reports_stats()
+    test_savings_is_deterministic()
+    test_zero_time_limit_returns_construction()
+    test_unknown_engine_rejected()
+    print("[OK] Savings engine produces valid, improved routes")
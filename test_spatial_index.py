@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the spatial grid index
+Compares nearest/radius queries with a brute-force scan using geodesic distances
+"""
+
+import random
+
+from geopy.distance import geodesic
+
+from spatial_index import SpatialGrid, bounding_box
+
+CENTER = (17.4065, 78.4772)
+
+
+def random_points(count, spread=0.2, seed=3):
+    rng = random.Random(seed)
+    return {key: (CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread))
+            for key in range(count)}
+
+
+def test_nearest_matches_brute_force_with_deletion():
+    points = random_points(150)
+    grid = SpatialGrid((key, lat, lon) for key, (lat, lon) in points.items())
+    remaining = set(points)
+    rng = random.Random(11)
+
+    while remaining:
+        query = points[rng.choice(sorted(points))]
+        distance = lambda key: geodesic(query, points[key]).kilometers
+        accept = lambda key: key % 3 != 0
+        expected = min(((distance(key), key) for key in remaining if accept(key)), default=None)
+        assert grid.nearest(query[0], query[1], distance=distance, accept=accept) == expected
+
+        removed = rng.choice(sorted(remaining))
+        grid.remove(removed)
+        remaining.discard(removed)
+    assert len(grid) == 0
+
+
+def test_nearest_k_matches_brute_force():
+    points = random_points(200)
+    grid = SpatialGrid((key, lat, lon) for key, (lat, lon) in points.items())
+    rng = random.Random(5)
+    for _ in range(30):
+        query = (CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3))
+        distance = lambda key: geodesic(query, points[key]).kilometers
+        accept = lambda key: key % 4 != 1
+        for k, max_km in ((1, None), (5, None), (12, 8.0), (300, 3.0)):
+            expected = sorted((distance(key), key) for key in points
+                              if accept(key) and (max_km is None or distance(key) <= max_km))[:k]
+            assert grid.nearest_k(query[0], query[1], k, distance=distance, accept=accept, max_km=max_km) == expected
+
+
+def test_nearest_k_in_travel_minutes_matches_brute_force():
+    # Minutes at 120 km/h grow half as fast as km, so km ring bounds alone would stop too early
+    points = random_points(200)
+    grid = SpatialGrid((key, lat, lon) for key, (lat, lon) in points.items())
+    rng = random.Random(8)
+    for _ in range(30):
+        query = points[rng.choice(sorted(points))]
+        minutes = lambda key: geodesic(query, points[key]).kilometers / 120 * 60
+        for k in (1, 5):
+            expected = sorted((minutes(key), key) for key in points)[:k]
+            assert grid.nearest_k(query[0], query[1], k, distance=minutes, units_per_km=0.5) == expected
+
+
+def test_insert_beyond_projection_latitude_stays_exact():
+    # Built empty, the grid projects at the equator until points farther north arrive
+    points = random_points(80, spread=2.0)
+    grid = SpatialGrid([], cell_size_km=1.0)
+    for key, (lat, lon) in points.items():
+        grid.insert(key, lat, lon)
+    assert grid.widest_lat == max(lat for lat, _ in points.values())
+    distance = lambda key: geodesic(CENTER, points[key]).kilometers
+    expected = sorted((distance(key), key) for key in points)[:3]
+    assert grid.nearest_k(CENTER[0], CENTER[1], 3, distance=distance) == expected
+
+
+def test_within_matches_brute_force():
+    points = random_points(300)
+    grid = SpatialGrid((key, lat, lon) for key, (lat, lon) in points.items())
+    for radius in (0.5, 2, 5, 50):
+        distance = lambda key: geodesic(CENTER, points[key]).kilometers
+        expected = sorted((distance(key), key) for key in points if distance(key) <= radius)
+        assert grid.within(CENTER[0], CENTER[1], radius, distance=distance) == expected
+
+
+def test_bounding_box_contains_radius():
+    for key, point in random_points(300, spread=1.0).items():
+        min_lat, max_lat, min_lon, max_lon = bounding_box(CENTER, 50)
+        inside = min_lat <= point[0] <= max_lat and min_lon <= point[1] <= max_lon
+        if geodesic(CENTER, point).kilometers <= 50:
+            assert inside, point
+
+
+if __name__ == "__main__":
+    test_nearest_matches_brute_force_with_deletion()
+    test_nearest_k_matches_brute_force()
+    test_nearest_k_in_travel_minutes_matches_brute_force()
+    test_insert_beyond_projection_latitude_stays_exact()
+    test_within_matches_brute_force()
+    test_bounding_box_contains_radius()
+    print("[OK] Spatial grid matches brute-force search")
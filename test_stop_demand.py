@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Test for the per-day stop demand counters
+Checks votes move the StopDemand counts in step and reconciliation repairs any drift
+"""
+
+from datetime import datetime
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def test_votes_keep_counters_in_step():
+    with transport.app.app_context():
+        stops, _, students = seed_fleet()
+        today = datetime.now().date()
+        demand = lambda: transport.StopDemand.query.get((today, stops[0].id)).student_count
+        client = logged_in_client(students[0].id)
+        assert demand() == 5
+
+        assert client.post('/vote', data={'needs_bus': 'no'}).status_code == 302
+        assert demand() == 4 and transport.stop_demand_counts(today)[stops[0].id]['count'] == 4
+        # Voting the same way again changes nothing; flipping back restores the count
+        assert client.post('/vote', data={'needs_bus': 'no'}).status_code == 302
+        assert demand() == 4
+        assert client.post('/vote', data={'needs_bus': 'yes'}).status_code == 302
+        assert demand() == 5 and transport.reconcile_stop_demand(today) == 0
+
+
+def test_reconciliation_repairs_drift():
+    with transport.app.app_context():
+        stops, _, _ = seed_fleet()
+        today = datetime.now().date()
+        demand = lambda stop: transport.StopDemand.query.get((today, stop.id)).student_count
+
+        # A vote written behind the app's back is picked up
+        student = transport.Student(student_id='S30', name='Student 30', password_hash='x', stop_id=stops[1].id)
+        transport.db.session.add(student)
+        transport.db.session.flush()
+        transport.db.session.add(transport.DailyVote(student_id=student.id, vote_date=today, needs_bus=True))
+        assert transport.reconcile_stop_demand(today) == 1 and demand(stops[1]) == 6
+
+        transport.StopDemand.query.get((today, stops[0].id)).student_count = 99
+        assert transport.reconcile_today_stop_demand()['stops_corrected'] == 1 and demand(stops[0]) == 5
+
+
+if __name__ == "__main__":
+    test_votes_keep_counters_in_step()
+    test_reconciliation_repairs_drift()
+    print("[OK] Stop demand counters follow the votes")
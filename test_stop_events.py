@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test for stop arrival detection on ingestion
+Checks only a bus with the stop on today's route records an arrival, once, and repeats are dropped
+"""
+
+from datetime import datetime
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def test_arrival_is_recorded_for_the_bus_serving_the_stop():
+    with transport.app.app_context():
+        stops, buses, _ = seed_fleet()
+        client = logged_in_client()
+        assert client.post('/api/optimize-routes', json={}).status_code == 200
+        now = datetime.utcnow()
+
+        # Every bus reports from Stop 0, twice; only the one with it on today's route arrives there
+        at_stop = [{'bus_id': bus.id, 'latitude': stops[0].latitude, 'longitude': stops[0].longitude,
+                    'timestamp': now.isoformat()} for bus in buses]
+        assert client.post('/api/update-locations', json=at_stop).status_code == 200
+        assert client.post('/api/update-location', json=at_stop[0]).status_code == 200
+        events = client.get('/api/stop-events').get_json()['events']
+        assert [(event['stop_name'], event['event']) for event in events] == [('Stop 0', 'arrival')]
+        assert client.get(f"/api/stop-events?stop_id={stops[1].id}").get_json()['events'] == []
+
+        # Another worker seeing the same arrival does not record it twice
+        repeat = dict(bus_id=events[0]['bus_id'], stop_id=events[0]['stop_id'], event='arrival',
+                      timestamp=now, route_date=datetime.now().date())
+        assert transport.drop_repeated_events([repeat]) == []
+        departure = dict(repeat, event='departure')
+        assert transport.drop_repeated_events([departure, repeat]) == [departure, repeat]
+
+
+if __name__ == "__main__":
+    test_arrival_is_recorded_for_the_bus_serving_the_stop()
+    print("[OK] Stop arrivals are detected from incoming points")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test for the compact trip track format
+Checks that tracks round-trip within their stored precision, trip splitting, and the size per point
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from track_codec import decode_track, encode_track, split_trips
+
+START = datetime(2024, 1, 1, 7, 0, 0, 250000)
+
+
+def drive(count, seed=7):
+    """A bus reporting every 5 seconds, drifting across the city"""
+    rng = random.Random(seed)
+    timestamps, latitudes, longitudes, speeds = [], [], [], []
+    latitude, longitude = 17.40, 78.47
+    for i in range(count):
+        latitude += rng.uniform(-0.0002, 0.0004)
+        longitude += rng.uniform(-0.0002, 0.0004)
+        timestamps.append(START + timedelta(seconds=5 * i))
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        speeds.append(rng.uniform(0, 60))
+    return timestamps, latitudes, longitudes, speeds
+
+
+def test_track_round_trips():
+    timestamps, latitudes, longitudes, speeds = drive(2000)
+    started_at, seconds, decoded_lat, decoded_lon, decoded_speed = decode_track(
+        encode_track(timestamps, latitudes, longitudes, speeds))
+
+    assert started_at == START
+    assert seconds.tolist() == [5 * i for i in range(2000)]
+    assert max(abs(a - b) for a, b in zip(decoded_lat, latitudes)) <= 0.5e-5 + 1e-12
+    assert max(abs(a - b) for a, b in zip(decoded_lon, longitudes)) <= 0.5e-5 + 1e-12
+    assert max(abs(a - b) for a, b in zip(decoded_speed, speeds)) <= 0.05 + 1e-9
+
+    # Single points and missing speeds are fine too
+    _, seconds, decoded_lat, _, decoded_speed = decode_track(encode_track([START], [17.4], [78.47], [None]))
+    assert seconds.tolist() == [0] and decoded_lat.tolist() == [17.4] and decoded_speed.tolist() == [0.0]
+
+
+def test_track_is_small():
+    # A BusLocation row takes well over 100 bytes in SQLite once its indexes are counted
+    assert len(encode_track(*drive(5000))) / 5000 < 10
+
+
+def test_split_trips_on_gaps():
+    gap = timedelta(minutes=30)
+    timestamps = [START, START + timedelta(minutes=10), START + timedelta(minutes=50), START + timedelta(minutes=79)]
+    assert split_trips(timestamps, gap) == [(0, 2), (2, 4)]
+    assert split_trips([], gap) == []
+
+
+if __name__ == "__main__":
+    test_track_round_trips()
+    test_track_is_small()
+    test_split_trips_on_gaps()
+    print("[OK] Tracks round-trip in a compact format")
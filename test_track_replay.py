@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Test for finished-trip tracks
+Checks compaction stores each finished trip as a track that the replay API decodes back to its points
+"""
+
+from datetime import datetime, timedelta
+
+from scratch_db import logged_in_client, seed_fleet, transport
+
+
+def test_finished_trips_are_stored_and_replayed():
+    with transport.app.app_context():
+        _, buses, _ = seed_fleet()
+        client = logged_in_client()
+        started_at = (datetime.utcnow() - timedelta(days=2)).replace(microsecond=0)
+        points = [{'bus_id': bus.id, 'latitude': round(17.40 + i / 1000, 3), 'longitude': 78.47, 'speed': 20,
+                   'timestamp': (started_at + timedelta(seconds=30 * i)).isoformat()}
+                  for bus in buses for i in range(4)]
+        assert client.post('/api/update-locations', json=points).status_code == 200
+        assert transport.compact_bus_locations()['trips_closed'] == len(buses)
+        # Already stored trips are not written again
+        assert transport.compact_bus_locations()['trips_closed'] == 0
+
+        tracks = client.get(f"/api/tracks?date={started_at:%Y-%m-%d}&bus_id={buses[0].id}").get_json()['tracks']
+        assert [(track['bus_id'], track['point_count']) for track in tracks] == [(buses[0].id, 4)]
+        replay = client.get(f"/api/tracks/{tracks[0]['id']}").get_json()
+        assert [point[:3] for point in replay['points']] == [[30 * i, round(17.40 + i / 1000, 3), 78.47] for i in range(4)]
+        csv_rows = client.get(f"/api/tracks/{tracks[0]['id']}?format=csv").data.decode().splitlines()
+        assert csv_rows[0] == 'timestamp,latitude,longitude,speed' and len(csv_rows) == 5
+        assert client.get('/api/tracks/999').status_code == 404
+
+
+if __name__ == "__main__":
+    test_finished_trips_are_stored_and_replayed()
+    print("[OK] Finished trips are stored as tracks and replayed")
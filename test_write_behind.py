@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test for the write-behind buffer
+Checks size and time flush triggers, backpressure, retries and draining on close
+"""
+
+import threading
+import time
+
+import write_behind
+from write_behind import WriteBehindBuffer
+
+
+class Recorder:
+    def __init__(self, fail_times=0, block=None):
+        self.batches = []
+        self.fail_times = fail_times
+        self.block = block
+
+    def __call__(self, batch):
+        if self.block is not None:
+            self.block.wait(5)
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError('database unavailable')
+        self.batches.append(list(batch))
+
+
+def test_flushes_on_size_and_time():
+    recorder = Recorder()
+    buffer = WriteBehindBuffer(recorder, batch_size=3, flush_interval=0.2)
+    assert buffer.put_many([1, 2, 3, 4])
+    time.sleep(0.1)
+    # A full batch goes at once; the remainder waits for the interval
+    assert recorder.batches == [[1, 2, 3]]
+    time.sleep(0.3)
+    assert recorder.batches == [[1, 2, 3], [4]]
+
+    metrics = buffer.metrics()
+    assert metrics['written'] == 4 and metrics['flushes'] == 2 and metrics['depth'] == 0
+    assert buffer.close() == 0
+
+
+def test_full_queue_pushes_back():
+    release = threading.Event()
+    recorder = Recorder(block=release)
+    buffer = WriteBehindBuffer(recorder, batch_size=2, flush_interval=0.01, capacity=4)
+    assert buffer.put_many([1, 2])
+    time.sleep(0.1)  # 1 and 2 are now stuck being written
+    assert buffer.put_many([3, 4, 5, 6])
+    assert not buffer.put_many([7], timeout=0.05)
+    assert buffer.metrics()['rejected'] == 1 and buffer.metrics()['depth'] == 4
+
+    release.set()
+    assert buffer.put_many([7], timeout=5)
+    assert buffer.flush(timeout=5)
+    assert [item for batch in recorder.batches for item in batch] == [1, 2, 3, 4, 5, 6, 7]
+    buffer.close()
+
+
+def test_failed_batches_are_retried_and_close_drains():
+    retry_delay, write_behind.RETRY_DELAY_SECONDS = write_behind.RETRY_DELAY_SECONDS, 0.01
+    recorder = Recorder(fail_times=2)
+    buffer = WriteBehindBuffer(recorder, batch_size=100, flush_interval=60, retry_on=(RuntimeError,))
+    try:
+        assert buffer.put_many(range(250))
+        # Closing writes everything still queued without waiting for the interval
+        assert buffer.close(timeout=5) == 0
+    finally:
+        write_behind.RETRY_DELAY_SECONDS = retry_delay
+    assert [item for batch in recorder.batches for item in batch] == list(range(250))
+    assert buffer.metrics()['failed_flushes'] == 2
+    try:
+        buffer.put_many([1])
+        assert False, 'closed buffer took items'
+    except RuntimeError:
+        pass
+
+
+def test_bad_items_are_dead_lettered():
+    batches = []
+
+    def write_batch(batch):
+        if 'bad' in batch:
+            raise ValueError('column cannot be null')
+        batches.append(list(batch))
+
+    buffer = WriteBehindBuffer(write_batch, batch_size=8, flush_interval=60, retry_on=(RuntimeError,))
+    items = [1, 2, 'bad', 4, 5, 6, 'bad', 8]
+    assert buffer.put_many(items)
+    assert buffer.flush(timeout=5)
+    # The good items around the bad ones are written and the queue is free again
+    assert sorted(item for batch in batches for item in batch) == [1, 2, 4, 5, 6, 8]
+    metrics = buffer.metrics()
+    assert metrics['written'] == 6 and metrics['dead_lettered'] == 2 and metrics['in_flight'] == 0
+    assert buffer.put_many([9]) and buffer.close(timeout=5) == 0
+    assert batches[-1] == [9]
+
+
+if __name__ == "__main__":
+    test_flushes_on_size_and_time()
+    test_full_queue_pushes_back()
+    test_failed_batches_are_retried_and_close_drains()
+    test_bad_items_are_dead_lettered()
+    print("[OK] Write-behind buffer batches, pushes back and drains")
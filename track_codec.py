@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compact storage format for a bus trip's GPS track
+Delta-encodes time, coordinates and speed into the narrowest integer arrays that fit, then compresses them
+"""
+
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+TRACK_FORMAT = 1
+COORDINATE_SCALE = 100000  # 1e-5 degrees, about 1.1 m
+SPEED_SCALE = 10  # 0.1 km/h
+# Format, point count and start time in microseconds since the epoch (naive UTC)
+HEADER = struct.Struct('<BIq')
+INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _narrowest(deltas):
+    for dtype in INTEGER_TYPES:
+        info = np.iinfo(dtype)
+        if not len(deltas) or (deltas.min() >= info.min and deltas.max() <= info.max):
+            return dtype
+    raise ValueError('Track values out of range')
+
+
+def encode_track(timestamps, latitudes, longitudes, speeds):
+    """Pack a trip's points (ordered by time) into bytes; time is kept to the second from the first point"""
+    if not timestamps:
+        raise ValueError('A track needs at least one point')
+    started_at = timestamps[0]
+    columns = (
+        np.array([round((timestamp - started_at).total_seconds()) for timestamp in timestamps], dtype=np.int64),
+        np.round(np.asarray(latitudes, dtype=float) * COORDINATE_SCALE).astype(np.int64),
+        np.round(np.asarray(longitudes, dtype=float) * COORDINATE_SCALE).astype(np.int64),
+        np.round(np.nan_to_num(np.asarray(speeds, dtype=float)) * SPEED_SCALE).astype(np.int64),
+    )
+    start_micros = (started_at - EPOCH) // timedelta(microseconds=1)
+    parts = [HEADER.pack(TRACK_FORMAT, len(timestamps), start_micros)]
+    for column in columns:
+        # The first delta is the column's first value
+        deltas = np.diff(column, prepend=0)
+        dtype = _narrowest(deltas)
+        parts.append(bytes([INTEGER_TYPES.index(dtype)]))
+        parts.append(deltas.astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+    return zlib.compress(b''.join(parts), 9)
+
+
+def decode_track(data):
+    """(start time, seconds from start, latitudes, longitudes, speeds) as numpy arrays"""
+    raw = zlib.decompress(data)
+    track_format, count, start_micros = HEADER.unpack_from(raw)
+    if track_format != TRACK_FORMAT:
+        raise ValueError(f'Unknown track format {track_format}')
+
+    offset = HEADER.size
+    columns = []
+    for _ in range(4):
+        dtype = np.dtype(INTEGER_TYPES[raw[offset]]).newbyteorder('<')
+        offset += 1
+        deltas = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += dtype.itemsize * count
+        columns.append(np.cumsum(deltas, dtype=np.int64))
+
+    seconds, latitudes, longitudes, speeds = columns
+    return (EPOCH + timedelta(microseconds=start_micros), seconds,
+            latitudes / COORDINATE_SCALE, longitudes / COORDINATE_SCALE, speeds / SPEED_SCALE)
+
+
+def split_trips(timestamps, gap):
+    """(start, end) index ranges of the runs of timestamps with no pause longer than gap"""
+    trips = []
+    start = 0
+    for i in range(1, len(timestamps)):
+        if timestamps[i] - timestamps[i - 1] > gap:
+            trips.append((start, i))
+            start = i
+    if timestamps:
+        trips.append((start, len(timestamps)))
+    return trips
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Write-behind buffer for high-rate inserts
+Queues items in memory and has one background thread write them in batches, on a size or time trigger
+"""
+
+import collections
+import threading
+import time
+
+# Pause before retrying a batch whose write failed
+RETRY_DELAY_SECONDS = 1.0
+
+
+class WriteBehindBuffer:
+    """Bounded queue drained by a flusher thread calling write_batch(items).
+
+    A batch is written once batch_size items are waiting or the oldest waiting item is
+    flush_interval seconds old. Producers are held back (and eventually refused) while
+    capacity items are waiting. Batches failing with one of the retry_on exceptions (the
+    database being briefly unavailable) are retried. Any other failure means some item
+    itself is bad: the batch is split until the bad items are isolated, and those are
+    logged and dropped as dead letters so the rest of the queue keeps moving.
+    """
+
+    def __init__(self, write_batch, batch_size=1000, flush_interval=0.5, capacity=50000, name='write-behind',
+                 retry_on=()):
+        self.write_batch = write_batch
+        self.retry_on = tuple(retry_on)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending = collections.deque()
+        self.oldest_at = None  # When the oldest waiting item was queued
+        self.in_flight = 0
+        self.flush_requested = False
+        self.closed = False
+        self.stats = {'queued': 0, 'written': 0, 'rejected': 0, 'dead_lettered': 0, 'flushes': 0, 'failed_flushes': 0,
+                      'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0}
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def put_many(self, items, timeout=1.0):
+        """Queue items all together; False if the buffer stayed too full to take them for timeout seconds"""
+        items = list(items)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('Write-behind buffer is closed')
+            # An oversized group is still taken once the queue is empty
+            fits = lambda: len(self.pending) + len(items) <= self.capacity or not self.pending
+            if not self.changed.wait_for(fits, timeout):
+                self.stats['rejected'] += len(items)
+                return False
+            if not self.pending:
+                self.oldest_at = time.monotonic()
+            self.pending.extend(items)
+            self.stats['queued'] += len(items)
+            self.changed.notify_all()
+            return True
+
+    def flush(self, timeout=None):
+        """Write everything queued so far now; False if that took longer than timeout seconds"""
+        with self.lock:
+            self.flush_requested = True
+            self.changed.notify_all()
+            return self.changed.wait_for(lambda: not self.pending and not self.in_flight, timeout)
+
+    def close(self, timeout=30.0):
+        """Stop taking items and write out the rest; returns how many items could not be written in time"""
+        with self.lock:
+            self.closed = True
+            self.changed.notify_all()
+        self.thread.join(timeout)
+        with self.lock:
+            return len(self.pending) + self.in_flight
+
+    def metrics(self):
+        with self.lock:
+            metrics = dict(self.stats, depth=len(self.pending), in_flight=self.in_flight, capacity=self.capacity)
+        total_flush_ms = metrics.pop('total_flush_ms')
+        metrics['avg_flush_ms'] = round(total_flush_ms / metrics['flushes'], 3) if metrics['flushes'] else 0.0
+        return metrics
+
+    def _due(self):
+        return (self.closed or self.flush_requested or len(self.pending) >= self.batch_size
+                or time.monotonic() - self.oldest_at >= self.flush_interval)
+
+    def _write(self, batch):
+        """Write a batch, retrying transient failures and dead-lettering bad items; returns how many were written"""
+        while True:
+            try:
+                self.write_batch(batch)
+                return len(batch)
+            except self.retry_on as e:
+                print(f"Write-behind flush of {len(batch)} items failed, retrying: {e}")
+                with self.lock:
+                    self.stats['failed_flushes'] += 1
+                time.sleep(RETRY_DELAY_SECONDS)
+            except Exception as e:
+                with self.lock:
+                    self.stats['failed_flushes'] += 1
+                    if len(batch) == 1:
+                        self.stats['dead_lettered'] += 1
+                if len(batch) == 1:
+                    print(f"Write-behind dropped an item that cannot be written: {batch[0]!r}: {e}")
+                    return 0
+                middle = len(batch) // 2
+                return self._write(batch[:middle]) + self._write(batch[middle:])
+
+    def _run(self):
+        while True:
+            with self.lock:
+                self.changed.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                while not self._due():
+                    self.changed.wait(max(self.oldest_at + self.flush_interval - time.monotonic(), 0.001))
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                self.in_flight = len(batch)
+                if not self.pending:
+                    self.flush_requested = False
+                # Room was made for waiting producers
+                self.changed.notify_all()
+
+            started = time.monotonic()
+            written = self._write(batch)
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            with self.lock:
+                self.in_flight = 0
+                self.stats['written'] += written
+                self.stats['flushes'] += 1
+                self.stats['last_flush_ms'] = round(elapsed_ms, 3)
+                self.stats['max_flush_ms'] = round(max(self.stats['max_flush_ms'], elapsed_ms), 3)
+                self.stats['total_flush_ms'] += elapsed_ms
+                self.changed.notify_all()